@@ -1,18 +1,20 @@
 import os
+import asyncio
 import logging
 import random
 import json
-import tempfile
+import time
+import click
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
-from flask import Flask, render_template, request, jsonify, flash, redirect, url_for
+from flask import (
+    Flask, Response, render_template, request, jsonify, flash, redirect, url_for, abort, send_from_directory,
+    stream_with_context
+)
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy.orm import DeclarativeBase
 from flask_login import LoginManager, current_user, login_user, logout_user, login_required
-from gtts import gTTS
-import tempfile
 from sqlalchemy import func
-import openai
 from flask_wtf.csrf import CSRFProtect
 from flask_migrate import Migrate
 from dynamic_auth import verify_dynamic_jwt
@@ -86,10 +88,36 @@ login_manager.login_view = 'login'
 from models import (
     User, Progress, Chat, VocabularyItem, VocabularyProgress, 
     UserPreferences, DailyVocabulary, SentencePractice, 
-    SpeakingExercise, UserSpeakingAttempt
+    SpeakingExercise, UserSpeakingAttempt, SpeakingJob
 )
 from forms import LoginForm, RegisterForm, UserPreferencesForm
-from utils.openai_helper import chat_with_ai, transcribe_audio
+from utils.openai_helper import (
+    chat_with_ai, achat_with_ai, stream_chat_with_ai,
+    record_stream_timing, get_stream_stats, translate_batch, atranslate_batch, TUTOR_SYSTEM_PROMPT, use_mock
+)
+from utils.chat_context import build_context, start_summary_update
+from utils.chat_history import DEFAULT_PAGE_SIZE, history_page
+from utils.openai_client import get_openai_api_key, get_pool_stats
+from utils.llm_views import ASGI_ENVIRON_KEY, LLMView
+from utils.structured_output import SentenceFeedback, VocabularyList
+from utils.tts_helper import (
+    AUDIO_ROOT, AUDIO_URL_PATH, prepare_tts_text, voice_for_language, synthesize_speech, stream_speech, ensure_audio_file,
+    audio_file_path, charge_speech, ensure_gtts_file, OpenAISpeechError
+)
+from utils.audio_format import FORMATS, choose_format
+from utils.speaking_recordings import RECORDING_URL_PATH, RECORDINGS_DIR
+from utils import tts_cache, audio_storage, translation_cache, write_behind, single_flight, llm_budget, llm_resilience, structured_output, speaking_jobs, speaking_recordings, audio_preprocess, segmented_transcription
+from utils.language_detect import LANGUAGE_NAMES, confident_language, detect_language, min_confidence
+from utils.audio_prerender import (
+    DEFAULT_WORKERS, pregenerate_vocabulary_audio, start_vocabulary_audio_job,
+    load_scenario_pack, render_all_scenario_packs, start_scenario_pack_job
+)
+
+# Queue append-only inserts when WRITE_BEHIND is set
+write_behind.init_app(app)
+
+# Evaluate speaking submissions in background workers
+speaking_jobs.init_app(app)
 
 @login_manager.user_loader
 def load_user(user_id):
@@ -328,9 +356,8 @@ def speaking_practice():
         flash('An error occurred: ' + str(e), 'danger')
         return redirect(url_for('fix_preferences'))
 
-@app.route('/api/chat', methods=['POST'])
 @login_required
-def handle_chat():
+def prepare_chat():
     try:
         data = request.json
         user_message = data.get('message')
@@ -338,21 +365,18 @@ def handle_chat():
             return jsonify({'error': 'No message provided'}), 400
 
         logger.debug(f"Processing chat message: {user_message}")
-        response = chat_with_ai(user_message)
+        return {'message': user_message, 'context': build_context(current_user.id)}
+    except Exception as e:
+        logger.error(f"Chat error: {str(e)}")
+        return jsonify({'error': str(e)}), 500
 
+def finish_chat(state, response):
+    try:
         # Extract the content from the response dictionary
         response_content = response['content'] if isinstance(response, dict) else str(response)
         
         # Save the chat message and response
-        chat = Chat(
-            user_id=current_user.id,
-            message=user_message,
-            response=response_content,  # Store only the string content
-            timestamp=datetime.utcnow()
-        )
-        db.session.add(chat)
-        db.session.commit()
-        logger.debug("Chat message saved successfully")
+        save_chat(current_user.id, state['message'], response_content)
 
         return jsonify({'response': response})
     except Exception as e:
@@ -360,26 +384,196 @@ def handle_chat():
         db.session.rollback()  # Rollback the transaction in case of error
         return jsonify({'error': str(e)}), 500
 
+chat_view = LLMView(
+    prepare_chat,
+    lambda state: chat_with_ai(state['message'], state['context']),
+    lambda state: achat_with_ai(state['message'], state['context']),
+    finish_chat,
+    priority='interactive',
+    estimate=lambda state: llm_budget.estimate_tokens(
+        TUTOR_SYSTEM_PROMPT, state['message'], *(m['content'] for m in state['context'])
+    )
+)
+
+@app.route('/api/chat', methods=['POST'])
+@login_required
+def handle_chat():
+    return chat_view()
+
+def save_chat(user_id, message, response_content):
+    """Store one chat exchange; only the string content of the reply is kept."""
+    # Fold turns that fell out of the context budget into the summary once
+    # this one is stored, so the update sees it
+    write_behind.add(
+        Chat,
+        on_written=lambda: start_summary_update(app, user_id),
+        user_id=user_id,
+        message=message,
+        response=response_content,
+        timestamp=datetime.utcnow()
+    )
+    logger.debug("Chat message saved successfully")
+
+def sse_event(event, data):
+    """Format one Server-Sent Events frame with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.route('/api/chat/stream', methods=['POST'])
+@login_required
+def handle_chat_stream():
+    """Streaming variant of handle_chat that relays the reply as Server-Sent Events.
+
+    Sends a 'token' event per content delta and a final 'done' event with the
+    full reply and its timings. The Chat row is saved once the reply is complete.
+    """
+    data = request.json or {}
+    user_message = data.get('message')
+    if not user_message:
+        return jsonify({'error': 'No message provided'}), 400
+
+    logger.debug(f"Streaming chat message: {user_message}")
+    user_id = current_user.id
+    try:
+        context = build_context(user_id)
+    except Exception as e:
+        logger.error(f"Chat context error: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+    try:
+        llm_budget.acquire(llm_budget.estimate_tokens(
+            TUTOR_SYSTEM_PROMPT, user_message, *(m['content'] for m in context)
+        ), 'interactive')
+    except llm_budget.BudgetExceeded as e:
+        return llm_budget.limited_response(e)
+
+    def finish(parts, started, ttft):
+        total = time.monotonic() - started
+        ttft = total if ttft is None else ttft
+        record_stream_timing(ttft, total)
+        logger.info(f"Streamed chat reply: first token after {ttft * 1000:.0f} ms, complete after {total * 1000:.0f} ms")
+        try:
+            save_chat(user_id, user_message, ''.join(parts))
+        except Exception:
+            db.session.rollback()
+            raise
+        return total, ttft
+
+    def generate():
+        started = time.monotonic()
+        ttft = None
+        parts = []
+        deltas = stream_chat_with_ai(user_message, context)
+        try:
+            for delta in deltas:
+                if ttft is None:
+                    ttft = time.monotonic() - started
+                parts.append(delta)
+                yield sse_event('token', {'content': delta})
+        except GeneratorExit:
+            # The client went away; finish the reply so it still lands in the history
+            try:
+                parts.extend(deltas)
+                finish(parts, started, ttft)
+            except Exception as e:
+                logger.error(f"Failed to save chat after client disconnect: {str(e)}")
+            raise
+
+        try:
+            total, ttft = finish(parts, started, ttft)
+        except Exception as e:
+            logger.error(f"Chat stream error: {str(e)}")
+            yield sse_event('error', {'error': str(e)})
+            return
+        yield sse_event('done', {
+            'response': ''.join(parts),
+            'ttft_ms': round(ttft * 1000),
+            'total_ms': round(total * 1000)
+        })
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'  # Stop proxies from buffering the stream
+    })
+
+@app.route('/api/chat/stream-stats', methods=['GET'])
+@login_required
+def get_chat_stream_stats():
+    """Report time-to-first-token and total time of recent streamed chat replies."""
+    return jsonify(get_stream_stats())
+
 @app.route('/api/chat/history', methods=['GET'])
 @login_required
 def get_chat_history():
+    """Page through chat history, newest first.
+
+    Query parameters: `before` (a cursor) for older turns, `since` (a cursor)
+    for only the turns newer than ones the client already has, and `limit`.
+    """
     try:
-        chats = Chat.query.filter_by(user_id=current_user.id)\
-            .order_by(Chat.timestamp.desc())\
-            .limit(50)\
-            .all()
-
-        chat_history = [{
-            'message': chat.message,
-            'response': chat.response,
-            'timestamp': chat.timestamp.isoformat()
-        } for chat in chats]
-
-        return jsonify({'history': chat_history})
+        page = history_page(
+            current_user.id,
+            before=request.args.get('before'),
+            since=request.args.get('since'),
+            limit=request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+        )
+        return jsonify(page)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         logger.error(f"Chat history error: {str(e)}")
         return jsonify({'error': 'Failed to fetch chat history'}), 500
 
+# Generated audio files can be cached by browsers for a year
+AUDIO_CACHE_MAX_AGE = 365 * 24 * 60 * 60
+AUDIO_EXTENSIONS = {audio_format['extension'] for audio_format in FORMATS.values()}
+
+def requested_audio_format(requested=None):
+    """Pick the TTS output format from the request's format field, Accept and Save-Data headers."""
+    return choose_format(
+        requested,
+        request.headers.get('Accept', ''),
+        request.headers.get('Save-Data', '').lower() == 'on'
+    )
+
+def stream_tts_audio(text, lang, speed, model, audio_format='mp3'):
+    """Stream TTS audio to the client as it arrives, keeping a cached copy on disk."""
+    text = prepare_tts_text(text)
+    voice = voice_for_language(lang)
+    logger.debug(f"Streaming text-to-speech - Text: {text[:30]}..., Language: {lang}, Voice: {voice}, "
+                 f"Format: {audio_format}")
+
+    cache_key, _, audio_path = audio_file_path(text, lang, voice, model, speed, audio_format=audio_format)
+    response_format = FORMATS[audio_format]['openai']
+
+    def open_stream():
+        if not response_format:
+            # Transcoded formats need the whole file first
+            raise RuntimeError(f'{audio_format} cannot be streamed')
+        charge_speech(text)
+        return stream_speech(text, voice, model, speed, response_format=response_format)
+
+    def synthesize(path):
+        charge_speech(text)
+        synthesize_speech(text, lang, voice, model, speed, path, audio_format=audio_format, gtts_fallback=False)
+
+    audio_stream = None
+    if get_openai_api_key():
+        try:
+            audio_stream = tts_cache.stream_through(
+                cache_key, audio_path, open_stream, synthesize, text_length=len(text)
+            )
+        except OpenAISpeechError as e:
+            logger.warning(f"OpenAI TTS failed, streaming gTTS audio instead: {e}")
+    if audio_stream is None:
+        # gTTS audio has its own cache entry and is sent once it is complete
+        audio_filename, _ = ensure_gtts_file(text, lang, audio_format=audio_format)
+        audio_stream = tts_cache.read_chunks(os.path.join(AUDIO_ROOT, 'tts', audio_filename))
+    # No Content-Length, so the body goes out with chunked transfer encoding
+    return Response(audio_stream, mimetype=FORMATS[audio_format]['mimetype'], headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'  # Stop proxies from buffering the stream
+    })
+
 @app.route('/api/text-to-speech', methods=['POST'])
 @login_required
 @csrf.exempt  # Exempt this endpoint from CSRF protection for API calls
@@ -390,122 +584,125 @@ def text_to_speech():
         lang = data.get('lang', 'es')  # Default to Spanish
         speed = data.get('speed', 0.8)  # Default to slightly slower
         model = data.get('model', 'tts-1')  # Default to standard model
+        audio_format = requested_audio_format(data.get('format'))
 
         if not text or not text.strip():
             return jsonify({'error': 'No text provided'}), 400
+
+        # Return the audio bytes directly instead of a URL
+        if data.get('stream'):
+            return stream_tts_audio(text, lang, speed, model, audio_format)
             
         # Ensure text ends with proper punctuation for better TTS quality
-        text = text.strip()
-        if text and not text[-1] in '.!?':
-            text = text + '.'
+        text = prepare_tts_text(text)
         
         logger.debug(f"Text-to-speech request - Text: {text[:30]}..., Language: {lang}")
 
-        # Map languages to appropriate OpenAI voices based on quality testing
-        language_voice_map = {
-            'es': 'nova',      # Spanish - nova has excellent Spanish pronunciation
-            'it': 'alloy',     # Italian - alloy has better Italian articulation
-            'fr': 'echo',      # French - echo handles French sounds well
-            'de': 'fable',     # German - fable works for German
-            'en': 'onyx',      # English - onyx is a warm English voice
-            'pt': 'nova',      # Portuguese - similar enough to Spanish
-            'ru': 'shimmer',   # Russian
-            'zh': 'nova',      # Mandarin Chinese - nova has decent pronunciation
-            'ja': 'shimmer',   # Japanese
-            'ko': 'shimmer',   # Korean
-            'ar': 'nova',      # Arabic
-            'nl': 'fable',     # Dutch
-            'pl': 'fable',     # Polish
-            'tr': 'alloy',     # Turkish
-            'hi': 'nova',      # Hindi
-            'vi': 'shimmer'    # Vietnamese
-        }
-        
-        voice = language_voice_map.get(lang, 'alloy')  # Default to alloy if language not found
+        voice = voice_for_language(lang)  # Default to alloy if language not found
         logger.debug(f"Selected voice '{voice}' for language '{lang}'")
         
-        # Create temporary file with unique name
-        audio_filename = f'tts_{datetime.utcnow().timestamp()}.mp3'
-        audio_dir = os.path.join('static', 'audio', 'tts')
-        os.makedirs(audio_dir, exist_ok=True)
-        audio_path = os.path.join(audio_dir, audio_filename)
-        
-        # Check if OpenAI API key is available
-        openai_api_key = os.environ.get("OPENAI_API_KEY")
-        # Clean up key if it has line breaks or whitespace
-        if openai_api_key:
-            openai_api_key = openai_api_key.strip().replace('\n', '')
-        
-        if not openai_api_key:
-            # Fall back to gTTS if no OpenAI API key is available
-            logger.warning("No OpenAI API key available, falling back to gTTS")
-            try:
-                tts = gTTS(text=text, lang=lang, lang_check=False)  # Disable strict language check
-                tts.save(audio_path)
-            except Exception as gtts_error:
-                logger.error(f"gTTS error: {str(gtts_error)}")
-                return jsonify({'error': f'Failed to generate audio: {str(gtts_error)}'}), 500
-        else:
-            # Use OpenAI's TTS
-            try:
-                client = openai.OpenAI(api_key=openai_api_key)
-                
-                speech_file_response = client.audio.speech.create(
-                    model=model,
-                    voice=voice,
-                    input=text,
-                    speed=speed
-                )
-                
-                # Save the file
-                with open(audio_path, "wb") as file:
-                    for chunk in speech_file_response.iter_bytes(chunk_size=1024):
-                        file.write(chunk)
-                
-                logger.debug(f"OpenAI TTS audio saved to: {audio_path}")
-            except Exception as openai_error:
-                logger.error(f"OpenAI TTS error: {str(openai_error)}")
-                
-                # Fallback to gTTS if OpenAI fails
-                logger.info(f"Falling back to gTTS after OpenAI error")
-                try:
-                    tts = gTTS(text=text, lang=lang, lang_check=False)
-                    tts.save(audio_path)
-                    logger.debug(f"Fallback gTTS audio saved to: {audio_path}")
-                except Exception as gtts_error:
-                    logger.error(f"gTTS fallback error: {str(gtts_error)}")
-                    return jsonify({'error': f'Both TTS methods failed: {str(openai_error)}, then {str(gtts_error)}'}), 500
-
-        # Verify file was created and has content
-        if not os.path.exists(audio_path) or os.path.getsize(audio_path) == 0:
-            logger.error(f"Audio file not created or empty: {audio_path}")
-            return jsonify({'error': 'Failed to create audio file'}), 500
+        # Files are named after the request so identical requests reuse them
+        try:
+            audio_filename, cached = ensure_audio_file(text, lang, voice, model, speed, audio_format=audio_format)
+        except llm_budget.BudgetExceeded as e:
+            return llm_budget.limited_response(e)
+        except Exception as tts_error:
+            return jsonify({'error': str(tts_error)}), 500
             
         # Return the URL path to the audio file
-        audio_url = url_for('static', filename=f'audio/tts/{audio_filename}')
+        audio_url = url_for('serve_audio', filename=f'tts/{audio_filename}')
         return jsonify({
             'audio_url': audio_url,
             'text': text,
             'language': lang,
-            'voice': voice
+            'voice': voice,
+            'format': audio_format,
+            'mimetype': FORMATS[audio_format]['mimetype'],
+            'cached': cached
         })
 
+    except llm_budget.BudgetExceeded as e:
+        return llm_budget.limited_response(e)
     except Exception as e:
         logger.error(f"Error generating audio: {str(e)}")
         return jsonify({'error': f'Failed to generate audio: {str(e)}'}), 500
 
+@app.route('/api/text-to-speech/stream', methods=['GET'])
+@login_required
+def text_to_speech_stream():
+    """Streaming variant of text_to_speech that an <audio> element can play as it loads."""
+    try:
+        text = request.args.get('text')
+        lang = request.args.get('lang', 'es')
+        speed = request.args.get('speed', 0.8, type=float)
+        model = request.args.get('model', 'tts-1')
+        audio_format = requested_audio_format(request.args.get('format'))
+
+        if not text or not text.strip():
+            return jsonify({'error': 'No text provided'}), 400
+
+        return stream_tts_audio(text, lang, speed, model, audio_format)
+    except llm_budget.BudgetExceeded as e:
+        return llm_budget.limited_response(e)
+    except Exception as e:
+        logger.error(f"Error streaming audio: {str(e)}")
+        return jsonify({'error': f'Failed to generate audio: {str(e)}'}), 500
+
+@app.route(f'{AUDIO_URL_PATH}/<path:filename>')
+def serve_audio(filename):
+    """Serve generated audio with long-lived cache headers and byte-range support.
+
+    Stored audio is never rewritten (file names are content hashes), so the
+    name doubles as a strong ETag and responses can be cached as immutable.
+    """
+    name, extension = os.path.splitext(filename)
+    if extension.lstrip('.') not in AUDIO_EXTENSIONS:
+        abort(404)
+
+    # conditional=True answers If-None-Match with 304 and Range with 206
+    # AUDIO_ROOT is relative to the working directory, like everywhere it is written
+    response = send_from_directory(
+        os.path.abspath(AUDIO_ROOT), filename,
+        conditional=True,
+        etag=os.path.basename(name),
+        max_age=AUDIO_CACHE_MAX_AGE
+    )
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    audio_storage.touch(os.path.join(AUDIO_ROOT, *filename.split('/')))
+    return response
+
+@app.route('/api/audio/cache-stats', methods=['GET'])
+@login_required
+def get_audio_cache_stats():
+    """Report TTS cache hits and misses with the estimated latency and API spend saved."""
+    stats = tts_cache.get_stats()
+    stats['storage'] = audio_storage.get_stats()
+    return jsonify(stats)
+
+@app.route('/api/openai/pool-stats', methods=['GET'])
+@login_required
+def get_openai_pool_stats():
+    """Report this worker's OpenAI connection pool usage for sizing against gunicorn workers."""
+    return jsonify(get_pool_stats())
+
+@app.route('/api/write-behind/stats', methods=['GET'])
+@login_required
+def get_write_behind_stats():
+    """Report this worker's write-behind queue depth and batching counters."""
+    return jsonify(write_behind.get_stats())
+
 @app.route('/api/save-progress', methods=['POST'])
 @login_required
 def save_progress():
     try:
         data = request.json
-        progress = Progress(
+        write_behind.add(
+            Progress,
             user_id=current_user.id,
             exercise_id=data['exercise_id'],
             score=data['score']
         )
-        db.session.add(progress)
-        db.session.commit()
         return jsonify({'status': 'success'})
     except Exception as e:
         logger.error(f"Progress save error: {str(e)}")
@@ -612,6 +809,8 @@ def get_vocabulary_exercise():
                         'language': word.language,
                         'example_sentence': word.example_sentence,
                         'category': word.category,
+                        'audio_url': word.audio_url,
+                        'example_audio_url': word.example_audio_url,
                     })
                 else:
                     # If no words in user's language, get any word
@@ -624,6 +823,8 @@ def get_vocabulary_exercise():
                             'language': word.language,
                             'example_sentence': word.example_sentence,
                             'category': word.category,
+                            'audio_url': word.audio_url,
+                            'example_audio_url': word.example_audio_url,
                         })
             except Exception as e:
                 logger.error(f"Error in fallback vocabulary fetch: {str(e)}")
@@ -716,6 +917,8 @@ def get_vocabulary_exercise():
             'language': word.language,
             'example_sentence': word.example_sentence,
             'category': word.category,
+            'audio_url': word.audio_url,
+            'example_audio_url': word.example_audio_url,
         }
 
         # Add distractors for multiple choice
@@ -750,6 +953,8 @@ def get_vocabulary_exercise():
                     'language': word.language,
                     'example_sentence': word.example_sentence,
                     'category': word.category or 'General',
+                    'audio_url': word.audio_url,
+                    'example_audio_url': word.example_audio_url,
                 })
         except:
             pass
@@ -1024,16 +1229,19 @@ def preferences():
 
     return render_template('preferences.html', form=form)
 
-@app.route('/submit-sentence', methods=['POST'])
+def sentence_practice_redirect():
+    # The practice page the form was posted from
+    return redirect(request.referrer or url_for('vocabulary_practice'))
+
 @login_required
-def submit_sentence():
+def prepare_sentence():
     try:
         vocabulary_id = request.form.get('vocabulary_id')
         sentence = request.form.get('sentence', '').strip()
 
         if not vocabulary_id or not sentence:
             flash('Please provide a sentence.', 'error')
-            return redirect(url_for('daily_practice'))
+            return sentence_practice_redirect()
 
         # Get the vocabulary item
         vocab_item = VocabularyItem.query.get_or_404(vocabulary_id)
@@ -1052,29 +1260,51 @@ def submit_sentence():
             "feedback": "detailed feedback and suggestions"
         }}
         """
+        return {'vocabulary_id': vocabulary_id, 'sentence': sentence, 'prompt': prompt}
 
-        response = chat_with_ai(prompt)
-        feedback_data = json.loads(response)
+    except Exception as e:
+        logger.error(f"Error submitting sentence: {str(e)}")
+        flash('An error occurred while submitting your sentence.', 'error')
+        return sentence_practice_redirect()
 
+def finish_sentence(state, feedback):
+    try:
         # Save the practice attempt
-        practice = SentencePractice(
+        write_behind.add(
+            SentencePractice,
             user_id=current_user.id,
-            vocabulary_item_id=vocabulary_id,
-            sentence=sentence,
-            correction=feedback_data.get('correction'),
-            feedback=feedback_data.get('feedback')
+            vocabulary_item_id=state['vocabulary_id'],
+            sentence=state['sentence'],
+            correction=feedback.correction,
+            feedback=feedback.feedback
         )
 
-        db.session.add(practice)
-        db.session.commit()
-
         flash('Sentence submitted successfully!', 'success')
-        return redirect(url_for('daily_practice'))
+        return sentence_practice_redirect()
 
     except Exception as e:
-        logger.error(f"Error submitting sentence: {str(e)}")
-        flash('An error occurred while submitting your sentence.', 'error')
-        return redirect(url_for('daily_practice'))
+        return fail_sentence(state, e)
+
+def fail_sentence(state, error):
+    logger.error(f"Error submitting sentence: {str(error)}")
+    db.session.rollback()
+    flash('An error occurred while submitting your sentence.', 'error')
+    return sentence_practice_redirect()
+
+sentence_view = LLMView(
+    prepare_sentence,
+    lambda state: structured_output.request(SentenceFeedback, state['prompt']),
+    lambda state: structured_output.arequest(SentenceFeedback, state['prompt']),
+    finish_sentence,
+    fail_sentence,
+    priority='standard',
+    estimate=lambda state: llm_budget.estimate_tokens(state['prompt'])
+)
+
+@app.route('/submit-sentence', methods=['POST'])
+@login_required
+def submit_sentence():
+    return sentence_view()
 
 from werkzeug.security import generate_password_hash, check_password_hash
 
@@ -1241,6 +1471,105 @@ def initialize_speaking_scenarios():
             db.session.rollback()
             logger.error(f"Error initializing speaking scenarios: {e}")
 
+# Conversation prompts and hints for each speaking scenario, by language and category
+SPEAKING_SCENARIO_PROMPTS = {
+    'es': {  # Spanish prompts
+        'restaurant': {
+            'prompts': [
+                "¡Hola! ¿Qué le gustaría ordenar hoy?",
+                "¿Desea alguna bebida con su comida?",
+                "¿Tiene alguna restricción dietética o pedido especial?",
+                "¿Le gustaría ordenar postre?"
+            ],
+            'hints': [
+                "Me gustaría ordenar... / Quiero... / Para mí...",
+                "Sí, me gustaría... / No, gracias. / ¿Tienen...?",
+                "Soy vegetariano/a... / Soy alérgico/a a... / Sin...",
+                "Sí, ¿qué postres tienen? / No, gracias. La cuenta, por favor."
+            ]
+        },
+        'travel': {
+            'prompts': [
+                "Disculpe, ¿podría ayudarme a encontrar la estación de tren?",
+                "¿Cuánto tiempo se tarda en llegar allí?",
+                "¿Hay algún punto de referencia que deba buscar?",
+                "¿Cuál es la mejor manera de comprar los billetes?"
+            ],
+            'hints': [
+                "¿Puede decirme cómo llegar a...? / ¿Dónde está...?",
+                "¿Está lejos? / ¿Cuántos minutos...?",
+                "¿Qué edificios...? / ¿Paso por...?",
+                "¿Dónde puedo comprar...? / ¿Hay una taquilla...?"
+            ]
+        },
+        'greetings': {
+            'prompts': [
+                "¡Buenos días! ¿Cómo está hoy?",
+                "¿Qué hizo durante el fin de semana?",
+                "¿Le gustaría tomar un café algún día?",
+                "¡Encantado de conocerle!"
+            ],
+            'hints': [
+                "Muy bien, gracias. / Estoy... / Todo bien...",
+                "Fui a... / Estuve en... / Me quedé en casa...",
+                "Sí, me encantaría. / Che ne dice...?",
+                "¡Igualmente! / ¡Hasta pronto! / ¡Nos vemos!"
+            ]
+        }
+    },
+    'it': {  # Italian prompts
+        'restaurant': {
+            'prompts': [
+                "Buongiorno! Cosa desidera ordinare oggi?",
+                "Vuole qualcosa da bere con il pasto?",
+                "Ha delle restrizioni alimentari o richieste speciali?",
+                "Desidera ordinare un dessert?"
+            ],
+            'hints': [
+                "Vorrei ordinare... / Per me... / Prendo...",
+                "Sì, vorrei... / No, grazie. / Avete...?",
+                "Sono vegetariano/a... / Sono allergico/a a... / Senza...",
+                "Sì, che dolci avete? / No, grazie. Il conto, per favore."
+            ]
+        },
+        'travel': {
+            'prompts': [
+                "Scusi, può aiutarmi a trovare la stazione dei treni?",
+                "Quanto tempo ci vuole per arrivarci?",
+                "Ci sono dei punti di riferimento che devo cercare?",
+                "Qual è il modo migliore per comprare i biglietti?"
+            ],
+            'hints': [
+                "Mi può dire come arrivare a...? / Dov'è...?",
+                "È lontano? / Quanti minuti...?",
+                "Quali edifici...? / Devo passare...?",
+                "Dove posso comprare...? / C'è una biglietteria...?"
+            ]
+        },
+        'greetings': {
+            'prompts': [
+                "Buongiorno! Come sta oggi?",
+                "Cosa ha fatto durante il fine settimana?",
+                "Le piacerebbe prendere un caffè qualche volta?",
+                "È stato un piacere conoscerla!"
+            ],
+            'hints': [
+                "Molto bene, grazie. / Sono... / Tutto bene...",
+                "Sono andato/a a... / Sono stato/a a... / Sono rimasto/a a casa...",
+                "Sì, mi piacerebbe molto. / Che ne dice...?",
+                "Altrettanto! / Arrivederci! / Ci vediamo!"
+            ]
+        }
+    }
+}
+
+def get_scenario_prompts(target_language, category):
+    """Return the (prompts, hints) lists for a speaking scenario."""
+    entry = SPEAKING_SCENARIO_PROMPTS.get(target_language, {}).get(category)
+    if not entry:
+        return [], []
+    return entry['prompts'], entry['hints']
+
 @app.route('/api/speaking/scenario/<scenario_id>')
 @login_required
 def get_speaking_scenario(scenario_id):
@@ -1263,88 +1592,13 @@ def get_speaking_scenario(scenario_id):
             return jsonify({'error': 'No scenario found'}), 404
 
         # Get conversation prompts and hints for the scenario based on language
-        prompts = []
-        hints = []
-        if scenario.target_language == 'es':  # Spanish prompts
-            if scenario.category == 'restaurant':
-                prompts = [
-                    "¡Hola! ¿Qué le gustaría ordenar hoy?",
-                    "¿Desea alguna bebida con su comida?",
-                    "¿Tiene alguna restricción dietética o pedido especial?",
-                    "¿Le gustaría ordenar postre?"
-                ]
-                hints = [
-                    "Me gustaría ordenar... / Quiero... / Para mí...",
-                    "Sí, me gustaría... / No, gracias. / ¿Tienen...?",
-                    "Soy vegetariano/a... / Soy alérgico/a a... / Sin...",
-                    "Sí, ¿qué postres tienen? / No, gracias. La cuenta, por favor."
-                ]
-            elif scenario.category == 'travel':
-                prompts = [
-                    "Disculpe, ¿podría ayudarme a encontrar la estación de tren?",
-                    "¿Cuánto tiempo se tarda en llegar allí?",
-                    "¿Hay algún punto de referencia que deba buscar?",
-                    "¿Cuál es la mejor manera de comprar los billetes?"
-                ]
-                hints = [
-                    "¿Puede decirme cómo llegar a...? / ¿Dónde está...?",
-                    "¿Está lejos? / ¿Cuántos minutos...?",
-                    "¿Qué edificios...? / ¿Paso por...?",
-                    "¿Dónde puedo comprar...? / ¿Hay una taquilla...?"
-                ]
-            elif scenario.category == 'greetings':
-                prompts = [
-                    "¡Buenos días! ¿Cómo está hoy?",
-                    "¿Qué hizo durante el fin de semana?",
-                    "¿Le gustaría tomar un café algún día?",
-                    "¡Encantado de conocerle!"
-                ]
-                hints = [
-                    "Muy bien, gracias. / Estoy... / Todo bien...",
-                    "Fui a... / Estuve en... / Me quedé en casa...",
-                    "Sí, me encantaría. / Che ne dice...?",
-                    "¡Igualmente! / ¡Hasta pronto! / ¡Nos vemos!"
-                ]
-        elif scenario.target_language == 'it':  # Italian prompts
-            if scenario.category == 'restaurant':
-                prompts = [
-                    "Buongiorno! Cosa desidera ordinare oggi?",
-                    "Vuole qualcosa da bere con il pasto?",
-                    "Ha delle restrizioni alimentari o richieste speciali?",
-                    "Desidera ordinare un dessert?"
-                ]
-                hints = [
-                    "Vorrei ordinare... / Per me... / Prendo...",
-                    "Sì, vorrei... / No, grazie. / Avete...?",
-                    "Sono vegetariano/a... / Sono allergico/a a... / Senza...",
-                    "Sì, che dolci avete? / No, grazie. Il conto, per favore."
-                ]
-            elif scenario.category == 'travel':
-                prompts = [
-                    "Scusi, può aiutarmi a trovare la stazione dei treni?",
-                    "Quanto tempo ci vuole per arrivarci?",
-                    "Ci sono dei punti di riferimento che devo cercare?",
-                    "Qual è il modo migliore per comprare i biglietti?"
-                ]
-                hints = [
-                    "Mi può dire come arrivare a...? / Dov'è...?",
-                    "È lontano? / Quanti minuti...?",
-                    "Quali edifici...? / Devo passare...?",
-                    "Dove posso comprare...? / C'è una biglietteria...?"
-                ]
-            elif scenario.category == 'greetings':
-                prompts = [
-                    "Buongiorno! Come sta oggi?",
-                    "Cosa ha fatto durante il fine settimana?",
-                    "Le piacerebbe prendere un caffè qualche volta?",
-                    "È stato un piacere conoscerla!"
-                ]
-                hints = [
-                    "Molto bene, grazie. / Sono... / Tutto bene...",
-                    "Sono andato/a a... / Sono stato/a a... / Sono rimasto/a a casa...",
-                    "Sì, mi piacerebbe molto. / Che ne dice...?",
-                    "Altrettanto! / Arrivederci! / Ci vediamo!"
-                ]
+        prompts, hints = get_scenario_prompts(scenario.target_language, scenario.category)
+
+        # Use the pre-rendered audio pack, rendering it in the background if missing
+        pack = load_scenario_pack(scenario.id, prompts, hints)
+        if pack is None and (prompts or hints):
+            start_scenario_pack_job(app, scenario.id, scenario.target_language, prompts, hints)
+        pack = pack or {'prompt_audio_urls': [], 'hint_audio_urls': []}
 
         return jsonify({
             'id': scenario.id,
@@ -1353,6 +1607,8 @@ def get_speaking_scenario(scenario_id):
             'example_audio_url': scenario.example_audio_url,
             'prompts': prompts,
             'hints': hints,
+            'prompt_audio_urls': pack['prompt_audio_urls'],
+            'hint_audio_urls': pack['hint_audio_urls'],
             'target_language': scenario.target_language
         })
 
@@ -1360,9 +1616,48 @@ def get_speaking_scenario(scenario_id):
         logger.error(f"Error loading speaking scenario: {str(e)}")
         return jsonify({'error': 'Failed to load scenario'}), 500
 
+# Token cost charged for a speaking submission (Whisper plus the feedback prompt)
+SPEAKING_EVALUATION_TOKENS = 1500
+
+# How often the events stream of a speaking job checks the job, and how long
+# it stays open. On the ASGI entry point the stream only waits on the event
+# loop; a sync worker is held for the whole stream, so there it ends after a
+# few seconds and EventSource reconnects after SPEAKING_EVENTS_RETRY_MS.
+SPEAKING_EVENTS_POLL_INTERVAL = 0.5
+SPEAKING_EVENTS_TIMEOUT = 120
+SPEAKING_EVENTS_SYNC_TIMEOUT = 5
+SPEAKING_EVENTS_RETRY_MS = 1000
+
+def speaking_job_urls(job_id):
+    """URLs to follow a job by; the events stream is only offered on the ASGI entry point."""
+    urls = {'status_url': url_for('get_speaking_job', job_id=job_id)}
+    if request.environ.get(ASGI_ENVIRON_KEY):
+        urls['events_url'] = url_for('speaking_job_events', job_id=job_id)
+    return urls
+
+def speaking_job_frames(job, seen):
+    """SSE frames for what changed in a speaking job; seen holds what the stream already sent."""
+    frames = []
+    if job.transcript and not seen.get('transcript'):
+        seen['transcript'] = True
+        frames.append(sse_event('transcript', {'transcript': job.transcript}))
+    if job.status != seen.get('status'):
+        seen['status'] = job.status
+        frames.append(sse_event('status', {'status': job.status}))
+        if job.status == 'done':
+            frames.append(sse_event('feedback', job.to_dict()))
+        elif job.status == 'failed':
+            frames.append(sse_event('error', {'error': job.error}))
+    return frames
+
 @app.route('/api/speaking/submit', methods=['POST'])
 @login_required
 def submit_speaking_practice():
+    """Queue a speaking recording for evaluation and return its job.
+
+    Transcription and feedback run in the background; poll status_url or
+    listen on events_url for progress.
+    """
     try:
         if 'audio' not in request.files:
             logger.error("No audio file in request.files")
@@ -1370,89 +1665,99 @@ def submit_speaking_practice():
 
         audio_file = request.files['audio']
         logger.debug(f"Received audio file: {audio_file.filename}, mimetype: {audio_file.mimetype}")
-        
-        scenario_id = request.form.get('scenario_id')
-        prompt_index = request.form.get('prompt_index', 0)
 
+        scenario_id = request.form.get('scenario_id')
         if not scenario_id:
             logger.error("No scenario_id provided")
             return jsonify({'error': 'No scenario ID provided'}), 400
 
-        # Save the audio file temporarily
-        temp_audio_path = os.path.join(tempfile.gettempdir(), f'speaking_{datetime.utcnow().timestamp()}.webm')
-        logger.debug(f"Saving audio to temporary file: {temp_audio_path}")
-        audio_file.save(temp_audio_path)
-        
-        # Log file size and existence
-        file_size = os.path.getsize(temp_audio_path) if os.path.exists(temp_audio_path) else "File does not exist"
-        logger.debug(f"Temporary audio file size: {file_size} bytes")
-        
-        # Transcribe the audio using OpenAI's Whisper
-        logger.debug(f"About to transcribe audio from path: {temp_audio_path}")
-        try:
-            transcription = transcribe_audio(temp_audio_path)
-            logger.debug(f"Transcription result: {transcription}")
-        except Exception as e:
-            logger.error(f"Transcription error: {str(e)}")
-            return jsonify({'error': f'Failed to transcribe audio: {str(e)}'}), 500
-
-        # Get the scenario for comparison
         scenario = SpeakingExercise.query.get(scenario_id)
         if not scenario:
             logger.error(f"Scenario not found with ID: {scenario_id}")
             return jsonify({'error': 'Scenario not found'}), 404
 
-        # Create prompt for pronunciation feedback
-        prompt = f"""
-        As a language tutor for {scenario.target_language}, evaluate this spoken response:
-        Scenario: {scenario.scenario}
-        Student's transcribed response: {transcription}
-
-        Provide detailed feedback in JSON format:
-        {{
-            "pronunciation_score": float (0-100),
-            "pronunciation_feedback": "specific feedback about pronunciation and accent",
-            "grammar_feedback": "feedback about grammar usage",
-            "vocabulary_feedback": "feedback about word choice and vocabulary",
-            "fluency_score": float (0-100),
-            "improvement_suggestions": ["list", "of", "specific", "suggestions"],
-            "correct_response_example": "an example of a good response"
-        }}
-        """
-
-        feedback_response = chat_with_ai(prompt)
-        logger.debug(f"AI Feedback response: {feedback_response}")
-
+        # Small recordings never touch the disk before the kept copy is written
         try:
-            feedback_data = json.loads(feedback_response)
-        except json.JSONDecodeError as e:
-            logger.error(f"Failed to parse AI feedback: {e}")
-            return jsonify({'error': 'Invalid feedback format'}), 500
+            recording = speaking_recordings.spool(audio_file)
+        except speaking_recordings.RecordingTooLarge as e:
+            return jsonify({'error': str(e)}), 413
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
 
-        # Save the attempt in the database
-        attempt = UserSpeakingAttempt(
-            user_id=current_user.id,
-            exercise_id=scenario_id,
-            audio_recording_url=temp_audio_path,
-            pronunciation_score=feedback_data['pronunciation_score'],
-            feedback=json.dumps(feedback_data)
-        )
-
-        db.session.add(attempt)
-        db.session.commit()
-
-        # Clean up temporary audio file
+        # Charge the transcription and feedback calls once the upload is known to be usable
         try:
-            os.remove(temp_audio_path)
-        except Exception as e:
-            logger.warning(f"Failed to remove temporary audio file: {e}")
-
-        return jsonify(feedback_data)
-
+            llm_budget.acquire(SPEAKING_EVALUATION_TOKENS, 'standard')
+        except llm_budget.BudgetExceeded as e:
+            recording.close()
+            return llm_budget.limited_response(e)
+        extension = speaking_recordings.extension_for(audio_file.filename, audio_file.mimetype)
+
+        job = speaking_jobs.create(current_user.id, scenario.id, recording, extension)
+        logger.debug(f"Queued speaking job {job.id} for scenario {scenario.id}")
+        return jsonify({'job_id': job.id, 'status': job.status, **speaking_job_urls(job.id)}), 202
     except Exception as e:
         logger.error(f"Error processing speaking submission: {str(e)}")
         return jsonify({'error': 'Failed to process submission'}), 500
 
+@app.route(f'{RECORDING_URL_PATH}/<filename>')
+@login_required
+def serve_speaking_recording(filename):
+    """Serve a kept speaking recording to the user who made it."""
+    if not SpeakingJob.query.filter_by(audio_path=filename, user_id=current_user.id, status='done').first():
+        abort(404)
+    # Recordings are never rewritten, but they are private
+    response = send_from_directory(os.path.abspath(RECORDINGS_DIR), filename, conditional=True)
+    response.cache_control.private = True
+    return response
+
+@app.route('/api/speaking/jobs/<job_id>')
+@login_required
+def get_speaking_job(job_id):
+    """Return the status of a speaking job, with its transcript and feedback once available."""
+    job = SpeakingJob.query.filter_by(id=job_id, user_id=current_user.id).first()
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify({**job.to_dict(), **speaking_job_urls(job.id)})
+
+@app.route('/api/speaking/jobs/<job_id>/events')
+@login_required
+def speaking_job_events(job_id):
+    """Stream the progress of a speaking job as Server-Sent Events.
+
+    Sends a 'status' event on every change, 'transcript' as soon as the
+    recording is transcribed, then 'feedback' or 'error'. This is the sync
+    worker version, which closes after SPEAKING_EVENTS_SYNC_TIMEOUT; asgi.py
+    serves the same events with poll_speaking_job_events.
+    """
+    user_id = current_user.id
+    if not SpeakingJob.query.filter_by(id=job_id, user_id=user_id).first():
+        return jsonify({'error': 'Job not found'}), 404
+
+    def generate():
+        deadline = time.monotonic() + SPEAKING_EVENTS_SYNC_TIMEOUT
+        seen = {}
+        yield f"retry: {SPEAKING_EVENTS_RETRY_MS}\n\n"
+        while True:
+            # Other workers update the row, so always read it fresh
+            db.session.expire_all()
+            job = db.session.get(SpeakingJob, job_id)
+            yield from speaking_job_frames(job, seen)
+            if job.status in ('done', 'failed') or time.monotonic() >= deadline:
+                return
+            db.session.rollback()
+            time.sleep(SPEAKING_EVENTS_POLL_INTERVAL)
+
+    headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers=headers)
+
+@login_required
+def poll_speaking_job_events(seen, job_id):
+    """One check of a speaking job for AsyncLLMApp.add_stream; see speaking_job_events."""
+    job = SpeakingJob.query.filter_by(id=job_id, user_id=current_user.id).first()
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    return {'frames': speaking_job_frames(job, seen), 'finished': job.status in ('done', 'failed')}
+
 @app.route('/api/speaking/example-audio', methods=['POST'])
 @login_required
 def generate_example_audio():
@@ -1460,151 +1765,98 @@ def generate_example_audio():
         data = request.get_json()
         text = data.get('text')
         lang = data.get('language', 'es')  # Default to Spanish
+        audio_format = requested_audio_format(data.get('format'))
 
         if not text or not text.strip():
             return jsonify({'error': 'No text provided'}), 400
             
         # Ensure text ends with proper punctuation for better TTS quality
-        text = text.strip()
-        if text and not text[-1] in '.!?':
-            text = text + '.'
+        text = prepare_tts_text(text)
         
-        # Try to detect the language from the text if not specified or mismatched
-        # Basic language detection heuristics for common words/characters
-        detected_lang = lang
+        # Only the implicit Spanish default is corrected; a language the caller chose is kept
+        detected_lang = lang or 'es'
         if not lang or lang == 'es':
-            # Check for Italian words/phrases
-            italian_markers = ['è', 'sono', 'mia', 'casa', 'molto', 'ciao', 'grazie', 'piacere', 'come stai']
-            if any(marker in text.lower() for marker in italian_markers) and 'è' in text:
-                detected_lang = 'it'
-                logger.debug(f"Language detected as Italian instead of {lang}")
-            
-            # Check for French words/phrases
-            french_markers = ['je suis', 'bonjour', 'merci', 'je', 'tu', 'nous', 'vous', 'très', 'beaucoup']
-            if any(marker in text.lower() for marker in french_markers):
-                detected_lang = 'fr'
-                logger.debug(f"Language detected as French instead of {lang}")
-            
-            # Check for German words/phrases
-            german_markers = ['ich', 'bin', 'du', 'ist', 'hallo', 'guten', 'danke', 'bitte', 'haus']
-            if any(marker in text.lower() for marker in german_markers):
-                detected_lang = 'de'
-                logger.debug(f"Language detected as German instead of {lang}")
-            
+            guessed_lang = confident_language(text)
+            if guessed_lang and guessed_lang != detected_lang:
+                logger.debug(f"Language detected as {guessed_lang} instead of {lang}")
+                detected_lang = guessed_lang
+
         logger.debug(f"Example audio request - Text: {text[:30]}..., Language: {lang}, Detected: {detected_lang}")
 
-        # Map languages to appropriate OpenAI voices based on quality testing
-        language_voice_map = {
-            'es': 'nova',      # Spanish - nova has excellent Spanish pronunciation
-            'it': 'alloy',     # Italian - alloy has better Italian articulation
-            'fr': 'echo',      # French - echo handles French sounds well
-            'de': 'fable',     # German - fable works for German
-            'en': 'onyx',      # English - onyx is a warm English voice
-            'pt': 'nova',      # Portuguese - similar enough to Spanish
-            'ru': 'shimmer',   # Russian
-            'zh': 'nova',      # Mandarin Chinese - nova has decent pronunciation
-            'ja': 'shimmer',   # Japanese
-            'ko': 'shimmer',   # Korean
-            'ar': 'nova',      # Arabic
-            'nl': 'fable',     # Dutch
-            'pl': 'fable',     # Polish
-            'tr': 'alloy',     # Turkish
-            'hi': 'nova',      # Hindi
-            'vi': 'shimmer'    # Vietnamese
-        }
-        
-        voice = language_voice_map.get(detected_lang, 'alloy')  # Default to alloy if language not found
+        voice = voice_for_language(detected_lang)  # Default to alloy if language not found
         logger.debug(f"Selected voice '{voice}' for language '{detected_lang}'")
         
-        # Create temporary file with unique name
-        audio_filename = f'example_{datetime.utcnow().timestamp()}.mp3'
-        audio_path = os.path.join('static', 'audio', 'examples', audio_filename)
-
-        # Ensure audio directory exists
-        os.makedirs(os.path.join('static', 'audio', 'examples'), exist_ok=True)
-        
-        # Check if OpenAI API key is available
-        openai_api_key = os.environ.get("OPENAI_API_KEY")
-        # Clean up key if it has line breaks or whitespace
-        if openai_api_key:
-            openai_api_key = openai_api_key.strip().replace('\n', '')
-        logger.debug(f"OpenAI API key available: {bool(openai_api_key)}")
+        # For complex phonetic languages, always use HD model
+        model_to_use = "tts-1-hd"  # Always use high definition for examples
+        speed = 0.75  # Slightly slower for better comprehension and learning
         
-        if not openai_api_key:
-            # Fall back to gTTS if no OpenAI API key is available
-            logger.warning("No OpenAI API key available, falling back to gTTS")
-            try:
-                tts = gTTS(text=text, lang=detected_lang, lang_check=False)  # Disable strict language check
-                tts.save(audio_path)
-            except Exception as gtts_error:
-                logger.error(f"gTTS error: {str(gtts_error)}")
-                # Try with Spanish as a fallback
-                try:
-                    fallback_lang = 'es'
-                    logger.info(f"Trying fallback language {fallback_lang}")
-                    tts = gTTS(text=text, lang=fallback_lang, lang_check=False)
-                    tts.save(audio_path)
-                except Exception as fallback_error:
-                    logger.error(f"Fallback gTTS error: {str(fallback_error)}")
-                    return jsonify({'error': f'Failed to generate example audio: {str(gtts_error)}'}), 500
-        else:
-            # Use OpenAI's TTS
-            try:
-                client = openai.OpenAI(api_key=openai_api_key)
-                
-                # For complex phonetic languages, always use HD model
-                model_to_use = "tts-1-hd"  # Always use high definition for examples
-                
-                speech_file_response = client.audio.speech.create(
-                    model=model_to_use,
-                    voice=voice,
-                    input=text,
-                    speed=0.75  # Slightly slower for better comprehension and learning
-                )
-                
-                # Save the file
-                with open(audio_path, "wb") as file:
-                    for chunk in speech_file_response.iter_bytes(chunk_size=1024):
-                        file.write(chunk)
-                
-                logger.debug(f"OpenAI TTS audio saved to: {audio_path}")
-            except Exception as openai_error:
-                logger.error(f"OpenAI TTS error: {str(openai_error)}")
-                
-                # Fallback to gTTS if OpenAI fails
-                logger.info(f"Falling back to gTTS after OpenAI error")
-                try:
-                    # For fallback, don't enforce strict language checking
-                    tts = gTTS(text=text, lang=detected_lang, lang_check=False)
-                    tts.save(audio_path)
-                    logger.debug(f"Fallback gTTS audio saved to: {audio_path}")
-                except Exception as gtts_error:
-                    logger.error(f"gTTS fallback error: {str(gtts_error)}")
-                    return jsonify({'error': f'Both TTS methods failed: {str(openai_error)}, then {str(gtts_error)}'}), 500
-
-        # Verify file was created and has content
-        if not os.path.exists(audio_path) or os.path.getsize(audio_path) == 0:
-            logger.error(f"Audio file not created or empty: {audio_path}")
-            return jsonify({'error': 'Failed to create audio file'}), 500
+        # Files are named after the request so identical requests reuse them
+        try:
+            audio_filename, cached = ensure_audio_file(
+                text, detected_lang, voice, model_to_use, speed,
+                subdir='examples', prefix='example', fallback_lang='es', audio_format=audio_format
+            )
+        except llm_budget.BudgetExceeded as e:
+            return llm_budget.limited_response(e)
+        except Exception as tts_error:
+            return jsonify({'error': f'Failed to generate example audio: {str(tts_error)}'}), 500
             
-        logger.debug(f"Audio file created successfully: {audio_path}, size: {os.path.getsize(audio_path)} bytes")
+        logger.debug(f"Example audio ready: {audio_filename}, cached: {cached}")
 
         # Return the URL path to the audio file
-        audio_url = url_for('static', filename=f'audio/examples/{audio_filename}')
+        audio_url = url_for('serve_audio', filename=f'examples/{audio_filename}')
         return jsonify({
             'audio_url': audio_url,
             'text': text,
             'language': detected_lang,
-            'voice': voice
+            'voice': voice,
+            'format': audio_format,
+            'cached': cached
         })
 
     except Exception as e:
         logger.error(f"Error generating example audio: {str(e)}")
         return jsonify({'error': f'Failed to generate example audio: {str(e)}'}), 500
 
-@app.route('/api/translate', methods=['POST'])
+def lookup_translation(text, requested_lang, target_lang):
+    """Detect the source language of text and look it up in the translation tiers.
+
+    Returns a result dict for the response. It has translated_text and tier
+    when a cheaper tier answered, and lookup_lang for storing an LLM result.
+    """
+    source_lang = requested_lang
+    confidence = None
+    if source_lang == 'auto':
+        detected_lang, confidence = detect_language(text)
+        if detected_lang and confidence >= min_confidence(text):
+            source_lang = detected_lang
+
+    result = {
+        'original_text': text,
+        'translated_text': None,
+        'source_lang': source_lang,
+        'target_lang': target_lang,
+        'detection_confidence': confidence,
+        'tier': None,
+        'lookup_lang': None if requested_lang == 'auto' else source_lang
+    }
+
+    # Vocabulary, then this worker's memo, then the shared cache; the LLM only on a miss
+    try:
+        cached = translation_cache.lookup(text, result['lookup_lang'], target_lang, preferred_lang=source_lang)
+    except Exception as e:
+        logger.warning(f"Translation cache lookup failed: {e}")
+        cached = None
+    if cached:
+        result['translated_text'], result['tier'], cached_lang = cached
+        result['source_lang'] = cached_lang or source_lang
+    return result
+
+def translation_response(result):
+    return {key: value for key, value in result.items() if key != 'lookup_lang'}
+
 @login_required
-def translate_text():
+def prepare_translation():
     try:
         data = request.json
         text = data.get('text')
@@ -1613,40 +1865,257 @@ def translate_text():
         
         if not text:
             return jsonify({'error': 'No text provided'}), 400
-            
+
+        result = lookup_translation(text, source_lang, target_lang)
+        if result['tier']:
+            return jsonify(translation_response(result))
+        source_lang = result['source_lang']
+
         # Create translation prompt
+        source_name = LANGUAGE_NAMES.get(source_lang, source_lang)
+        target_name = LANGUAGE_NAMES.get(target_lang, target_lang)
         prompt = f"""
-        Translate the following text from {source_lang} to {target_lang}:
+        Translate the following text from {source_name} to {target_name}:
         
         {text}
         
         Only provide the translation, without any explanations or additional text.
         """
-        
-        # Use OpenAI's API for translation
-        response = chat_with_ai(prompt)
-        
-        # Extract the text from the response
-        translated_text = response
-        if isinstance(response, dict) and 'content' in response:
-            translated_text = response['content']
-        
-        # Trim whitespace and remove quotes if present
-        translated_text = translated_text.strip()
-        if translated_text.startswith('"') and translated_text.endswith('"'):
-            translated_text = translated_text[1:-1]
-        
-        return jsonify({
-            'original_text': text,
-            'translated_text': translated_text,
-            'source_lang': source_lang,
-            'target_lang': target_lang
-        })
+        return {
+            'result': result,
+            'prompt': prompt
+        }
+    except Exception as e:
+        logger.error(f"Translation error: {str(e)}")
+        return jsonify({'error': f'Translation failed: {str(e)}'}), 500
+
+def clean_translation(response):
+    """Pull the translated text out of an LLM reply, dropping surrounding quotes."""
+    translated_text = response
+    if isinstance(response, dict) and 'content' in response:
+        translated_text = response['content']
+    translated_text = translated_text.strip()
+    if translated_text.startswith('"') and translated_text.endswith('"'):
+        translated_text = translated_text[1:-1]
+    return translated_text
+
+def translation_flight_key(result):
+    return f"translate:{translation_cache.make_key(result['original_text'], result['lookup_lang'], result['target_lang'])}"
+
+def store_translation(result, response):
+    """Clean an LLM reply and cache it unless it is the error fallback or a mock reply."""
+    translated_text = clean_translation(response)
+    error = isinstance(response, dict) and bool(response.get('error'))
+    if not error and not use_mock:
+        translation_cache.store(result['original_text'], result['lookup_lang'], result['target_lang'], translated_text)
+    return {'content': translated_text, 'error': error}
+
+def recheck_translation(result):
+    """Find a translation another worker finished while this one waited for it."""
+    with app.app_context():
+        cached = translation_cache.lookup_cached(result['original_text'], result['lookup_lang'], result['target_lang'])
+    return {'content': cached[0], 'error': False} if cached else None
+
+def request_translation(state):
+    # Identical translations requested at the same time share one LLM call
+    result = state['result']
+    return single_flight.do(
+        translation_flight_key(result),
+        lambda: store_translation(result, chat_with_ai(state['prompt'])),
+        recheck=lambda: recheck_translation(result)
+    )
+
+async def arequest_translation(state):
+    result = state['result']
+
+    def store(response):
+        with app.app_context():
+            return store_translation(result, response)
+
+    async def translate():
+        return await asyncio.to_thread(store, await achat_with_ai(state['prompt']))
+
+    return await single_flight.ado(
+        translation_flight_key(result),
+        translate,
+        recheck=lambda: recheck_translation(result)
+    )
+
+def finish_translation(state, flight):
+    try:
+        response, shared = flight
+        result = state['result']
+        result.update(translated_text=response['content'], tier='coalesced' if shared else 'llm')
+        return jsonify(translation_response(result))
         
     except Exception as e:
         logger.error(f"Translation error: {str(e)}")
         return jsonify({'error': f'Translation failed: {str(e)}'}), 500
 
+def fail_translation(state, error):
+    logger.error(f"Translation error: {str(error)}")
+    return jsonify({'error': f'Translation failed: {str(error)}'}), 500
+
+# Use OpenAI's API for translation
+translate_view = LLMView(
+    prepare_translation,
+    request_translation,
+    arequest_translation,
+    finish_translation,
+    fail_translation,
+    priority='interactive',
+    estimate=lambda state: llm_budget.estimate_tokens(
+        state['prompt'], state['result']['original_text'], completion=0
+    )
+)
+
+@app.route('/api/translate', methods=['POST'])
+@login_required
+def translate_text():
+    return translate_view()
+
+# Limits for one batch translation request
+MAX_BATCH_SEGMENTS = 50
+MAX_BATCH_CHARACTERS = 8000
+
+@login_required
+def prepare_batch_translation():
+    try:
+        data = request.json or {}
+        segments = data.get('segments')
+        source_lang = data.get('source_lang', 'auto')
+        target_lang = data.get('target_lang', 'en')
+
+        if not isinstance(segments, list) or not segments:
+            return jsonify({'error': 'No segments provided'}), 400
+        if not all(isinstance(segment, str) and segment.strip() for segment in segments):
+            return jsonify({'error': 'Segments must be non-empty strings'}), 400
+        if len(segments) > MAX_BATCH_SEGMENTS or sum(len(segment) for segment in segments) > MAX_BATCH_CHARACTERS:
+            return jsonify({
+                'error': f'At most {MAX_BATCH_SEGMENTS} segments and {MAX_BATCH_CHARACTERS} characters per batch'
+            }), 400
+
+        results = [lookup_translation(segment, source_lang, target_lang) for segment in segments]
+
+        # Repeated segments go upstream once
+        pending = {}
+        for index, result in enumerate(results):
+            if not result['tier']:
+                key = translation_cache.make_key(result['original_text'], result['lookup_lang'], target_lang)
+                pending.setdefault(key, []).append(index)
+        if not pending:
+            return jsonify(batch_translation_response(results))
+
+        upstream = [results[indexes[0]] for indexes in pending.values()]
+        return {
+            'results': results,
+            'pending': list(pending.values()),
+            'segments': [
+                (None if result['source_lang'] == 'auto' else LANGUAGE_NAMES.get(result['source_lang'], result['source_lang']),
+                 result['original_text'])
+                for result in upstream
+            ],
+            'target_name': LANGUAGE_NAMES.get(target_lang, target_lang)
+        }
+    except Exception as e:
+        logger.error(f"Batch translation error: {str(e)}")
+        return jsonify({'error': f'Translation failed: {str(e)}'}), 500
+
+def finish_batch_translation(state, translations):
+    try:
+        results = state['results']
+        for indexes, translated_text in zip(state['pending'], translations):
+            first = results[indexes[0]]
+            # Mock replies and segments sent back unchanged would poison the cache
+            if translated_text and not use_mock and not translation_cache.echoes_source(first['original_text'], translated_text):
+                translation_cache.store(first['original_text'], first['lookup_lang'], first['target_lang'], translated_text)
+            for index in indexes:
+                if translated_text:
+                    results[index].update(translated_text=translated_text, tier='llm')
+                else:
+                    results[index]['error'] = 'No translation returned for this segment'
+        return jsonify(batch_translation_response(results))
+    except Exception as e:
+        return fail_batch_translation(state, e)
+
+def fail_batch_translation(state, error):
+    logger.error(f"Batch translation error: {str(error)}")
+    return jsonify({'error': f'Translation failed: {str(error)}'}), 500
+
+def batch_translation_response(results):
+    tiers = {}
+    for result in results:
+        if result['tier']:
+            tiers[result['tier']] = tiers.get(result['tier'], 0) + 1
+    return {'results': [translation_response(result) for result in results], 'tiers': tiers}
+
+batch_translate_view = LLMView(
+    prepare_batch_translation,
+    lambda state: translate_batch(state['segments'], state['target_name']),
+    lambda state: atranslate_batch(state['segments'], state['target_name']),
+    finish_batch_translation,
+    fail_batch_translation,
+    priority='standard',
+    # The translations come back about as long as the segments
+    estimate=lambda state: sum(
+        2 * llm_budget.estimate_tokens(text, completion=0) for _, text in state['segments']
+    )
+)
+
+@app.route('/api/translate/batch', methods=['POST'])
+@login_required
+def translate_batch_segments():
+    """Translate a list of segments in order, with one upstream call for all cache misses."""
+    return batch_translate_view()
+
+@app.route('/api/translate/cache-stats', methods=['GET'])
+@login_required
+def get_translation_cache_stats():
+    """Report how many translations each tier answered in this worker."""
+    return jsonify(translation_cache.get_stats())
+
+@app.route('/api/single-flight/stats', methods=['GET'])
+@login_required
+def get_single_flight_stats():
+    """Report how many identical LLM and TTS calls were collapsed into one in this worker."""
+    return jsonify(single_flight.get_stats())
+
+@app.route('/api/llm-budget/stats', methods=['GET'])
+@login_required
+def get_llm_budget_stats():
+    """Report how many OpenAI calls each priority class was allowed or refused in this worker."""
+    return jsonify(llm_budget.get_stats())
+
+@app.route('/api/llm-resilience/stats', methods=['GET'])
+@login_required
+def get_llm_resilience_stats():
+    """Report retries, failures and circuit breaker state per OpenAI operation in this worker."""
+    return jsonify(llm_resilience.get_stats())
+
+@app.route('/api/structured-output/stats', methods=['GET'])
+@login_required
+def get_structured_output_stats():
+    """Report how many JSON replies validated as-is, were repaired locally, or were unusable."""
+    return jsonify(structured_output.get_stats())
+
+@app.route('/api/audio-preprocess/stats', methods=['GET'])
+@login_required
+def get_audio_preprocess_stats():
+    """Report bytes and audio trimmed before transcription, and Whisper latency with and without it."""
+    return jsonify(audio_preprocess.get_stats())
+
+@app.route('/api/segmented-transcription/stats', methods=['GET'])
+@login_required
+def get_segmented_transcription_stats():
+    """Report recordings transcribed in parallel segments and how long they took against their longest segment."""
+    return jsonify(segmented_transcription.get_stats())
+
+@app.route('/api/speaking/jobs/stats', methods=['GET'])
+@login_required
+def get_speaking_job_stats():
+    """Report how many speaking jobs were evaluated, retried or failed in this worker."""
+    return jsonify(speaking_jobs.get_stats())
+
 @app.route('/profile')
 @login_required
 def profile():
@@ -1822,10 +2291,8 @@ def update_language():
         flash('An error occurred while updating your language preference.', 'danger')
         return redirect(url_for('profile'))
 
-@app.route('/api/generate-vocabulary', methods=['POST'])
 @login_required
-def generate_vocabulary():
-    """Generate new vocabulary words using OpenAI and add them to the user's daily set."""
+def prepare_vocabulary():
     try:
         # Check if user has preferences
         if not current_user.preferences:
@@ -1894,126 +2361,110 @@ def generate_vocabulary():
         """
         
         # Get API key - first check if we have one
-        openai_api_key = os.environ.get("OPENAI_API_KEY")
-        if not openai_api_key:
+        if not get_openai_api_key():
             logger.error("OpenAI API key not available")
             return jsonify({'error': 'OpenAI API key not configured'}), 500
+
+        return {
+            'prompt': prompt,
+            'target_language': target_language,
+            'difficulty': difficulty
+        }
+    except Exception as e:
+        logger.error(f"Error generating vocabulary: {str(e)}")
+        return jsonify({'error': f'Failed to generate vocabulary: {str(e)}'}), 500
+
+# Completion tokens assumed for a generated vocabulary list
+VOCABULARY_COMPLETION_TOKENS = 2000
+
+VOCABULARY_SYSTEM_PROMPT = "You are a helpful language learning assistant."
+
+def request_vocabulary(state):
+    return structured_output.request(
+        VocabularyList, state['prompt'], system=VOCABULARY_SYSTEM_PROMPT,
+        model="gpt-4o", temperature=0.7, operation='generation'
+    )
+
+async def arequest_vocabulary(state):
+    return await structured_output.arequest(
+        VocabularyList, state['prompt'], system=VOCABULARY_SYSTEM_PROMPT,
+        model="gpt-4o", temperature=0.7, operation='generation'
+    )
+
+def finish_vocabulary(state, generated):
+    try:
+        target_language = state['target_language']
+        difficulty = state['difficulty']
+        vocabulary_items = generated.vocabulary
+        logger.debug(f"Received {len(vocabulary_items)} generated vocabulary items")
+        if not vocabulary_items:
+            return jsonify({'error': 'No vocabulary words were generated'}), 500
+
+        # Create or update the daily vocabulary set
+        today = datetime.utcnow().date()
         
-        # Clean up the API key if it contains newlines or extra whitespace
-        openai_api_key = openai_api_key.strip().replace('\n', '')
-        logger.debug(f"OpenAI API key available (length: {len(openai_api_key)})")
+        # Delete any existing daily set for today
+        daily_set = DailyVocabulary.query.filter_by(
+            user_id=current_user.id,
+            date=today
+        ).first()
         
-        try:
-            # Use the OpenAI client to generate vocabulary
-            client = openai.OpenAI(api_key=openai_api_key)
-            response = client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {"role": "system", "content": "You are a helpful language learning assistant."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.7,
-                response_format={"type": "json_object"}
+        if daily_set:
+            # Clear existing vocabulary
+            daily_set.vocabulary_items = []
+        else:
+            # Create new daily set
+            daily_set = DailyVocabulary(user_id=current_user.id, date=today)
+            db.session.add(daily_set)
+        
+        # Add new words to database
+        for item in vocabulary_items:
+            vocab_item = VocabularyItem(
+                word=item.word,
+                translation=item.translation,
+                language=target_language,
+                category=item.category,
+                difficulty=difficulty,
+                example_sentence=item.example_sentence
             )
-            
-            # Parse the response
-            content = response.choices[0].message.content
-            logger.debug(f"Received OpenAI response with content length: {len(content)}")
-            
-            # Try to parse the JSON with error handling
-            try:
-                data = json.loads(content)
-                logger.debug(f"Successfully parsed JSON response: {type(data)}")
-                
-                # Extract vocabulary items from the response structure
-                vocabulary_items = None
-                if isinstance(data, dict):
-                    if 'vocabulary' in data:
-                        vocabulary_items = data['vocabulary']
-                    elif 'words' in data:
-                        vocabulary_items = data['words']
-                    elif 'items' in data:
-                        vocabulary_items = data['items']
-                    else:
-                        # Just get the first array in the response
-                        for key, value in data.items():
-                            if isinstance(value, list) and len(value) > 0:
-                                vocabulary_items = value
-                                break
-                
-                # If we didn't find any arrays, and data is a list, use it directly
-                if vocabulary_items is None and isinstance(data, list):
-                    vocabulary_items = data
-                
-                # If we still don't have vocabulary items, log and return error
-                if vocabulary_items is None:
-                    logger.error(f"Could not find vocabulary items in response: {content[:200]}...")
-                    return jsonify({'error': 'Failed to parse vocabulary data structure'}), 500
-                
-                # Ensure vocabulary_items is a list before proceeding
-                if not isinstance(vocabulary_items, list):
-                    logger.error(f"Vocabulary items is not a list: {type(vocabulary_items)}")
-                    return jsonify({'error': 'Invalid vocabulary data format'}), 500
-                
-                logger.debug(f"Final vocabulary items list has {len(vocabulary_items)} items")
-                
-            except json.JSONDecodeError as e:
-                logger.error(f"JSON decode error: {str(e)}")
-                logger.error(f"Raw content: {content[:200]}...")
-                return jsonify({'error': 'Failed to parse vocabulary data'}), 500
-            
-            # Create or update the daily vocabulary set
-            today = datetime.utcnow().date()
-            
-            # Delete any existing daily set for today
-            daily_set = DailyVocabulary.query.filter_by(
-                user_id=current_user.id,
-                date=today
-            ).first()
-            
-            if daily_set:
-                # Clear existing vocabulary
-                daily_set.vocabulary_items = []
-            else:
-                # Create new daily set
-                daily_set = DailyVocabulary(user_id=current_user.id, date=today)
-                db.session.add(daily_set)
-            
-            # Add new words to database
-            for item in vocabulary_items:
-                try:
-                    # Create new vocabulary item
-                    vocab_item = VocabularyItem(
-                        word=item['word'],
-                        translation=item['translation'],
-                        language=target_language,
-                        category=item.get('category', 'general'),  # Default to 'general' if category is missing
-                        difficulty=difficulty,
-                        example_sentence=item.get('example_sentence', '')  # Default to empty string if example is missing
-                    )
-                    db.session.add(vocab_item)
-                    
-                    # Add to daily set
-                    daily_set.vocabulary_items.append(vocab_item)
-                except KeyError as e:
-                    logger.error(f"Missing required key in item: {str(e)}")
-                    # Continue with other items even if one has an error
-                    continue
-            
-            db.session.commit()
-            logger.info(f"Generated {len(vocabulary_items)} new vocabulary items")
-            
-            return jsonify({'success': True, 'count': len(vocabulary_items)})
-            
-        except Exception as openai_error:
-            logger.error(f"OpenAI API error: {str(openai_error)}")
-            return jsonify({'error': f'Failed to generate vocabulary: {str(openai_error)}'}), 500
-            
+            db.session.add(vocab_item)
+
+            # Add to daily set
+            daily_set.vocabulary_items.append(vocab_item)
+        
+        db.session.commit()
+        logger.info(f"Generated {len(vocabulary_items)} new vocabulary items")
+        
+        # Synthesize audio for the new words so flashcards don't wait on TTS
+        start_vocabulary_audio_job(app, [item.id for item in daily_set.vocabulary_items])
+        
+        return jsonify({'success': True, 'count': len(vocabulary_items)})
+        
     except Exception as e:
         logger.error(f"Error generating vocabulary: {str(e)}")
         db.session.rollback()
         return jsonify({'error': f'Failed to generate vocabulary: {str(e)}'}), 500
 
+def fail_vocabulary(state, error):
+    logger.error(f"OpenAI API error: {str(error)}")
+    return jsonify({'error': f'Failed to generate vocabulary: {str(error)}'}), 500
+
+vocabulary_view = LLMView(
+    prepare_vocabulary,
+    request_vocabulary,
+    arequest_vocabulary,
+    finish_vocabulary,
+    fail_vocabulary,
+    priority='batch',
+    estimate=lambda state: llm_budget.estimate_tokens(state['prompt'], completion=VOCABULARY_COMPLETION_TOKENS)
+)
+
+@app.route('/api/generate-vocabulary', methods=['POST'])
+@login_required
+def generate_vocabulary():
+    """Generate new vocabulary words using OpenAI and add them to the user's daily set."""
+    return vocabulary_view()
+
 @app.route('/api/auth/dynamic/callback', methods=['POST'])
 def dynamic_auth_callback():
     data = request.get_json()
@@ -2613,6 +3064,58 @@ def initialize_vocabulary_for_language(language_code):
         logger.error(f"Error initializing vocabulary for {language_code}: {e}")
         return False
 
+@app.cli.command('generate-vocabulary-audio')
+@click.option('--language', default=None, help='Only process words in this language code.')
+@click.option('--limit', type=int, default=None, help='Maximum number of words to process.')
+@click.option('--workers', type=int, default=DEFAULT_WORKERS, help='Concurrent synthesis calls.')
+def generate_vocabulary_audio_command(language, limit, workers):
+    """Pre-generate audio for vocabulary words and example sentences that have none."""
+    updated = pregenerate_vocabulary_audio(app, language=language, limit=limit, max_workers=workers)
+    click.echo(f"Generated audio for {updated} vocabulary items")
+
+@app.cli.command('render-scenario-audio')
+@click.option('--force', is_flag=True, help='Re-render packs that are already up to date.')
+@click.option('--workers', type=int, default=DEFAULT_WORKERS, help='Concurrent synthesis calls.')
+def render_scenario_audio_command(force, workers):
+    """Pre-render audio packs for every prompt and hint of every speaking scenario."""
+    rendered = render_all_scenario_packs(app, get_scenario_prompts, force=force, max_workers=workers)
+    click.echo(f"Rendered {rendered} scenario audio packs")
+
+@app.cli.command('scan-audio-storage')
+def scan_audio_storage_command():
+    """Register audio files written before the storage manifest existed so they can be evicted."""
+    added = audio_storage.scan(AUDIO_ROOT)
+
+    # Audio linked from the database or scenario packs must survive eviction
+    prefixes = (f'{AUDIO_URL_PATH}/', f'{app.static_url_path}/audio/')
+    urls = set()
+    for item in VocabularyItem.query.all():
+        urls.update(url for url in (item.audio_url, item.example_audio_url) if url)
+    for scenario in SpeakingExercise.query.all():
+        if scenario.example_audio_url:
+            urls.add(scenario.example_audio_url)
+        prompts, hints = get_scenario_prompts(scenario.target_language, scenario.category)
+        pack = load_scenario_pack(scenario.id, prompts, hints)
+        if pack:
+            urls.update(pack['prompt_audio_urls'] + pack['hint_audio_urls'])
+    pinned = 0
+    for url in urls:
+        for prefix in prefixes:
+            if url.startswith(prefix):
+                audio_storage.pin(os.path.join(AUDIO_ROOT, *url[len(prefix):].split('/')))
+                pinned += 1
+                break
+    audio_storage.flush()
+    click.echo(f"Registered {added} audio files, pinned {pinned} referenced files")
+
+@app.cli.command('evict-audio')
+@click.option('--max-bytes', type=int, default=None, help='Override AUDIO_STORAGE_MAX_BYTES for this run.')
+def evict_audio_command(max_bytes):
+    """Delete least-recently-used generated audio until storage is under budget."""
+    audio_storage.flush()
+    freed = audio_storage.evict(max_bytes=max_bytes)
+    click.echo(f"Freed {freed} bytes")
+
 # Initialize application
 with app.app_context():
     db.create_all()
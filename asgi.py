@@ -0,0 +1,32 @@
+"""ASGI entry point that serves the LLM-bound endpoints on an event loop.
+
+Run with:
+
+    gunicorn --bind 0.0.0.0:5000 -k uvicorn.workers.UvicornWorker asgi:application
+
+The routes below await the async OpenAI client, so a single worker can keep
+hundreds of upstream calls in flight. Speaking job progress is streamed from
+the event loop too, so open streams don't hold worker threads. Everything else
+is the regular Flask app.
+"""
+import re
+
+from main import app
+from app import (
+    chat_view, translate_view, batch_translate_view, sentence_view, vocabulary_view,
+    poll_speaking_job_events, SPEAKING_EVENTS_POLL_INTERVAL, SPEAKING_EVENTS_TIMEOUT
+)
+from utils.llm_views import AsyncLLMApp
+
+application = AsyncLLMApp(app)
+application.add('/api/chat', chat_view)
+application.add('/api/translate', translate_view)
+application.add('/api/translate/batch', batch_translate_view)
+application.add('/submit-sentence', sentence_view)
+application.add('/api/generate-vocabulary', vocabulary_view)
+application.add_stream(
+    re.compile(r'/api/speaking/jobs/(?P<job_id>[0-9a-f]+)/events'),
+    poll_speaking_job_events,
+    interval=SPEAKING_EVENTS_POLL_INTERVAL,
+    timeout=SPEAKING_EVENTS_TIMEOUT
+)
@@ -16,7 +16,7 @@ logger.debug(f"DATABASE_URL: {os.environ.get('DATABASE_URL')}")
 db_path = os.environ.get("DATABASE_URL", "")
 if db_path.startswith('sqlite:////'):
     # Absolute path
-    file_path = db_path.replace('sqlite:////', '')
+    file_path = db_path.replace('sqlite:///', '', 1)
     db_dir = os.path.dirname(file_path)
     logger.debug(f"Ensuring database directory exists: {db_dir}")
     os.makedirs(db_dir, exist_ok=True)
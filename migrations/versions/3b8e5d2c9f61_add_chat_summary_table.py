@@ -0,0 +1,31 @@
+"""Add ChatSummary table for rolling chat context
+
+Revision ID: 3b8e5d2c9f61
+Revises: 7c2d9f4b1a3e
+Create Date: 2025-03-24 09:41:17.204583
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3b8e5d2c9f61'
+down_revision = '7c2d9f4b1a3e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('chat_summary',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('summary', sa.Text(), nullable=False),
+    sa.Column('summarized_through_id', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+
+
+def downgrade():
+    op.drop_table('chat_summary')
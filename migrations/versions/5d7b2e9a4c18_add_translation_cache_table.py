@@ -0,0 +1,34 @@
+"""Add TranslationCache table for memoized translations
+
+Revision ID: 5d7b2e9a4c18
+Revises: 9a4e6f1c2b7d
+Create Date: 2025-03-27 10:15:43.581206
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5d7b2e9a4c18'
+down_revision = '9a4e6f1c2b7d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('translation_cache',
+    sa.Column('key', sa.String(length=64), nullable=False),
+    sa.Column('source_lang', sa.String(length=10), nullable=False),
+    sa.Column('target_lang', sa.String(length=10), nullable=False),
+    sa.Column('text', sa.Text(), nullable=False),
+    sa.Column('translation', sa.Text(), nullable=False),
+    sa.Column('hits', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('last_used', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('key')
+    )
+
+
+def downgrade():
+    op.drop_table('translation_cache')
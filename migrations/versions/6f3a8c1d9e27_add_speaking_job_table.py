@@ -0,0 +1,47 @@
+"""Add SpeakingJob table for background speaking evaluation
+
+Revision ID: 6f3a8c1d9e27
+Revises: 5d7b2e9a4c18
+Create Date: 2025-03-28 09:42:17.204315
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6f3a8c1d9e27'
+down_revision = '5d7b2e9a4c18'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('speaking_job',
+    sa.Column('id', sa.String(length=32), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('exercise_id', sa.Integer(), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('audio_path', sa.String(length=255), nullable=True),
+    sa.Column('transcript', sa.Text(), nullable=True),
+    sa.Column('feedback', sa.Text(), nullable=True),
+    sa.Column('attempt_id', sa.Integer(), nullable=True),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('tries', sa.Integer(), nullable=False),
+    sa.Column('claimed_by', sa.String(length=64), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['attempt_id'], ['user_speaking_attempt.id'], ),
+    sa.ForeignKeyConstraint(['exercise_id'], ['speaking_exercise.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('speaking_job', schema=None) as batch_op:
+        batch_op.create_index('ix_speaking_job_status_updated_at', ['status', 'updated_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('speaking_job', schema=None) as batch_op:
+        batch_op.drop_index('ix_speaking_job_status_updated_at')
+
+    op.drop_table('speaking_job')
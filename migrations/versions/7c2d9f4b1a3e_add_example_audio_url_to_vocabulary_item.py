@@ -0,0 +1,26 @@
+"""Add example_audio_url to VocabularyItem model
+
+Revision ID: 7c2d9f4b1a3e
+Revises: 0ee17429ec06
+Create Date: 2025-03-20 10:12:41.518304
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7c2d9f4b1a3e'
+down_revision = '0ee17429ec06'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('vocabulary_item', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('example_audio_url', sa.String(length=200), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('vocabulary_item', schema=None) as batch_op:
+        batch_op.drop_column('example_audio_url')
@@ -0,0 +1,25 @@
+"""Add (user_id, timestamp, id) index for paging chat history
+
+Revision ID: 9a4e6f1c2b7d
+Revises: 3b8e5d2c9f61
+Create Date: 2025-03-26 14:08:52.730119
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '9a4e6f1c2b7d'
+down_revision = '3b8e5d2c9f61'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('chat', schema=None) as batch_op:
+        batch_op.create_index('ix_chat_user_timestamp_id', ['user_id', 'timestamp', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('chat', schema=None) as batch_op:
+        batch_op.drop_index('ix_chat_user_timestamp_id')
@@ -1,3 +1,4 @@
+import json
 from app import db
 from flask_login import UserMixin
 from datetime import datetime
@@ -56,6 +57,29 @@ class Chat(db.Model):
     response = db.Column(db.Text, nullable=False)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
 
+    # Chat history is paged by (timestamp, id) within a user
+    __table_args__ = (
+        db.Index('ix_chat_user_timestamp_id', 'user_id', 'timestamp', 'id'),
+    )
+
+class ChatSummary(db.Model):
+    # Rolling summary of the chat turns that no longer fit in the prompt
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    summary = db.Column(db.Text, nullable=False, default='')
+    summarized_through_id = db.Column(db.Integer, nullable=False, default=0)  # Last Chat.id folded in
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class TranslationCache(db.Model):
+    # Translations produced by the LLM, shared by all workers
+    key = db.Column(db.String(64), primary_key=True)  # sha256 of source, target and normalized text
+    source_lang = db.Column(db.String(10), nullable=False)  # '' when the source was auto-detected
+    target_lang = db.Column(db.String(10), nullable=False)
+    text = db.Column(db.Text, nullable=False)
+    translation = db.Column(db.Text, nullable=False)
+    hits = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_used = db.Column(db.DateTime, default=datetime.utcnow)
+
 class VocabularyItem(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     word = db.Column(db.String(100), nullable=False)
@@ -65,6 +89,7 @@ class VocabularyItem(db.Model):
     difficulty = db.Column(db.Integer, default=1)  # 1: beginner, 2: intermediate, 3: advanced
     example_sentence = db.Column(db.Text)
     audio_url = db.Column(db.String(200))
+    example_audio_url = db.Column(db.String(200))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 class VocabularyProgress(db.Model):
@@ -120,4 +145,39 @@ class UserSpeakingAttempt(db.Model):
     pronunciation_score = db.Column(db.Float)  # 0-100 score
     feedback = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    exercise = db.relationship('SpeakingExercise')
\ No newline at end of file
+    exercise = db.relationship('SpeakingExercise')
+
+class SpeakingJob(db.Model):
+    # A speaking submission evaluated in the background. Rows outlive worker
+    # restarts; unfinished jobs are picked up again by utils.speaking_jobs.
+    id = db.Column(db.String(32), primary_key=True)  # uuid4 hex, handed to the client
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    exercise_id = db.Column(db.Integer, db.ForeignKey('speaking_exercise.id'), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, transcribing, evaluating, done, failed
+    audio_path = db.Column(db.String(255))  # file name under speaking_recordings.RECORDINGS_DIR
+    transcript = db.Column(db.Text)
+    feedback = db.Column(db.Text)  # JSON of the evaluation
+    attempt_id = db.Column(db.Integer, db.ForeignKey('user_speaking_attempt.id'))
+    error = db.Column(db.Text)
+    tries = db.Column(db.Integer, nullable=False, default=0)
+    claimed_by = db.Column(db.String(64))  # host:pid of the worker running it
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    exercise = db.relationship('SpeakingExercise')
+
+    # The sweeper looks for queued and stalled jobs by status and age
+    __table_args__ = (
+        db.Index('ix_speaking_job_status_updated_at', 'status', 'updated_at'),
+    )
+
+    def to_dict(self):
+        return {
+            'job_id': self.id,
+            'status': self.status,
+            'transcript': self.transcript,
+            'feedback': json.loads(self.feedback) if self.feedback else None,
+            'attempt_id': self.attempt_id,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
+        }
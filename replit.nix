@@ -2,5 +2,6 @@
   deps = [
     pkgs.postgresql
     pkgs.openssl
+    pkgs.ffmpeg
   ];
 }
@@ -12,25 +12,117 @@ let isRecording = false;
 let mediaRecorder = null;
 let audioChunks = [];
 
+// Chat turns already downloaded are kept in localStorage, so opening the page
+// only fetches turns newer than the cached ones; older pages load on scroll
+const HISTORY_CACHE_LIMIT = 200;
+let olderHistoryCursor = null;
+let loadingOlderHistory = false;
+
+function historyCacheKey() {
+    const username = document.querySelector('meta[name="username"]')?.getAttribute('content');
+    return username ? `chat-history:${username}` : null;
+}
+
+function readHistoryCache() {
+    const key = historyCacheKey();
+    if (!key) return null;
+    try {
+        return JSON.parse(localStorage.getItem(key));
+    } catch (e) {
+        return null;
+    }
+}
+
+function writeHistoryCache(cache) {
+    const key = historyCacheKey();
+    if (!key) return;
+    try {
+        localStorage.setItem(key, JSON.stringify(cache));
+    } catch (e) {
+        console.warn('Could not cache chat history:', e);
+    }
+}
+
+async function fetchHistoryPage(params) {
+    const response = await fetch(`/api/chat/history?${new URLSearchParams(params)}`);
+    const data = await response.json();
+    if (!response.ok) {
+        throw new Error(data.error || 'Failed to load chat history');
+    }
+    return data;
+}
+
+function renderTurns(turns, prepend = false) {
+    const fragment = document.createDocumentFragment();
+    const target = prepend ? fragment : chatMessages;
+    turns.forEach(chat => {
+        target.appendChild(createMessage('user', chat.message));
+        target.appendChild(createMessage('assistant', chat.response));
+    });
+    if (prepend) {
+        chatMessages.insertBefore(fragment, chatMessages.firstChild);
+    }
+}
+
 async function loadChatHistory() {
     try {
-        const response = await fetch('/api/chat/history');
-        const data = await response.json();
-        if (response.ok) {
-            chatMessages.innerHTML = ''; // Clear existing messages
-            data.history.reverse().forEach(chat => {
-                appendMessage('user', chat.message);
-                appendMessage('assistant', chat.response);
-            });
+        let cache = readHistoryCache();
+        if (cache && cache.since) {
+            // Fetch only what was said since the cached turns (oldest first)
+            let page;
+            do {
+                page = await fetchHistoryPage({ since: cache.since });
+                cache.turns = cache.turns.concat(page.history.slice().reverse());
+                cache.since = page.cursors.since;
+            } while (page.has_more);
         } else {
-            throw new Error(data.error || 'Failed to load chat history');
+            const page = await fetchHistoryPage({});
+            cache = {
+                turns: page.history.slice().reverse(),
+                since: page.cursors.since,
+                before: page.cursors.before
+            };
         }
+
+        if (cache.turns.length > HISTORY_CACHE_LIMIT) {
+            cache.turns = cache.turns.slice(-HISTORY_CACHE_LIMIT);
+            cache.before = cache.turns[0].cursor;
+        }
+        writeHistoryCache(cache);
+
+        chatMessages.innerHTML = ''; // Clear existing messages
+        renderTurns(cache.turns);
+        chatMessages.scrollTop = chatMessages.scrollHeight;
+        olderHistoryCursor = cache.before;
     } catch (error) {
         console.error('Failed to load chat history:', error);
         appendMessage('system', 'Failed to load chat history');
     }
 }
 
+async function loadOlderHistory() {
+    if (!olderHistoryCursor || loadingOlderHistory) return;
+    loadingOlderHistory = true;
+    try {
+        const page = await fetchHistoryPage({ before: olderHistoryCursor });
+        const previousHeight = chatMessages.scrollHeight;
+        renderTurns(page.history.slice().reverse(), true);
+        // Keep the view where it was while the older turns appear above it
+        chatMessages.scrollTop += chatMessages.scrollHeight - previousHeight;
+        olderHistoryCursor = page.cursors.before;
+    } catch (error) {
+        console.error('Failed to load older chat history:', error);
+    } finally {
+        loadingOlderHistory = false;
+    }
+}
+
+chatMessages.addEventListener('scroll', () => {
+    if (chatMessages.scrollTop < 50) {
+        loadOlderHistory();
+    }
+});
+
 // New chat button handler
 newChatBtn.addEventListener('click', () => {
     chatMessages.innerHTML = ''; // Clear the chat messages
@@ -60,28 +152,34 @@ chatForm.addEventListener('submit', async (e) => {
             console.warn('CSRF token not found. Request may fail.');
         }
 
-        const response = await fetch('/api/chat', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json',
-                'X-CSRFToken': csrfToken || ''
-            },
-            body: JSON.stringify({ message }),
-        });
-
-        const data = await response.json();
-        if (!response.ok) {
-            throw new Error(data.error || 'Failed to get response');
-        }
+        // Stream the reply so it renders as it is generated; fall back to the
+        // plain endpoint if the browser can't read response streams
+        if (window.ReadableStream && window.TextDecoder) {
+            await streamChatReply(message, csrfToken);
+        } else {
+            const response = await fetch('/api/chat', {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                    'X-CSRFToken': csrfToken || ''
+                },
+                body: JSON.stringify({ message }),
+            });
 
-        // Add AI response to chat
-        // Check if the response is a dictionary with content field or just a string
-        let responseContent = data.response;
-        if (typeof responseContent === 'object' && responseContent.content) {
-            responseContent = responseContent.content;
+            const data = await response.json();
+            if (!response.ok) {
+                throw new Error(data.error || 'Failed to get response');
+            }
+
+            // Add AI response to chat
+            // Check if the response is a dictionary with content field or just a string
+            let responseContent = data.response;
+            if (typeof responseContent === 'object' && responseContent.content) {
+                responseContent = responseContent.content;
+            }
+            
+            appendMessage('assistant', responseContent, true);
         }
-        
-        appendMessage('assistant', responseContent, true);
 
     } catch (error) {
         console.error('Chat error:', error);
@@ -94,8 +192,86 @@ chatForm.addEventListener('submit', async (e) => {
     }
 });
 
-// Audio playback handling
-function appendMessage(role, content, canSpeak = false) {
+// Read the Server-Sent Events from /api/chat/stream and render tokens as they arrive
+async function streamChatReply(message, csrfToken) {
+    const response = await fetch('/api/chat/stream', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+            'X-CSRFToken': csrfToken || ''
+        },
+        body: JSON.stringify({ message }),
+    });
+    if (!response.ok || !response.body) {
+        let error = 'Failed to get response';
+        try {
+            error = (await response.json()).error || error;
+        } catch (e) {}
+        throw new Error(error);
+    }
+
+    // Temporary bubble that fills in while the reply streams
+    const pendingDiv = document.createElement('div');
+    pendingDiv.className = 'message assistant-message';
+    const pendingText = document.createElement('span');
+    pendingDiv.appendChild(pendingText);
+    chatMessages.appendChild(pendingDiv);
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let content = '';
+
+    try {
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const frame = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+
+                let event = 'message';
+                let data = '';
+                frame.split('\n').forEach(line => {
+                    if (line.startsWith('event:')) {
+                        event = line.slice(6).trim();
+                    } else if (line.startsWith('data:')) {
+                        data += line.slice(5).trim();
+                    }
+                });
+                const payload = data ? JSON.parse(data) : {};
+
+                if (event === 'token') {
+                    content += payload.content;
+                    pendingText.textContent = content;
+                    chatMessages.scrollTop = chatMessages.scrollHeight;
+                } else if (event === 'done') {
+                    content = payload.response;
+                    console.log(`Chat reply: first token ${payload.ttft_ms} ms, complete ${payload.total_ms} ms`);
+                } else if (event === 'error') {
+                    throw new Error(payload.error || 'Failed to get response');
+                }
+            }
+        }
+    } finally {
+        pendingDiv.remove();
+    }
+
+    // Replace the temporary bubble with a full message that has audio and translate controls
+    appendMessage('assistant', content, true);
+}
+
+// Split text into sentences, keeping their punctuation
+function splitSentences(text) {
+    const sentences = text.split(/(?<=[.!?。！？])\s+/).map(sentence => sentence.trim()).filter(Boolean);
+    return sentences.length ? sentences : [text];
+}
+
+// Build a message bubble; assistant messages get audio and translate controls
+function createMessage(role, content, canSpeak = false) {
     const messageDiv = document.createElement('div');
     messageDiv.className = `message ${role}-message`;
 
@@ -169,14 +345,16 @@ function appendMessage(role, content, canSpeak = false) {
                         }
                     }
                     
-                    const response = await fetch('/api/translate', {
+                    // Translate the reply sentence by sentence in one request, so
+                    // sentences the tutor repeats come from the translation cache
+                    const response = await fetch('/api/translate/batch', {
                         method: 'POST',
                         headers: {
                             'Content-Type': 'application/json',
                             'X-CSRFToken': csrfToken || ''
                         },
                         body: JSON.stringify({ 
-                            text: content,
+                            segments: splitSentences(content),
                             source_lang: sourceLang,
                             target_lang: targetLang
                         }),
@@ -187,7 +365,9 @@ function appendMessage(role, content, canSpeak = false) {
                         throw new Error(data.error || 'Translation failed');
                     }
 
-                    textSpan.textContent = data.translated_text;
+                    textSpan.textContent = data.results
+                        .map(result => result.translated_text || result.original_text)
+                        .join(' ');
                     isTranslated = true;
                     translateButton.innerHTML = '<i class="bi bi-translate"></i> Original';
                 } else {
@@ -230,32 +410,47 @@ function appendMessage(role, content, canSpeak = false) {
                         lang = 'it';    // Italian
                     }
 
-                    // Get CSRF token from meta tag
-                    const csrfToken = document.querySelector('meta[name="csrf-token"]').getAttribute('content');
-
-                    const response = await fetch('/api/text-to-speech', {
-                        method: 'POST',
-                        headers: {
-                            'Content-Type': 'application/json',
-                            'X-CSRFToken': csrfToken
-                        },
-                        body: JSON.stringify({ 
-                            text: content,
-                            lang: lang,  // Pass detected language
-                            speed: 0.8,  // Slightly slower for better comprehension
-                            model: 'tts-1-hd'  // Higher quality audio
-                        }),
+                    // Stream the audio so playback starts on the first chunk. Very long
+                    // replies don't fit in a URL, so those still use the JSON endpoint.
+                    const streamParams = new URLSearchParams({
+                        text: content,
+                        lang: lang,
+                        speed: 0.8,
+                        model: 'tts-1-hd',
+                        format: preferredAudioFormat()
                     });
+                    if (streamParams.toString().length <= 3500) {
+                        console.log(`Streaming audio in ${lang}`);
+                        audio = new Audio(`/api/text-to-speech/stream?${streamParams}`);
+                    } else {
+                        // Get CSRF token from meta tag
+                        const csrfToken = document.querySelector('meta[name="csrf-token"]').getAttribute('content');
+
+                        const response = await fetch('/api/text-to-speech', {
+                            method: 'POST',
+                            headers: {
+                                'Content-Type': 'application/json',
+                                'X-CSRFToken': csrfToken
+                            },
+                            body: JSON.stringify({ 
+                                text: content,
+                                lang: lang,  // Pass detected language
+                                speed: 0.8,  // Slightly slower for better comprehension
+                                model: 'tts-1-hd',  // Higher quality audio
+                                format: preferredAudioFormat()
+                            }),
+                        });
+
+                        const data = await response.json();
+                        if (!response.ok) {
+                            console.error('TTS error:', data.error);
+                            throw new Error(data.error || 'Text-to-speech failed');
+                        }
 
-                    const data = await response.json();
-                    if (!response.ok) {
-                        console.error('TTS error:', data.error);
-                        throw new Error(data.error || 'Text-to-speech failed');
+                        console.log(`Playing audio in ${lang} with voice "${data.voice}"`);
+                        audio = new Audio(data.audio_url);
                     }
 
-                    console.log(`Playing audio in ${lang} with voice "${data.voice}"`);
-                    audio = new Audio(data.audio_url);
-
                     // Add audio event listeners
                     audio.onended = () => {
                         isPlaying = false;
@@ -308,7 +503,11 @@ function appendMessage(role, content, canSpeak = false) {
         messageDiv.appendChild(audioControls);
     }
 
-    chatMessages.appendChild(messageDiv);
+    return messageDiv;
+}
+
+function appendMessage(role, content, canSpeak = false) {
+    chatMessages.appendChild(createMessage(role, content, canSpeak));
     chatMessages.scrollTop = chatMessages.scrollHeight;
 }
 
@@ -373,7 +572,8 @@ function textToSpeech(text, voice = 'nova') {
         },
         body: JSON.stringify({
             text: text,
-            voice: voice
+            voice: voice,
+            format: preferredAudioFormat()
         }),
     })
     .then(response => response.json())
@@ -12,6 +12,17 @@ function getCSRFToken() {
     return tokenElement.getAttribute('content');
 }
 
+// Helper function to pick the smallest TTS audio format this browser can play
+function preferredAudioFormat() {
+    if (new Audio().canPlayType('audio/ogg; codecs="opus"')) {
+        return 'opus';
+    }
+    if (navigator.connection && navigator.connection.saveData) {
+        return 'mp3-low';
+    }
+    return 'mp3';
+}
+
 // Helper function for making API requests that include CSRF token
 async function fetchWithCSRF(url, options = {}) {
     const csrfToken = getCSRFToken();
@@ -64,6 +64,7 @@ document.addEventListener('DOMContentLoaded', () => {
     let audioUrl = null;
     let isRecording = false;
     let mockRecordingTimer = null;
+    let promptAudio = null;
 
     // Find all scenario buttons and attach event listeners
     const scenarioButtons = document.querySelectorAll('.start-scenario');
@@ -381,9 +382,12 @@ document.addEventListener('DOMContentLoaded', () => {
         formData.append('audio', audioBlob, 'recording.wav');
         formData.append('scenario_id', currentScenarioId);
         
-        // Submit to server
+        // Submit to server; evaluation runs as a background job
         fetch('/api/speaking/submit', {
             method: 'POST',
+            headers: {
+                'X-CSRFToken': document.querySelector('meta[name="csrf-token"]')?.content || ''
+            },
             body: formData
         })
         .then(response => {
@@ -392,29 +396,117 @@ document.addEventListener('DOMContentLoaded', () => {
             }
             return response.json();
         })
-        .then(data => {
-            showStatus('Recording submitted successfully');
-            console.log('Submission successful:', data);
-            
-            // Display feedback
-            const feedbackContainer = document.getElementById('feedback-container');
-            if (feedbackContainer) {
-                feedbackContainer.style.display = 'block';
-                const pronunciationScore = document.getElementById('pronunciation-score');
-                const feedbackText = document.getElementById('feedback-text');
-                
-                if (pronunciationScore) pronunciationScore.textContent = data.score || 'N/A';
-                if (feedbackText) feedbackText.textContent = data.feedback || 'No detailed feedback available.';
+        .then(job => {
+            console.log('Submission queued:', job);
+            showStatus('Recording submitted, transcribing...');
+            followSpeakingJob(job);
+        })
+        .catch(error => {
+            console.error('Error submitting recording:', error);
+            showStatus(`Error: ${error.message}`, true);
+        });
+    }
+
+    const JOB_STATUS_MESSAGES = {
+        queued: 'Recording submitted, waiting for an evaluator...',
+        transcribing: 'Transcribing your recording...',
+        evaluating: 'Evaluating your pronunciation...'
+    };
+    const JOB_POLL_INTERVAL = 1000;
+
+    // Follow a speaking job by polling its status; the server only offers an
+    // events stream where keeping it open is cheap (the ASGI entry point)
+    function followSpeakingJob(job) {
+        if (!job.events_url || !window.EventSource) {
+            pollSpeakingJob(job.status_url);
+            return;
+        }
+
+        const source = new EventSource(job.events_url);
+        let finished = false;
+
+        source.addEventListener('status', event => {
+            const status = JSON.parse(event.data).status;
+            if (JOB_STATUS_MESSAGES[status]) showStatus(JOB_STATUS_MESSAGES[status]);
+        });
+        source.addEventListener('transcript', event => {
+            showTranscript(JSON.parse(event.data).transcript);
+        });
+        source.addEventListener('feedback', event => {
+            finished = true;
+            source.close();
+            showSpeakingFeedback(JSON.parse(event.data));
+        });
+        source.addEventListener('error', event => {
+            source.close();
+            if (finished) return;
+            finished = true;
+            if (event.data) {
+                showStatus(`Error: ${JSON.parse(event.data).error}`, true);
+            } else {
+                // Stream closed before the job finished
+                pollSpeakingJob(job.status_url);
+            }
+        });
+    }
+
+    function pollSpeakingJob(statusUrl) {
+        fetch(statusUrl)
+        .then(response => {
+            if (!response.ok) {
+                throw new Error(`Server returned ${response.status}`);
+            }
+            return response.json();
+        })
+        .then(job => {
+            if (job.transcript) showTranscript(job.transcript);
+            if (job.status === 'done') {
+                showSpeakingFeedback(job);
+            } else if (job.status === 'failed') {
+                showStatus(`Error: ${job.error}`, true);
             } else {
-                showStatus('Warning: feedback-container not found', true);
+                if (JOB_STATUS_MESSAGES[job.status]) showStatus(JOB_STATUS_MESSAGES[job.status]);
+                setTimeout(() => pollSpeakingJob(statusUrl), JOB_POLL_INTERVAL);
             }
         })
         .catch(error => {
-            console.error('Error submitting recording:', error);
+            console.error('Error checking submission:', error);
             showStatus(`Error: ${error.message}`, true);
         });
     }
 
+    function showFeedbackContainer() {
+        const feedbackContainer = document.getElementById('feedback-container');
+        if (!feedbackContainer) {
+            showStatus('Warning: feedback-container not found', true);
+            return null;
+        }
+        feedbackContainer.style.display = 'block';
+        return feedbackContainer;
+    }
+
+    function showTranscript(transcript) {
+        if (!showFeedbackContainer()) return;
+        const transcriptText = document.getElementById('transcript-text');
+        if (transcriptText) transcriptText.textContent = transcript;
+    }
+
+    function showSpeakingFeedback(job) {
+        showStatus('Recording evaluated');
+        if (!showFeedbackContainer()) return;
+        const feedback = job.feedback || {};
+        const pronunciationScore = document.getElementById('pronunciation-score');
+        const feedbackText = document.getElementById('feedback-text');
+
+        if (pronunciationScore) {
+            pronunciationScore.textContent = feedback.pronunciation_score != null
+                ? Math.round(feedback.pronunciation_score) : 'N/A';
+        }
+        if (feedbackText) {
+            feedbackText.textContent = feedback.pronunciation_feedback || 'No detailed feedback available.';
+        }
+    }
+
     function displayScenario(data) {
         console.log('Displaying scenario:', data);
         
@@ -453,6 +545,9 @@ document.addEventListener('DOMContentLoaded', () => {
                         <div class="card-header">Prompt:</div>
                         <div class="card-body">
                             <p>${prompt}</p>
+                            <button id="playPromptBtn" class="btn btn-sm btn-secondary">
+                                <i class="bi bi-volume-up"></i> Listen
+                            </button>
                         </div>
                     </div>
                     <div class="mt-4">
@@ -494,6 +589,14 @@ document.addEventListener('DOMContentLoaded', () => {
         document.getElementById('startRecordingBtn')?.addEventListener('click', startRecording);
         document.getElementById('stopRecordingBtn')?.addEventListener('click', stopRecording);
         document.getElementById('submitRecordingBtn')?.addEventListener('click', submitRecording);
+        document.getElementById('playPromptBtn')?.addEventListener('click', playPrompt);
+        
+        // Warm up the pre-rendered audio for the first prompt so it plays instantly
+        const firstPromptUrl = data.prompt_audio_urls && data.prompt_audio_urls[0];
+        if (firstPromptUrl) {
+            promptAudio = new Audio(firstPromptUrl);
+            promptAudio.preload = 'auto';
+        }
         
         // Update navigation buttons
         const prevExerciseBtn = document.getElementById('prev-exercise');
@@ -522,6 +625,47 @@ document.addEventListener('DOMContentLoaded', () => {
         console.log('Scenario displayed successfully');
     }
 
+    // Play the current prompt, using its pre-rendered audio when available
+    async function playPrompt() {
+        const text = prompts[currentPromptIndex];
+        if (!text) return;
+        
+        try {
+            let url = currentScenario?.prompt_audio_urls?.[currentPromptIndex];
+            if (!url) {
+                // No audio pack yet, so synthesize on demand
+                const csrfToken = document.querySelector('meta[name="csrf-token"]')?.getAttribute('content');
+                const response = await fetch('/api/speaking/example-audio', {
+                    method: 'POST',
+                    headers: {
+                        'Content-Type': 'application/json',
+                        'X-CSRFToken': csrfToken || ''
+                    },
+                    body: JSON.stringify({
+                        text: text,
+                        language: currentScenario?.target_language,
+                        format: preferredAudioFormat()
+                    })
+                });
+                const data = await response.json();
+                if (!response.ok) {
+                    throw new Error(data.error || 'Failed to generate audio');
+                }
+                url = data.audio_url;
+            }
+            
+            if (!promptAudio || !promptAudio.src.endsWith(url)) {
+                if (promptAudio) promptAudio.pause();
+                promptAudio = new Audio(url);
+            }
+            promptAudio.currentTime = 0;
+            await promptAudio.play();
+        } catch (error) {
+            console.error('Prompt audio playback failed:', error);
+            showStatus('Failed to play prompt audio', true);
+        }
+    }
+
     // Helper function to update just the prompt text
     function updatePrompt() {
         if (!prompts || !prompts[currentPromptIndex]) return;
@@ -1,6 +1,10 @@
+// Requests made within this many milliseconds of each other share one batch
+const TRANSLATION_BATCH_DELAY = 20;
+
 class TranslationManager {
     constructor() {
         this.cache = new Map();
+        this.pending = new Map(); // "source|target" -> [{ text, resolve, reject }]
         this.initializeTranslatables();
     }
 
@@ -44,21 +48,35 @@ class TranslationManager {
         });
     }
 
-    async getTranslation(text, sourceLang, targetLang) {
+    getTranslation(text, sourceLang, targetLang) {
+        return new Promise((resolve, reject) => {
+            const batchKey = `${sourceLang || 'auto'}|${targetLang || 'en'}`;
+            if (!this.pending.has(batchKey)) {
+                this.pending.set(batchKey, []);
+                setTimeout(() => this.flushBatch(batchKey, sourceLang, targetLang), TRANSLATION_BATCH_DELAY);
+            }
+            this.pending.get(batchKey).push({ text, resolve, reject });
+        });
+    }
+
+    async flushBatch(batchKey, sourceLang, targetLang) {
+        const requests = this.pending.get(batchKey);
+        this.pending.delete(batchKey);
+
         try {
             // Get CSRF token from meta tag
             const csrfToken = document.querySelector('meta[name="csrf-token"]')?.getAttribute('content');
             
-            const response = await fetch('/api/translate', {
+            const response = await fetch('/api/translate/batch', {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
                     'X-CSRFToken': csrfToken || ''
                 },
                 body: JSON.stringify({
-                    text,
-                    source_lang: sourceLang,
-                    target_lang: targetLang
+                    segments: requests.map(request => request.text),
+                    source_lang: sourceLang || 'auto',
+                    target_lang: targetLang || 'en'
                 })
             });
 
@@ -67,10 +85,17 @@ class TranslationManager {
             }
 
             const data = await response.json();
-            return data.translation;
+            requests.forEach((request, i) => {
+                const result = data.results[i];
+                if (result && result.translated_text) {
+                    request.resolve(result.translated_text);
+                } else {
+                    request.reject(new Error(result?.error || 'No translation returned'));
+                }
+            });
         } catch (error) {
             console.error('API error:', error);
-            throw error;
+            requests.forEach(request => request.reject(error));
         }
     }
 
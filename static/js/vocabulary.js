@@ -341,7 +341,7 @@ document.addEventListener('DOMContentLoaded', () => {
             console.error('No current word available');
             return;
         }
-        await playAudio(currentWord.word, currentWord.language);
+        await playAudio(currentWord.word, currentWord.language, currentWord.audio_url);
     });
 
     // Audio playback for example sentence
@@ -351,14 +351,26 @@ document.addEventListener('DOMContentLoaded', () => {
             console.error('No example sentence available');
             return;
         }
-        await playAudio(currentWord.example_sentence, currentWord.language);
+        await playAudio(currentWord.example_sentence, currentWord.language, currentWord.example_audio_url);
     });
 
     // Common audio playback function
-    async function playAudio(text, language) {
+    async function playAudio(text, language, audioUrl = null) {
         try {
             console.log('Attempting to play audio for:', text, language);
             
+            // Catalog words come with pre-generated audio, so skip the TTS call
+            if (audioUrl) {
+                if (audioPlayer) {
+                    audioPlayer.pause();
+                    audioPlayer = null;
+                }
+                audioPlayer = new Audio(audioUrl);
+                await audioPlayer.play();
+                console.log('Pre-generated audio playback started');
+                return;
+            }
+            
             // Get CSRF token from meta tag
             const csrfToken = document.querySelector('meta[name="csrf-token"]')?.getAttribute('content');
             if (!csrfToken) {
@@ -382,7 +394,8 @@ document.addEventListener('DOMContentLoaded', () => {
                     text: text,
                     lang: language,
                     speed: 0.8,         // Slightly slower for better comprehension
-                    model: 'tts-1-hd'   // Higher quality audio
+                    model: 'tts-1-hd',  // Higher quality audio
+                    format: preferredAudioFormat()
                 }),
             });
 
@@ -0,0 +1,89 @@
+import os
+import shutil
+import logging
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+OPUS_BITRATE = os.environ.get('AUDIO_OPUS_BITRATE', '32k')
+LOW_MP3_BITRATE = os.environ.get('AUDIO_LOW_MP3_BITRATE', '48k')
+DEFAULT_FORMAT = os.environ.get('AUDIO_DEFAULT_FORMAT', 'mp3')
+TRANSCODE_TIMEOUT = float(os.environ.get('AUDIO_TRANSCODE_TIMEOUT', 60))
+TRANSCODE_WORKERS = int(os.environ.get('AUDIO_TRANSCODE_WORKERS', os.cpu_count() or 2))
+
+# Output formats for generated speech. 'openai' is the response_format that
+# produces the format directly; formats without one are transcoded from MP3.
+FORMATS = {
+    'mp3': {
+        'extension': 'mp3',
+        'mimetype': 'audio/mpeg',
+        'openai': 'mp3',
+        'ffmpeg': None,
+    },
+    'opus': {
+        'extension': 'ogg',
+        'mimetype': 'audio/ogg',
+        'openai': 'opus',
+        'ffmpeg': ['-c:a', 'libopus', '-b:a', OPUS_BITRATE, '-ac', '1', '-f', 'ogg'],
+    },
+    'mp3-low': {
+        'extension': 'mp3',
+        'mimetype': 'audio/mpeg',
+        'openai': None,
+        'ffmpeg': ['-c:a', 'libmp3lame', '-b:a', LOW_MP3_BITRATE, '-ac', '1', '-ar', '24000', '-f', 'mp3'],
+    },
+}
+
+_FFMPEG = shutil.which('ffmpeg')
+
+# ffmpeg already runs in its own process; the pool caps how many run at once
+# so long clips can't starve the web workers of CPU
+_transcode_pool = ThreadPoolExecutor(max_workers=TRANSCODE_WORKERS, thread_name_prefix='transcode')
+
+
+def is_available(audio_format):
+    """Whether audio_format can be produced on this host.
+
+    Anything other than MP3 needs ffmpeg, since the gTTS fallback only
+    produces MP3.
+    """
+    if audio_format not in FORMATS:
+        return False
+    return audio_format == 'mp3' or _FFMPEG is not None
+
+
+def choose_format(requested=None, accept='', save_data=False):
+    """Pick the output format for a client.
+
+    An explicit, available format wins. Otherwise clients that accept Ogg/Opus
+    get Opus, clients asking to save data get low-bitrate MP3, and everyone
+    else gets DEFAULT_FORMAT.
+    """
+    if requested and is_available(requested):
+        return requested
+    accept = (accept or '').lower()
+    if ('audio/ogg' in accept or 'audio/opus' in accept) and is_available('opus'):
+        return 'opus'
+    if save_data and is_available('mp3-low'):
+        return 'mp3-low'
+    return DEFAULT_FORMAT if is_available(DEFAULT_FORMAT) else 'mp3'
+
+
+def _run_ffmpeg(source_path, target_path, audio_format):
+    command = [_FFMPEG, '-v', 'error', '-y', '-i', source_path] + FORMATS[audio_format]['ffmpeg'] + [target_path]
+    result = subprocess.run(command, capture_output=True, timeout=TRANSCODE_TIMEOUT)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed: {result.stderr.decode('utf-8', 'replace').strip()}")
+
+
+def transcode(source_path, target_path, audio_format):
+    """Convert an MP3 at source_path into audio_format at target_path."""
+    if not FORMATS[audio_format]['ffmpeg']:
+        shutil.copyfile(source_path, target_path)
+        return
+    if _FFMPEG is None:
+        raise RuntimeError(f'ffmpeg is required to produce {audio_format} audio')
+    source_size = os.path.getsize(source_path)
+    _transcode_pool.submit(_run_ffmpeg, source_path, target_path, audio_format).result()
+    logger.debug(f"Transcoded {source_size} bytes of MP3 to {os.path.getsize(target_path)} bytes of {audio_format}")
@@ -0,0 +1,339 @@
+"""Preprocessing of speaking recordings before they are sent to Whisper.
+
+Recordings are decoded to 16 kHz mono PCM, leading and trailing silence is
+trimmed and long pauses are shortened using a frame energy voice activity
+detector, and the result is re-encoded as low-bitrate Ogg/Opus. Whisper
+resamples to 16 kHz mono itself, so nothing it uses is lost, and shorter,
+smaller uploads transcribe faster. Long recordings can also be split at
+silence for utils.segmented_transcription.
+
+Compare sizes and Whisper latency for recordings with:
+
+    python -m utils.audio_preprocess [--transcribe] FILE...
+"""
+import os
+import sys
+import math
+import time
+import array
+import shutil
+import logging
+import argparse
+import threading
+import subprocess
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+logger = logging.getLogger(__name__)
+
+ENABLED = os.environ.get('AUDIO_PREPROCESS', '1') != '0'
+WORKERS = int(os.environ.get('AUDIO_PREPROCESS_WORKERS', os.cpu_count() or 2))
+TIMEOUT = float(os.environ.get('AUDIO_PREPROCESS_TIMEOUT', 60))
+BITRATE = os.environ.get('AUDIO_PREPROCESS_BITRATE', '24k')
+
+SAMPLE_RATE = 16000
+FRAME_MS = 30
+FRAME_SAMPLES = SAMPLE_RATE * FRAME_MS // 1000
+
+# A frame is speech when it is THRESHOLD_DB above the noise floor (the 10th
+# percentile frame level) and louder than MIN_SPEECH_DB. Runs shorter than
+# MIN_SPEECH_FRAMES are clicks, not speech. PAD_MS of audio is kept around
+# speech, and pauses longer than MAX_PAUSE_MS are cut down to 2 * PAD_MS.
+THRESHOLD_DB = float(os.environ.get('AUDIO_PREPROCESS_THRESHOLD_DB', 12))
+MIN_SPEECH_DB = float(os.environ.get('AUDIO_PREPROCESS_MIN_SPEECH_DB', -55))
+MIN_SPEECH_FRAMES = 3
+PAD_MS = int(os.environ.get('AUDIO_PREPROCESS_PAD_MS', 200))
+MAX_PAUSE_MS = int(os.environ.get('AUDIO_PREPROCESS_MAX_PAUSE_MS', 1000))
+
+_SILENT_DB = -100.0
+_FFMPEG = shutil.which('ffmpeg')
+
+_lock = threading.Lock()
+_pool = None
+_pool_pid = None
+_stats = {
+    'processed': 0,
+    'skipped': 0,
+    'failed': 0,
+    'bytes_in': 0,
+    'bytes_out': 0,
+    'seconds_in': 0.0,
+    'seconds_out': 0.0,
+    'processing_seconds': 0.0,
+}
+# Whisper latency for uploads sent as recorded and after preprocessing
+_transcriptions = {
+    'original': {'count': 0, 'seconds': 0.0},
+    'preprocessed': {'count': 0, 'seconds': 0.0},
+}
+
+
+def is_available():
+    """Whether recordings are preprocessed on this host (needs ffmpeg)."""
+    return ENABLED and _FFMPEG is not None
+
+
+def _ffmpeg(arguments, data):
+    command = [_FFMPEG, '-v', 'error', '-nostdin'] + arguments
+    result = subprocess.run(command, input=data, capture_output=True, timeout=TIMEOUT)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed: {result.stderr.decode('utf-8', 'replace').strip()}")
+    return result.stdout
+
+
+def decode(data):
+    """Decode a recording in any format ffmpeg reads to 16 kHz mono 16-bit PCM."""
+    return _ffmpeg(['-i', 'pipe:0', '-ac', '1', '-ar', str(SAMPLE_RATE), '-f', 's16le', 'pipe:1'], data)
+
+
+def encode(pcm):
+    """Encode 16 kHz mono 16-bit PCM as Ogg/Opus."""
+    return _ffmpeg(['-f', 's16le', '-ac', '1', '-ar', str(SAMPLE_RATE), '-i', 'pipe:0',
+                    '-c:a', 'libopus', '-b:a', BITRATE, '-application', 'voip', '-f', 'ogg', 'pipe:1'], pcm)
+
+
+def duration(pcm):
+    """Length of 16 kHz mono 16-bit PCM in seconds."""
+    return len(pcm) / (2 * SAMPLE_RATE)
+
+
+def frame_levels(pcm):
+    """Return the level in dBFS of each FRAME_MS frame of PCM; a partial last frame is dropped."""
+    samples = array.array('h')
+    samples.frombytes(pcm[:len(pcm) - len(pcm) % 2])
+    if sys.byteorder == 'big':
+        samples.byteswap()
+    full_scale = 32768.0 ** 2 * FRAME_SAMPLES
+    levels = []
+    for start in range(0, len(samples) - FRAME_SAMPLES + 1, FRAME_SAMPLES):
+        energy = sum(sample * sample for sample in samples[start:start + FRAME_SAMPLES])
+        levels.append(10 * math.log10(energy / full_scale) if energy else _SILENT_DB)
+    return levels
+
+
+def speech_frames(levels):
+    """Flag which frames hold speech, from frame_levels() output."""
+    if not levels:
+        return []
+    ordered = sorted(levels)
+    floor = ordered[len(ordered) // 10]
+    # Little dynamic range means there is no silence to find
+    if ordered[len(ordered) * 9 // 10] - floor < THRESHOLD_DB:
+        return [True] * len(levels)
+    threshold = max(floor + THRESHOLD_DB, MIN_SPEECH_DB)
+    flags = [level > threshold for level in levels]
+
+    # Drop runs too short to be speech
+    start = None
+    for index, flag in enumerate(flags + [False]):
+        if flag and start is None:
+            start = index
+        elif not flag and start is not None:
+            if index - start < MIN_SPEECH_FRAMES:
+                flags[start:index] = [False] * (index - start)
+            start = None
+    return flags
+
+
+def speech_regions(pcm):
+    """Return [(start, end)] byte ranges of PCM to keep, padded and with short pauses merged.
+
+    Returns an empty list when no speech is found.
+    """
+    flags = speech_frames(frame_levels(pcm))
+    pad = PAD_MS // FRAME_MS
+    max_pause = MAX_PAUSE_MS // FRAME_MS
+    regions = []
+    start = None
+    for index, flag in enumerate(flags + [False]):
+        if flag and start is None:
+            start = index
+        elif not flag and start is not None:
+            begin, end = max(start - pad, 0), index + pad
+            if regions and begin - regions[-1][1] <= max_pause:
+                regions[-1][1] = end
+            else:
+                regions.append([begin, end])
+            start = None
+
+    frame_bytes = FRAME_SAMPLES * 2
+    ranges = [(begin * frame_bytes, min(end * frame_bytes, len(pcm))) for begin, end in regions]
+    # Keep the partial frame at the end when speech runs up to it
+    if ranges and ranges[-1][1] >= len(flags) * frame_bytes:
+        ranges[-1] = (ranges[-1][0], len(pcm))
+    return ranges
+
+
+def trim(pcm):
+    """Cut silence out of PCM, leaving it unchanged when no speech is found."""
+    regions = speech_regions(pcm)
+    if not regions:
+        return pcm
+    return b''.join(pcm[start:end] for start, end in regions)
+
+
+def split_points(pcm, segment_seconds):
+    """Byte offsets to cut PCM at: the quietest frame within a quarter of segment_seconds of each target.
+
+    Equally quiet frames are broken towards the target, so segments stay
+    close to segment_seconds.
+    """
+    levels = frame_levels(pcm)
+    target = int(segment_seconds * 1000 / FRAME_MS)
+    slack = target // 4
+    cuts = []
+    start = 0
+    while len(levels) - start > target + slack:
+        goal = start + target
+        cut = min(range(goal - slack, goal + slack), key=lambda index: (levels[index], abs(index - goal)))
+        cuts.append(cut)
+        start = cut
+    return [cut * FRAME_SAMPLES * 2 for cut in cuts]
+
+
+def split(pcm, segment_seconds, overlap_seconds):
+    """Split PCM into segments of about segment_seconds, cut at silence, each overlapping its neighbours."""
+    overlap = int(overlap_seconds * SAMPLE_RATE) * 2
+    bounds = [0] + split_points(pcm, segment_seconds) + [len(pcm)]
+    return [pcm[max(start - overlap, 0):end + overlap] for start, end in zip(bounds, bounds[1:])]
+
+
+def _process(data, segment_seconds=None, overlap_seconds=0):
+    # Runs in a pool process
+    pcm = decode(data)
+    trimmed = trim(pcm)
+    segments = split(trimmed, segment_seconds, overlap_seconds) if segment_seconds else [trimmed]
+    return [encode(segment) for segment in segments], duration(pcm), duration(trimmed)
+
+
+def _get_pool():
+    global _pool, _pool_pid
+    pid = os.getpid()
+    with _lock:
+        if _pool is None or _pool_pid != pid:
+            # spawn, because forking a process with running threads can copy held locks
+            _pool = ProcessPoolExecutor(max_workers=WORKERS, mp_context=multiprocessing.get_context('spawn'))
+            _pool_pid = pid
+        return _pool
+
+
+def _reset_pool(pool):
+    global _pool
+    with _lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _run(data, filename, segment_seconds=None, overlap_seconds=0):
+    if not is_available():
+        with _lock:
+            _stats['skipped'] += 1
+        return None
+
+    started = time.monotonic()
+    pool = _get_pool()
+    try:
+        segments, seconds_in, seconds_out = pool.submit(
+            _process, data, segment_seconds, overlap_seconds
+        ).result(timeout=TIMEOUT)
+    except Exception as e:
+        if isinstance(e, BrokenProcessPool):
+            _reset_pool(pool)
+        logger.warning(f"Audio preprocessing failed for {filename}, sending it as recorded: {e}")
+        with _lock:
+            _stats['failed'] += 1
+        return None
+
+    elapsed = time.monotonic() - started
+    size = sum(len(segment) for segment in segments)
+    with _lock:
+        _stats['processed'] += 1
+        _stats['bytes_in'] += len(data)
+        _stats['bytes_out'] += size
+        _stats['seconds_in'] += seconds_in
+        _stats['seconds_out'] += seconds_out
+        _stats['processing_seconds'] += elapsed
+    logger.debug(f"Preprocessed {filename}: {len(data)} -> {size} bytes in {len(segments)} segments, "
+                 f"{seconds_in:.1f}s -> {seconds_out:.1f}s of audio in {elapsed:.2f}s")
+    return segments
+
+
+def preprocess_segments(data, filename, segment_seconds, overlap_seconds):
+    """Return ([(data, filename)], preprocessed) for a recording about to be transcribed.
+
+    Long recordings are split at silence for segmented transcription. The
+    CPU work runs in a process pool so request and job threads only wait.
+    Recordings are passed through whole and unchanged when preprocessing is
+    off, ffmpeg is missing or processing fails.
+    """
+    segments = _run(data, filename, segment_seconds, overlap_seconds)
+    if segments is None:
+        return [(data, filename)], False
+    stem = os.path.splitext(filename)[0]
+    if len(segments) == 1:
+        return [(segments[0], f'{stem}.ogg')], True
+    return [(segment, f'{stem}.{index}.ogg') for index, segment in enumerate(segments)], True
+
+
+def record_transcription(preprocessed, seconds):
+    """Record how long Whisper took for an upload."""
+    with _lock:
+        entry = _transcriptions['preprocessed' if preprocessed else 'original']
+        entry['count'] += 1
+        entry['seconds'] += seconds
+
+
+def get_stats():
+    """Report bytes and audio seconds saved, and average Whisper latency with and without preprocessing."""
+    with _lock:
+        stats = dict(_stats)
+        transcriptions = {kind: dict(entry) for kind, entry in _transcriptions.items()}
+    stats['bytes_saved'] = stats['bytes_in'] - stats['bytes_out']
+    stats['seconds_trimmed'] = round(stats['seconds_in'] - stats['seconds_out'], 2)
+    for kind, entry in transcriptions.items():
+        entry['average_seconds'] = entry['seconds'] / entry['count'] if entry['count'] else None
+    stats['transcription'] = transcriptions
+    stats['enabled'] = is_available()
+    return stats
+
+
+def _timed_transcription(data, filename):
+    from utils.openai_helper import transcribe_audio_data
+
+    started = time.monotonic()
+    text = transcribe_audio_data(data, filename, preprocess=False)
+    return text, time.monotonic() - started
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('files', nargs='+')
+    parser.add_argument('--transcribe', action='store_true',
+                        help='Also send both versions to Whisper and compare latency.')
+    args = parser.parse_args(argv)
+
+    if not is_available():
+        print('Preprocessing needs ffmpeg on the PATH and AUDIO_PREPROCESS not set to 0')
+        return 1
+
+    for path in args.files:
+        with open(path, 'rb') as file:
+            data = file.read()
+        started = time.monotonic()
+        (processed,), seconds_in, seconds_out = _process(data)
+        elapsed = time.monotonic() - started
+        print(f"{path}: {len(data)} -> {len(processed)} bytes ({1 - len(processed) / len(data):.0%} saved), "
+              f"{seconds_in:.1f}s -> {seconds_out:.1f}s of audio, preprocessed in {elapsed:.2f}s")
+        if args.transcribe:
+            original, original_seconds = _timed_transcription(data, os.path.basename(path))
+            trimmed, trimmed_seconds = _timed_transcription(processed, 'preprocessed.ogg')
+            print(f"  whisper {original_seconds:.2f}s as recorded, {trimmed_seconds:.2f}s preprocessed")
+            print(f"  as recorded:  {original}")
+            print(f"  preprocessed: {trimmed}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,254 @@
+import os
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from utils.tts_helper import AUDIO_ROOT, AUDIO_URL_PATH, ensure_audio_file, prepare_tts_text, voice_for_language
+
+logger = logging.getLogger(__name__)
+
+# Must match what vocabulary.js asks /api/text-to-speech for, so that the
+# batch job and the live endpoint share the same cache entries
+VOCAB_TTS_MODEL = 'tts-1-hd'
+VOCAB_TTS_SPEED = 0.8
+
+# Must match generate_example_audio() for the same reason
+SCENARIO_TTS_MODEL = 'tts-1-hd'
+SCENARIO_TTS_SPEED = 0.75
+
+# Per-scenario manifests listing the pre-rendered prompt and hint audio
+PACK_DIR = os.path.join(AUDIO_ROOT, 'packs')
+
+# Upper bound on concurrent synthesis calls made by a batch job
+DEFAULT_WORKERS = int(os.environ.get('AUDIO_PRERENDER_WORKERS', 4))
+
+
+def audio_url(subdir, filename):
+    """Build the URL of a generated audio file without a request context."""
+    return f'{AUDIO_URL_PATH}/{subdir}/{filename}'
+
+
+def _render_vocabulary_item(word, example_sentence, language):
+    voice = voice_for_language(language)
+    word_file, _ = ensure_audio_file(
+        prepare_tts_text(word), language, voice, VOCAB_TTS_MODEL, VOCAB_TTS_SPEED, pin=True,
+        priority='batch'
+    )
+    example_file = None
+    if example_sentence and example_sentence.strip():
+        example_file, _ = ensure_audio_file(
+            prepare_tts_text(example_sentence), language, voice, VOCAB_TTS_MODEL, VOCAB_TTS_SPEED,
+            pin=True, priority='batch'
+        )
+    return word_file, example_file
+
+
+def pregenerate_vocabulary_audio(app, item_ids=None, language=None, limit=None, max_workers=None):
+    """Synthesize audio for vocabulary words and example sentences and store the URLs.
+
+    Only items without audio are processed. Synthesis runs in a bounded thread
+    pool; database reads and writes stay on the calling thread. Returns the
+    number of items updated.
+    """
+    from app import db
+    from models import VocabularyItem
+
+    with app.app_context():
+        query = VocabularyItem.query.filter(db.or_(
+            VocabularyItem.audio_url.is_(None),
+            db.and_(VocabularyItem.example_audio_url.is_(None),
+                    VocabularyItem.example_sentence.isnot(None),
+                    VocabularyItem.example_sentence != '')
+        ))
+        if item_ids is not None:
+            query = query.filter(VocabularyItem.id.in_(item_ids))
+        if language:
+            query = query.filter_by(language=language)
+        query = query.order_by(VocabularyItem.id)
+        if limit:
+            query = query.limit(limit)
+        jobs = [(item.id, item.word, item.example_sentence, item.language) for item in query.all()]
+
+    if not jobs:
+        logger.debug("No vocabulary items need audio")
+        return 0
+
+    logger.info(f"Pre-generating audio for {len(jobs)} vocabulary items")
+    results = {}
+    with ThreadPoolExecutor(max_workers=max_workers or DEFAULT_WORKERS) as pool:
+        futures = {
+            pool.submit(_render_vocabulary_item, word, example_sentence, lang): item_id
+            for item_id, word, example_sentence, lang in jobs
+        }
+        for future in as_completed(futures):
+            item_id = futures[future]
+            try:
+                results[item_id] = future.result()
+            except Exception as e:
+                logger.error(f"Failed to generate audio for vocabulary item {item_id}: {e}")
+
+    with app.app_context():
+        for item_id, (word_file, example_file) in results.items():
+            item = db.session.get(VocabularyItem, item_id)
+            if not item:
+                continue
+            item.audio_url = audio_url('tts', word_file)
+            if example_file:
+                item.example_audio_url = audio_url('tts', example_file)
+        try:
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Failed to save vocabulary audio URLs: {e}")
+            return 0
+
+    logger.info(f"Stored audio for {len(results)} of {len(jobs)} vocabulary items")
+    return len(results)
+
+
+def start_vocabulary_audio_job(app, item_ids):
+    """Pre-generate vocabulary audio in a background thread."""
+    thread = threading.Thread(
+        target=pregenerate_vocabulary_audio,
+        args=(app,),
+        kwargs={'item_ids': list(item_ids)},
+        name='vocabulary-audio',
+        daemon=True
+    )
+    thread.start()
+    return thread
+
+
+def scenario_pack_path(scenario_id):
+    return os.path.join(PACK_DIR, f'scenario_{scenario_id}.json')
+
+
+def load_scenario_pack(scenario_id, prompts, hints):
+    """Return the pre-rendered audio URLs for a scenario, or None if there is no current pack.
+
+    A pack rendered for different prompt or hint text is treated as missing.
+    """
+    try:
+        with open(scenario_pack_path(scenario_id), encoding='utf-8') as f:
+            pack = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if [p['text'] for p in pack.get('prompts', [])] != list(prompts) or \
+            [h['text'] for h in pack.get('hints', [])] != list(hints):
+        logger.debug(f"Audio pack for scenario {scenario_id} is out of date")
+        return None
+
+    return {
+        'prompt_audio_urls': [p['audio_url'] for p in pack['prompts']],
+        'hint_audio_urls': [h['audio_url'] for h in pack['hints']],
+    }
+
+
+def _render_scenario_text(text, language):
+    voice = voice_for_language(language)
+    filename, _ = ensure_audio_file(
+        prepare_tts_text(text), language, voice, SCENARIO_TTS_MODEL, SCENARIO_TTS_SPEED,
+        subdir='examples', prefix='example', fallback_lang='es', pin=True,
+        priority='batch'
+    )
+    return filename
+
+
+def render_scenario_pack(app, scenario_id, language, prompts, hints, max_workers=None):
+    """Synthesize every prompt and hint of a scenario and write its audio pack.
+
+    The first prompt's URL is also stored as the scenario's example_audio_url.
+    Returns the pack URLs in the same shape as load_scenario_pack().
+    """
+    from app import db
+    from models import SpeakingExercise
+
+    texts = list(prompts) + list(hints)
+    with ThreadPoolExecutor(max_workers=max_workers or DEFAULT_WORKERS) as pool:
+        filenames = list(pool.map(lambda text: _render_scenario_text(text, language), texts))
+    urls = [audio_url('examples', filename) for filename in filenames]
+
+    pack = {
+        'scenario_id': scenario_id,
+        'language': language,
+        'model': SCENARIO_TTS_MODEL,
+        'speed': SCENARIO_TTS_SPEED,
+        'prompts': [{'text': text, 'audio_url': url} for text, url in zip(prompts, urls)],
+        'hints': [{'text': text, 'audio_url': url} for text, url in zip(hints, urls[len(prompts):])],
+    }
+    os.makedirs(PACK_DIR, exist_ok=True)
+    pack_path = scenario_pack_path(scenario_id)
+    temp_path = f'{pack_path}.{os.getpid()}.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(pack, f, ensure_ascii=False, indent=2)
+    os.replace(temp_path, pack_path)
+
+    if prompts:
+        with app.app_context():
+            scenario = db.session.get(SpeakingExercise, scenario_id)
+            if scenario and scenario.example_audio_url != urls[0]:
+                scenario.example_audio_url = urls[0]
+                try:
+                    db.session.commit()
+                except Exception as e:
+                    db.session.rollback()
+                    logger.error(f"Failed to save example audio URL for scenario {scenario_id}: {e}")
+
+    logger.info(f"Rendered audio pack for scenario {scenario_id} ({len(texts)} clips)")
+    return {
+        'prompt_audio_urls': urls[:len(prompts)],
+        'hint_audio_urls': urls[len(prompts):],
+    }
+
+
+def render_all_scenario_packs(app, get_prompts, force=False, max_workers=None):
+    """Render audio packs for every speaking scenario that lacks a current one.
+
+    get_prompts(target_language, category) returns the (prompts, hints) lists.
+    Returns the number of packs rendered.
+    """
+    from models import SpeakingExercise
+
+    with app.app_context():
+        scenarios = [(s.id, s.target_language, s.category) for s in SpeakingExercise.query.all()]
+
+    rendered = 0
+    for scenario_id, language, category in scenarios:
+        prompts, hints = get_prompts(language, category)
+        if not prompts and not hints:
+            continue
+        if not force and load_scenario_pack(scenario_id, prompts, hints):
+            continue
+        try:
+            render_scenario_pack(app, scenario_id, language, prompts, hints, max_workers=max_workers)
+            rendered += 1
+        except Exception as e:
+            logger.error(f"Failed to render audio pack for scenario {scenario_id}: {e}")
+    return rendered
+
+
+_pending_packs = set()
+_pending_lock = threading.Lock()
+
+
+def start_scenario_pack_job(app, scenario_id, language, prompts, hints):
+    """Render a scenario's audio pack in the background, once per process at a time."""
+    with _pending_lock:
+        if scenario_id in _pending_packs:
+            return None
+        _pending_packs.add(scenario_id)
+
+    def run():
+        try:
+            render_scenario_pack(app, scenario_id, language, prompts, hints)
+        except Exception as e:
+            logger.error(f"Failed to render audio pack for scenario {scenario_id}: {e}")
+        finally:
+            with _pending_lock:
+                _pending_packs.discard(scenario_id)
+
+    thread = threading.Thread(target=run, name=f'scenario-pack-{scenario_id}', daemon=True)
+    thread.start()
+    return thread
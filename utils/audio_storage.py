@@ -0,0 +1,226 @@
+import os
+import time
+import atexit
+import sqlite3
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Total size generated audio may use before least-recently-used files are
+# evicted, and the fraction of it to shrink back to once eviction starts
+MAX_BYTES = int(os.environ.get('AUDIO_STORAGE_MAX_BYTES', 1024 * 1024 * 1024))
+LOW_WATER = float(os.environ.get('AUDIO_STORAGE_LOW_WATER', 0.9))
+FLUSH_INTERVAL = float(os.environ.get('AUDIO_STORAGE_FLUSH_INTERVAL', 5))
+EVICT_INTERVAL = float(os.environ.get('AUDIO_STORAGE_EVICT_INTERVAL', 60))
+MANIFEST_PATH = os.environ.get('AUDIO_MANIFEST_PATH', os.path.join('instance', 'audio_manifest.db'))
+
+_lock = threading.Lock()
+_pending = {}  # path -> [size or None, last access, pinned]
+_thread = None
+_thread_pid = None
+_stats = {
+    'eviction_runs': 0,
+    'evicted_files': 0,
+    'evicted_bytes': 0,
+}
+
+
+def _connect():
+    os.makedirs(os.path.dirname(MANIFEST_PATH) or '.', exist_ok=True)
+    conn = sqlite3.connect(MANIFEST_PATH, timeout=10, isolation_level=None)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute(
+        'CREATE TABLE IF NOT EXISTS audio_files ('
+        'path TEXT PRIMARY KEY, size INTEGER NOT NULL, '
+        'last_access REAL NOT NULL, pinned INTEGER NOT NULL DEFAULT 0)'
+    )
+    conn.execute('CREATE INDEX IF NOT EXISTS ix_audio_files_lru ON audio_files (pinned, last_access)')
+    return conn
+
+
+def _queue(path, size=None, pinned=False):
+    _ensure_started()
+    now = time.time()
+    with _lock:
+        entry = _pending.get(path)
+        if entry is None:
+            _pending[path] = [size, now, pinned]
+        else:
+            entry[0] = size if size is not None else entry[0]
+            entry[1] = now
+            entry[2] = entry[2] or pinned
+
+
+def record(path, pinned=False):
+    """Add a newly written audio file to the manifest."""
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        return
+    _queue(path, size, pinned)
+
+
+def touch(path):
+    """Mark an audio file as just used so it is evicted last."""
+    _queue(path)
+
+
+def pin(path):
+    """Exclude an audio file from eviction, e.g. because a database row links to it."""
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        return
+    _queue(path, size, pinned=True)
+
+
+def flush(conn=None):
+    """Write buffered records and access times to the manifest."""
+    with _lock:
+        pending = list(_pending.items())
+        _pending.clear()
+    if not pending:
+        return
+    own_conn = conn is None
+    conn = conn or _connect()
+    try:
+        conn.execute('BEGIN')
+        for path, (size, last_access, pinned) in pending:
+            if size is None:
+                conn.execute(
+                    'UPDATE audio_files SET last_access = MAX(last_access, ?) WHERE path = ?',
+                    (last_access, path)
+                )
+            else:
+                conn.execute(
+                    'INSERT INTO audio_files (path, size, last_access, pinned) VALUES (?, ?, ?, ?) '
+                    'ON CONFLICT(path) DO UPDATE SET size = excluded.size, '
+                    'last_access = MAX(last_access, excluded.last_access), '
+                    'pinned = MAX(pinned, excluded.pinned)',
+                    (path, size, last_access, int(pinned))
+                )
+        conn.execute('COMMIT')
+    except sqlite3.Error as e:
+        conn.execute('ROLLBACK')
+        logger.error(f"Failed to update audio manifest: {e}")
+    finally:
+        if own_conn:
+            conn.close()
+
+
+def evict(conn=None, max_bytes=None):
+    """Delete least-recently-used unpinned files until storage is under budget.
+
+    Only the manifest is consulted, so this never lists the audio directories.
+    Returns the number of bytes freed.
+    """
+    max_bytes = MAX_BYTES if max_bytes is None else max_bytes
+    own_conn = conn is None
+    conn = conn or _connect()
+    freed = 0
+    evicted = 0
+    try:
+        total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM audio_files').fetchone()[0]
+        if total <= max_bytes:
+            return 0
+        target = int(max_bytes * LOW_WATER)
+        logger.info(f"Audio storage at {total} bytes exceeds budget of {max_bytes}, evicting to {target}")
+        while total > target:
+            rows = conn.execute(
+                'SELECT path, size FROM audio_files WHERE pinned = 0 ORDER BY last_access LIMIT 200'
+            ).fetchall()
+            if not rows:
+                logger.warning("Audio storage is over budget but only pinned files remain")
+                break
+            for path, size in rows:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    logger.error(f"Failed to evict {path}: {e}")
+                    continue
+                conn.execute('DELETE FROM audio_files WHERE path = ?', (path,))
+                total -= size
+                freed += size
+                evicted += 1
+                if total <= target:
+                    break
+    finally:
+        if own_conn:
+            conn.close()
+    with _lock:
+        _stats['eviction_runs'] += 1
+        _stats['evicted_files'] += evicted
+        _stats['evicted_bytes'] += freed
+    logger.info(f"Evicted {evicted} audio files ({freed} bytes)")
+    return freed
+
+
+def scan(root):
+    """Add every generated audio file under root to the manifest.
+
+    This is a one-off for files written before the manifest existed, such as
+    the old tts_*.mp3 files in the root of static/audio.
+    """
+    added = 0
+    for dirpath, _, filenames in os.walk(root):
+        for filename in filenames:
+            if filename.endswith(('.mp3', '.ogg')):
+                path = os.path.join(dirpath, filename)
+                try:
+                    size = os.path.getsize(path)
+                    mtime = os.path.getmtime(path)
+                except OSError:
+                    continue
+                with _lock:
+                    _pending.setdefault(path, [size, mtime, False])
+                added += 1
+    flush()
+    return added
+
+
+def _run():
+    conn = _connect()
+    last_evict = 0.0
+    while True:
+        time.sleep(FLUSH_INTERVAL)
+        try:
+            flush(conn)
+            if time.monotonic() - last_evict >= EVICT_INTERVAL:
+                last_evict = time.monotonic()
+                evict(conn)
+        except Exception as e:
+            logger.error(f"Audio storage maintenance failed: {e}")
+
+
+def _ensure_started():
+    global _thread, _thread_pid
+    pid = os.getpid()
+    if _thread is not None and _thread_pid == pid:
+        return
+    with _lock:
+        if _thread is None or _thread_pid != pid:
+            _thread = threading.Thread(target=_run, name='audio-storage', daemon=True)
+            _thread_pid = pid
+            _thread.start()
+
+
+def get_stats():
+    """Report manifest totals and eviction counters."""
+    flush()
+    conn = _connect()
+    try:
+        files, total, pinned = conn.execute(
+            'SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(pinned), 0) FROM audio_files'
+        ).fetchone()
+    finally:
+        conn.close()
+    with _lock:
+        stats = dict(_stats)
+    stats.update(files=files, bytes=total, pinned_files=pinned, max_bytes=MAX_BYTES)
+    return stats
+
+
+atexit.register(flush)
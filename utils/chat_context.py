@@ -0,0 +1,170 @@
+import os
+import logging
+import threading
+
+from utils import llm_budget
+from utils.openai_helper import summarize_conversation
+
+logger = logging.getLogger(__name__)
+
+# Token budgets for the conversation context sent with each chat message.
+# Recent turns are sent verbatim up to CONTEXT_TOKEN_BUDGET; anything older is
+# folded into a summary of at most SUMMARY_TOKEN_BUDGET, so the prompt stays
+# about the same size however long the conversation gets.
+CONTEXT_TOKEN_BUDGET = int(os.environ.get('CHAT_CONTEXT_TOKENS', 1200))
+SUMMARY_TOKEN_BUDGET = int(os.environ.get('CHAT_SUMMARY_TOKENS', 250))
+
+# Turns folded into the summary per model call; a longer backlog takes
+# several calls, each costing about the same
+SUMMARY_CHUNK_TURNS = int(os.environ.get('CHAT_SUMMARY_CHUNK_TURNS', 40))
+
+# Per-message overhead of the chat format, in tokens
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# The smallest a turn can cost, which bounds how many fit in the context budget
+MIN_TURN_TOKENS = 2 * (MESSAGE_OVERHEAD_TOKENS + 1)
+
+
+def estimate_tokens(text):
+    """Rough token count for OpenAI tokenizers (about four characters per token)."""
+    return len(text or '') // 4 + 1
+
+
+def _turn_tokens(chat):
+    return estimate_tokens(chat.message) + estimate_tokens(chat.response) + 2 * MESSAGE_OVERHEAD_TOKENS
+
+
+def _recent_turns(user_id, summarized_through_id):
+    """Return the newest run of unsummarized turns that fits in CONTEXT_TOKEN_BUDGET, oldest first."""
+    from models import Chat
+
+    turns = Chat.query.filter(Chat.user_id == user_id, Chat.id > summarized_through_id)\
+        .order_by(Chat.id.desc())\
+        .limit(CONTEXT_TOKEN_BUDGET // MIN_TURN_TOKENS + 1)\
+        .all()
+
+    used = 0
+    fitting = 0
+    for chat in turns:
+        cost = _turn_tokens(chat)
+        if used + cost > CONTEXT_TOKEN_BUDGET:
+            break
+        used += cost
+        fitting += 1
+
+    return list(reversed(turns[:fitting]))
+
+
+def _overflow_chunk(user_id, summarized_through_id, recent_from_id):
+    """Return the oldest SUMMARY_CHUNK_TURNS unsummarized turns before recent_from_id (None for all)."""
+    from models import Chat
+
+    query = Chat.query.filter(Chat.user_id == user_id, Chat.id > summarized_through_id)
+    if recent_from_id is not None:
+        query = query.filter(Chat.id < recent_from_id)
+    return query.order_by(Chat.id).limit(SUMMARY_CHUNK_TURNS).all()
+
+
+def build_context(user_id):
+    """Return the messages to send between the system prompt and the new user message.
+
+    Must be called inside an app context.
+    """
+    from app import db
+    from models import ChatSummary
+
+    summary = db.session.get(ChatSummary, user_id)
+    recent = _recent_turns(user_id, summary.summarized_through_id if summary else 0)
+
+    messages = []
+    if summary and summary.summary:
+        messages.append({
+            'role': 'system',
+            'content': f'Summary of the earlier conversation with this learner: {summary.summary}'
+        })
+    for chat in recent:
+        messages.append({'role': 'user', 'content': chat.message})
+        messages.append({'role': 'assistant', 'content': chat.response})
+
+    logger.debug(f"Chat context for user {user_id}: {len(recent)} recent turns, "
+                 f"~{sum(estimate_tokens(m['content']) for m in messages)} tokens")
+    return messages
+
+
+def update_summary(app, user_id):
+    """Fold turns that no longer fit in the context budget into the user's summary.
+
+    The overflowing turns are sent to the model oldest first, in chunks of
+    SUMMARY_CHUNK_TURNS along with the summary so far, so each call costs
+    about the same however long the backlog is. Returns True if the summary
+    changed.
+    """
+    from app import db
+    from models import ChatSummary
+
+    folded = 0
+    with app.app_context():
+        summary = db.session.get(ChatSummary, user_id)
+        summarized_through_id = summary.summarized_through_id if summary else 0
+        recent = _recent_turns(user_id, summarized_through_id)
+        recent_from_id = recent[0].id if recent else None
+
+        while True:
+            overflow = _overflow_chunk(user_id, summarized_through_id, recent_from_id)
+            if not overflow:
+                break
+            previous = summary.summary if summary else ''
+
+            # Background work: waits for budget behind interactive calls
+            llm_budget.acquire(llm_budget.estimate_tokens(
+                previous, *(chat.message + chat.response for chat in overflow), completion=SUMMARY_TOKEN_BUDGET
+            ), 'batch', user_id=user_id)
+            updated = summarize_conversation(
+                previous,
+                [(chat.message, chat.response) for chat in overflow],
+                SUMMARY_TOKEN_BUDGET
+            )
+            if updated is None:
+                break
+
+            if summary is None:
+                summary = ChatSummary(user_id=user_id)
+                db.session.add(summary)
+            summary.summary = updated
+            summary.summarized_through_id = summarized_through_id = overflow[-1].id
+            try:
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Failed to save chat summary for user {user_id}: {e}")
+                break
+            folded += len(overflow)
+
+    if folded:
+        logger.info(f"Folded {folded} chat turns into the summary for user {user_id}")
+    return folded > 0
+
+
+_pending_users = set()
+_pending_lock = threading.Lock()
+
+
+def start_summary_update(app, user_id):
+    """Update a user's summary in the background, once per process at a time."""
+    with _pending_lock:
+        if user_id in _pending_users:
+            return None
+        _pending_users.add(user_id)
+
+    def run():
+        try:
+            update_summary(app, user_id)
+        except Exception as e:
+            logger.error(f"Failed to update chat summary for user {user_id}: {e}")
+        finally:
+            with _pending_lock:
+                _pending_users.discard(user_id)
+
+    thread = threading.Thread(target=run, name=f'chat-summary-{user_id}', daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,79 @@
+import base64
+import logging
+from datetime import datetime
+
+from sqlalchemy import tuple_
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 100
+
+
+def encode_cursor(chat):
+    """Opaque cursor for a chat turn's position in (timestamp, id) order."""
+    raw = f'{chat.timestamp.isoformat()}|{chat.id}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return the (timestamp, id) a cursor points at. Raises ValueError if malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        timestamp, chat_id = raw.split('|')
+        return datetime.fromisoformat(timestamp), int(chat_id)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f'Invalid cursor: {cursor}') from e
+
+
+def _serialize(chat):
+    return {
+        'id': chat.id,
+        'message': chat.message,
+        'response': chat.response,
+        'timestamp': chat.timestamp.isoformat(),
+        'cursor': encode_cursor(chat)
+    }
+
+
+def history_page(user_id, before=None, since=None, limit=DEFAULT_PAGE_SIZE):
+    """Return one page of a user's chat history, newest first.
+
+    Without cursors this is the latest page. `before` pages backwards from a
+    turn the client already has; `since` returns only turns newer than one it
+    already has, oldest of them first if there are more than `limit`. Every
+    query is a range scan on the (user_id, timestamp, id) index, so a page
+    costs the same however long the history is.
+    """
+    from models import Chat
+
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    position = tuple_(Chat.timestamp, Chat.id)
+    query = Chat.query.filter(Chat.user_id == user_id)
+
+    if since:
+        query = query.filter(position > decode_cursor(since))\
+            .order_by(Chat.timestamp.asc(), Chat.id.asc())
+    else:
+        if before:
+            query = query.filter(position < decode_cursor(before))
+        query = query.order_by(Chat.timestamp.desc(), Chat.id.desc())
+
+    # One extra row tells us whether there is another page
+    chats = query.limit(limit + 1).all()
+    has_more = len(chats) > limit
+    chats = chats[:limit]
+    if since:
+        chats.reverse()
+
+    return {
+        'history': [_serialize(chat) for chat in chats],
+        # More older turns for a latest/before page, more newer turns for since
+        'has_more': has_more,
+        'cursors': {
+            # Pass as `since` to fetch anything newer than this page
+            'since': encode_cursor(chats[0]) if chats else since,
+            # Pass as `before` to fetch the page before this one
+            'before': encode_cursor(chats[-1]) if has_more and not since else None
+        }
+    }
@@ -0,0 +1,191 @@
+import re
+import bisect
+import unicodedata
+
+# Languages offered in UserPreferencesForm, plus English for translation input
+LANGUAGE_NAMES = {
+    'en': 'English',
+    'es': 'Spanish',
+    'it': 'Italian',
+    'fr': 'French',
+    'de': 'German',
+    'pt': 'Portuguese',
+    'ja': 'Japanese',
+    'ko': 'Korean',
+    'zh': 'Chinese (Mandarin)',
+    'ru': 'Russian',
+    'ar': 'Arabic',
+    'nl': 'Dutch',
+    'pl': 'Polish',
+    'tr': 'Turkish',
+    'hi': 'Hindi',
+    'vi': 'Vietnamese',
+}
+
+# Languages with their own script are recognized by the characters alone
+_SCRIPT_RANGES = [
+    (0x0400, 0x04FF, 'ru'),
+    (0x0600, 0x06FF, 'ar'),
+    (0x0750, 0x077F, 'ar'),
+    (0x0900, 0x097F, 'hi'),
+    (0x1100, 0x11FF, 'ko'),
+    (0x3040, 0x30FF, 'kana'),
+    (0x3130, 0x318F, 'ko'),
+    (0x3400, 0x4DBF, 'han'),
+    (0x4E00, 0x9FFF, 'han'),
+    (0xAC00, 0xD7AF, 'ko'),
+]
+_SCRIPT_STARTS = [start for start, _, _ in _SCRIPT_RANGES]
+
+# Latin-script languages are scored on frequent words and on character
+# n-grams (with ' ' marking word boundaries) that are typical of each one
+_TOKENS = {
+    'en': 'the and of to is in that it you for was with on are be this have not they at but what '
+          'from his her she he we my your there their would will can do does an hello thank thanks '
+          'please good morning how where am',
+    'es': 'el la los las de del que y en un una es por para con no se su al lo como más pero muy '
+          'está estoy soy eres hola gracias buenos buenas días qué dónde cómo yo tú usted quiero '
+          'tengo hay también porque cuando',
+    'it': 'il lo la gli le di del della che e è non per un una sono sei con come più ma molto ciao '
+          'grazie buongiorno buonasera piacere io tu questo questa anche perché quando dove cosa '
+          'ho hai mi ti ci',
+    'fr': 'le la les de des du et est un une je tu il elle nous vous ils pas que qui dans pour avec '
+          'sur ce cette mais très bonjour merci oui non suis au aux où beaucoup bien comment j c qu',
+    'de': 'der die das und ist nicht ich du er sie es wir ihr ein eine zu den mit von auf für sich '
+          'dem des im auch als wie aber bin bist hallo danke bitte guten tag morgen haus sehr ja '
+          'nein was wo',
+    'pt': 'o a os as de do da dos das e é que não um uma em no na para com por se mais mas muito '
+          'obrigado obrigada olá bom dia eu você ele ela nós está estou sou também como onde quando '
+          'isso isto',
+    'nl': 'de het een en van is dat in ik je niet op te zijn er met voor die hij ze wat maar ook als '
+          'dank bedankt hallo goedemorgen alsjeblieft heb hebben wij jij u',
+    'pl': 'i w nie na się z że do to jest jak co a o ale tak dla po od jestem ja ty on ona my '
+          'dziękuję proszę dzień dobry cześć bardzo gdzie czy jego być',
+    'tr': 'bir ve bu da de ne için ile ben sen o biz siz onlar değil var yok çok ama gibi merhaba '
+          'teşekkür ederim evet hayır nasıl nerede günaydın iyi',
+    'vi': 'và của là có không người những một được trong cho với này các đã tôi bạn xin chào cảm '
+          'ơn rất đi',
+}
+
+_NGRAMS = {
+    'en': ' th|the |ing |ght|ough| wh|ould|tion|ly |w',
+    'es': 'ñ|ción|ll| qu|ue|ie|ado |ada |os |as |á|í|ó|ú|rr|mente',
+    'it': 'zione|gli|cch|zz|tt|ll|è|ò|à|ù|ì|chi|che|ere |are |ato |etto',
+    'fr': 'ç|é|è|ê|à|ù|û|ô|î|œ|eau|aux |ent |ais|oi|ou|qu|tion|eux|ille',
+    'de': 'ß|ä|ö|ü|sch|ch|ei|ie|ung |cht|tz|en |er |ich|keit|heit|w',
+    'pt': 'ã|õ|ç|ão|ões|nh|lh|ê|é|á|ó|â|ção|mente|os ',
+    'nl': 'ij|oe|aa|ee|oo|uu|sch|cht|gen |lijk|je |ui|w',
+    'pl': 'ą|ę|ł|ś|ć|ń|ó|ź|ż|sz|cz|rz|dz|ie|ow|wi|w',
+    'tr': 'ı|ş|ğ|ç|ö|ü|lar|ler|yor|mak|mek|dir',
+    'vi': 'ư|ơ|đ|ạ|ả|ấ|ầ|ẩ|ậ|ắ|ằ|ẳ|ặ|ẹ|ẻ|ẽ|ế|ề|ể|ễ|ệ|ỉ|ị|ọ|ỏ|ố|ồ|ổ|ỗ|ộ|ớ|ờ|ở|ỡ|ợ|'
+          'ụ|ủ|ứ|ừ|ử|ữ|ự|ỳ|ỷ|ỹ|ng |nh ',
+}
+
+# Below this confidence a guess should not override a language given by the caller
+MIN_CONFIDENCE = 0.4
+
+# Texts of fewer words than this share too many endings between languages
+# ("gato." scores 0.5 for Italian), so a guess needs a clearer lead
+SHORT_TEXT_WORDS = 3
+SHORT_TEXT_MIN_CONFIDENCE = 0.65
+
+TOKEN_WEIGHT = 2.0
+NGRAM_WEIGHT = 1.0
+MAX_NGRAM = 5
+
+_TOKEN_RE = re.compile(r'\w+')
+
+
+def _compile(tables, weight):
+    """Merge per-language tables into feature -> ((language index, weight), ...).
+
+    A feature shared by several languages splits its weight between them.
+    """
+    owners = {}
+    for lang, features in tables.items():
+        for feature in features:
+            owners.setdefault(feature, []).append(_LATIN_INDEX[lang])
+    return {
+        feature: tuple((index, weight / len(langs)) for index in langs)
+        for feature, langs in owners.items()
+    }
+
+
+_LATIN_LANGUAGES = tuple(_TOKENS)
+_LATIN_INDEX = {lang: i for i, lang in enumerate(_LATIN_LANGUAGES)}
+_TOKEN_TABLE = _compile({lang: words.split() for lang, words in _TOKENS.items()}, TOKEN_WEIGHT)
+_NGRAM_TABLE = _compile({lang: grams.split('|') for lang, grams in _NGRAMS.items()}, NGRAM_WEIGHT)
+
+
+def _script_of(ch):
+    code = ord(ch)
+    i = bisect.bisect_right(_SCRIPT_STARTS, code) - 1
+    if i >= 0 and code <= _SCRIPT_RANGES[i][1]:
+        return _SCRIPT_RANGES[i][2]
+    return None
+
+
+def detect_language(text, default=None):
+    """Guess the language of text.
+
+    Returns (language code, confidence between 0 and 1). When there is no
+    evidence at all, returns (default, 0.0).
+    """
+    text = unicodedata.normalize('NFC', text or '').lower()
+
+    latin = 0
+    scripts = {}
+    for ch in text:
+        if ch < 'ɐ':
+            if ch.isalpha():
+                latin += 1
+        elif ch.isalpha():
+            script = _script_of(ch)
+            if script:
+                scripts[script] = scripts.get(script, 0) + 1
+            else:
+                latin += 1
+
+    letters = latin + sum(scripts.values())
+    if not letters:
+        return default, 0.0
+
+    if scripts:
+        script, count = max(scripts.items(), key=lambda item: item[1])
+        if count > latin:
+            if script in ('han', 'kana'):
+                # Japanese mixes kanji with kana; Chinese has no kana
+                script = 'ja' if 'kana' in scripts else 'zh'
+                count = scripts.get('han', 0) + scripts.get('kana', 0)
+            return script, count / letters
+
+    scores = [0.0] * len(_LATIN_LANGUAGES)
+    for token in _TOKEN_RE.findall(text):
+        for index, weight in _TOKEN_TABLE.get(token, ()):
+            scores[index] += weight
+        padded = f' {token} '
+        length = len(padded)
+        for n in range(1, MAX_NGRAM + 1):
+            for start in range(length - n + 1):
+                for index, weight in _NGRAM_TABLE.get(padded[start:start + n], ()):
+                    scores[index] += weight
+
+    total = sum(scores)
+    if not total:
+        return default, 0.0
+    best = max(range(len(scores)), key=scores.__getitem__)
+    # The +1 keeps one or two weak matches from looking certain
+    return _LATIN_LANGUAGES[best], scores[best] / (total + 1.0)
+
+
+def min_confidence(text):
+    """Confidence a guess about text needs before it overrides a default."""
+    if len(_TOKEN_RE.findall(text or '')) < SHORT_TEXT_WORDS:
+        return SHORT_TEXT_MIN_CONFIDENCE
+    return MIN_CONFIDENCE
+
+
+def confident_language(text):
+    """Return the language of text when the guess is sure enough to act on, otherwise None."""
+    lang, confidence = detect_language(text)
+    return lang if lang and confidence >= min_confidence(text) else None
@@ -0,0 +1,161 @@
+"""Accuracy check and microbenchmark for utils.language_detect.
+
+Run with: python -m utils.language_detect_eval [--iterations N]
+"""
+import sys
+import time
+import argparse
+
+from utils.language_detect import confident_language, detect_language
+
+# (expected language, text) pairs in the style of app content: short
+# practice sentences, greetings and scenario prompts
+SAMPLES = [
+    ('en', 'Hello, how are you doing this morning?'),
+    ('en', 'I would like to book a table for two people.'),
+    ('en', 'Where is the nearest train station?'),
+    ('en', 'Thank you very much for your help.'),
+    ('es', 'Hola, ¿cómo estás?'),
+    ('es', 'Me gustaría reservar una mesa para dos personas.'),
+    ('es', '¿Dónde está la estación de tren más cercana?'),
+    ('es', 'Muchas gracias por tu ayuda, eres muy amable.'),
+    ('es', 'Quiero pedir la cuenta, por favor.'),
+    ('it', 'Ciao, come stai?'),
+    ('it', 'Vorrei prenotare un tavolo per due persone.'),
+    ('it', "Dov'è la stazione dei treni più vicina?"),
+    ('it', 'Grazie mille per il tuo aiuto, sei molto gentile.'),
+    ('it', 'Piacere di conoscerti, mi chiamo Marco.'),
+    ('fr', 'Bonjour, comment allez-vous ?'),
+    ('fr', 'Je voudrais réserver une table pour deux personnes.'),
+    ('fr', 'Où est la gare la plus proche ?'),
+    ('fr', "Merci beaucoup pour votre aide, c'est très gentil."),
+    ('de', 'Hallo, wie geht es dir?'),
+    ('de', 'Ich möchte einen Tisch für zwei Personen reservieren.'),
+    ('de', 'Wo ist der nächste Bahnhof?'),
+    ('de', 'Vielen Dank für deine Hilfe, das ist sehr nett.'),
+    ('pt', 'Olá, tudo bem com você?'),
+    ('pt', 'Eu gostaria de reservar uma mesa para duas pessoas.'),
+    ('pt', 'Onde fica a estação de trem mais próxima?'),
+    ('pt', 'Muito obrigado pela sua ajuda.'),
+    ('nl', 'Hallo, hoe gaat het met je?'),
+    ('nl', 'Ik wil graag een tafel voor twee personen reserveren.'),
+    ('nl', 'Waar is het dichtstbijzijnde treinstation?'),
+    ('nl', 'Heel erg bedankt voor je hulp.'),
+    ('pl', 'Cześć, jak się masz?'),
+    ('pl', 'Chciałbym zarezerwować stolik dla dwóch osób.'),
+    ('pl', 'Gdzie jest najbliższa stacja kolejowa?'),
+    ('pl', 'Dziękuję bardzo za pomoc.'),
+    ('tr', 'Merhaba, nasılsın?'),
+    ('tr', 'İki kişilik bir masa ayırtmak istiyorum.'),
+    ('tr', 'En yakın tren istasyonu nerede?'),
+    ('tr', 'Yardımın için çok teşekkür ederim.'),
+    ('vi', 'Xin chào, bạn có khỏe không?'),
+    ('vi', 'Tôi muốn đặt một bàn cho hai người.'),
+    ('vi', 'Ga tàu gần nhất ở đâu?'),
+    ('vi', 'Cảm ơn bạn rất nhiều vì đã giúp đỡ.'),
+    ('ja', 'こんにちは、お元気ですか？'),
+    ('ja', '二人用のテーブルを予約したいです。'),
+    ('ja', '一番近い駅はどこですか？'),
+    ('ko', '안녕하세요, 어떻게 지내세요?'),
+    ('ko', '두 사람 자리를 예약하고 싶어요.'),
+    ('ko', '가장 가까운 기차역이 어디예요?'),
+    ('zh', '你好，你好吗？'),
+    ('zh', '我想预订一张两个人的桌子。'),
+    ('zh', '最近的火车站在哪里？'),
+    ('ru', 'Привет, как дела?'),
+    ('ru', 'Я хотел бы заказать столик на двоих.'),
+    ('ru', 'Где ближайший вокзал?'),
+    ('ar', 'مرحبا، كيف حالك؟'),
+    ('ar', 'أريد حجز طاولة لشخصين.'),
+    ('ar', 'أين أقرب محطة قطار؟'),
+    ('hi', 'नमस्ते, आप कैसे हैं?'),
+    ('hi', 'मैं दो लोगों के लिए एक टेबल बुक करना चाहता हूँ।'),
+    ('hi', 'सबसे नज़दीकी रेलवे स्टेशन कहाँ है?'),
+]
+
+# Single words and short phrases, checked against confident_language(): the
+# language it should settle on, or None where one or two words are too little
+# evidence and the caller's language has to stand
+SHORT_SAMPLES = [
+    (None, 'gato.'),
+    (None, 'zapato.'),
+    (None, 'perro.'),
+    (None, 'niño.'),
+    (None, 'casa.'),
+    (None, 'la mesa.'),
+    ('es', 'hola.'),
+    ('es', 'gracias.'),
+    ('es', 'buenos días.'),
+    ('it', 'ciao.'),
+    ('fr', 'bonjour.'),
+    ('fr', 'merci beaucoup.'),
+    ('de', 'danke.'),
+    ('de', 'Guten Morgen.'),
+    ('en', 'thank you.'),
+    ('ru', 'Спасибо.'),
+    ('ja', 'ありがとう'),
+    ('zh', '谢谢'),
+    ('ko', '안녕하세요'),
+]
+
+
+def legacy_detect(text, lang='es'):
+    """The marker-list heuristic generate_example_audio() used before, kept for comparison."""
+    detected_lang = lang
+    italian_markers = ['è', 'sono', 'mia', 'casa', 'molto', 'ciao', 'grazie', 'piacere', 'come stai']
+    if any(marker in text.lower() for marker in italian_markers) and 'è' in text:
+        detected_lang = 'it'
+    french_markers = ['je suis', 'bonjour', 'merci', 'je', 'tu', 'nous', 'vous', 'très', 'beaucoup']
+    if any(marker in text.lower() for marker in french_markers):
+        detected_lang = 'fr'
+    german_markers = ['ich', 'bin', 'du', 'ist', 'hallo', 'guten', 'danke', 'bitte', 'haus']
+    if any(marker in text.lower() for marker in german_markers):
+        detected_lang = 'de'
+    return detected_lang
+
+
+def evaluate(detect, samples=SAMPLES):
+    misses = []
+    for expected, text in samples:
+        got = detect(text)
+        if got != expected:
+            misses.append((expected, got, text))
+    return 1 - len(misses) / len(samples), misses
+
+
+def benchmark(detect, iterations):
+    started = time.perf_counter()
+    for _ in range(iterations):
+        for _, text in SAMPLES:
+            detect(text)
+    return (time.perf_counter() - started) / (iterations * len(SAMPLES))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=200)
+    args = parser.parse_args(argv)
+
+    candidates = [
+        ('detect_language', lambda text: detect_language(text)[0]),
+        ('legacy markers', legacy_detect),
+    ]
+    for name, detect in candidates:
+        accuracy, misses = evaluate(detect)
+        per_call = benchmark(detect, args.iterations)
+        print(f"{name}: accuracy {accuracy:.1%} on {len(SAMPLES)} samples, {per_call * 1e6:.1f} µs per call")
+        if name == 'detect_language':
+            for expected, got, text in misses:
+                print(f"  expected {expected}, got {got}: {text}")
+
+    short_accuracy, misses = evaluate(confident_language, SHORT_SAMPLES)
+    print(f"confident_language: accuracy {short_accuracy:.1%} on {len(SHORT_SAMPLES)} short samples")
+    for expected, got, text in misses:
+        print(f"  expected {expected}, got {got}: {text}")
+
+    accuracy, _ = evaluate(lambda text: detect_language(text)[0])
+    return 0 if accuracy >= 0.9 and short_accuracy >= 0.9 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
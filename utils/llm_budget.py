@@ -0,0 +1,192 @@
+import os
+import math
+import time
+import sqlite3
+import logging
+import threading
+
+from flask import has_request_context, jsonify
+
+logger = logging.getLogger(__name__)
+
+# Requests-per-minute and tokens-per-minute budgets for OpenAI calls, for the
+# whole deployment and for each user. Every scope is a token bucket that
+# refills continuously at its per-minute limit. Buckets live in a local SQLite
+# file so all worker processes on the host draw from the same budget.
+GLOBAL_RPM = int(os.environ.get('LLM_GLOBAL_RPM', 500))
+GLOBAL_TPM = int(os.environ.get('LLM_GLOBAL_TPM', 200000))
+USER_RPM = int(os.environ.get('LLM_USER_RPM', 20))
+USER_TPM = int(os.environ.get('LLM_USER_TPM', 20000))
+BUDGET_PATH = os.environ.get('LLM_BUDGET_PATH', os.path.join('instance', 'llm_budget.db'))
+
+# Share of every bucket a priority class must leave untouched, so batch work
+# runs out of budget well before interactive chat does
+PRIORITIES = {
+    'interactive': 0.0,
+    'standard': 0.2,
+    'batch': 0.5,
+}
+
+# Calls made outside a request (background threads, CLI commands) wait up to
+# this long for budget instead of failing
+BACKGROUND_WAIT = float(os.environ.get('LLM_BACKGROUND_WAIT', 60))
+
+# Completion tokens assumed for a call when estimating its cost
+DEFAULT_COMPLETION_TOKENS = 500
+
+_lock = threading.Lock()
+_local = threading.local()
+_stats = {}  # priority -> counters
+
+
+class BudgetExceeded(Exception):
+    """Raised when a call would go over a request or token budget."""
+
+    def __init__(self, scope, retry_after):
+        super().__init__(f'LLM {scope} rate limit reached, retry in {retry_after} seconds')
+        self.scope = scope
+        self.retry_after = retry_after
+
+
+def estimate_tokens(*texts, completion=DEFAULT_COMPLETION_TOKENS):
+    """Rough token cost of a call: about four characters per prompt token plus the completion."""
+    return sum(len(text or '') // 4 + 1 for text in texts) + completion
+
+
+def _connect():
+    conn = getattr(_local, 'conn', None)
+    if conn is not None and _local.pid == os.getpid():
+        return conn
+    os.makedirs(os.path.dirname(BUDGET_PATH) or '.', exist_ok=True)
+    conn = sqlite3.connect(BUDGET_PATH, timeout=10, isolation_level=None)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute(
+        'CREATE TABLE IF NOT EXISTS llm_budget ('
+        'scope TEXT PRIMARY KEY, requests REAL NOT NULL, '
+        'tokens REAL NOT NULL, updated REAL NOT NULL)'
+    )
+    _local.conn = conn
+    _local.pid = os.getpid()
+    return conn
+
+
+def _current_user_id():
+    if not has_request_context():
+        return None
+    from flask_login import current_user
+    return current_user.id if current_user.is_authenticated else None
+
+
+def _limits(scope):
+    if scope == 'global':
+        return GLOBAL_RPM, GLOBAL_TPM
+    return USER_RPM, USER_TPM
+
+
+def _take(conn, scopes, tokens, reserve, now):
+    """Charge one request and tokens to every scope, or return (scope, retry_after) of the first that can't pay."""
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        buckets = []
+        for scope in scopes:
+            rpm, tpm = _limits(scope)
+            row = conn.execute(
+                'SELECT requests, tokens, updated FROM llm_budget WHERE scope = ?', (scope,)
+            ).fetchone()
+            requests_left, tokens_left, updated = row if row else (rpm, tpm, now)
+            elapsed = max(0.0, now - updated)
+            requests_left = min(rpm, requests_left + elapsed * rpm / 60)
+            tokens_left = min(tpm, tokens_left + elapsed * tpm / 60)
+
+            # A call bigger than the bucket can still run once the bucket is full
+            cost = min(tokens, tpm * (1 - reserve))
+            requests_needed = 1 + rpm * reserve
+            tokens_needed = cost + tpm * reserve
+            if requests_left < requests_needed or tokens_left < tokens_needed:
+                wait = max(
+                    (requests_needed - requests_left) * 60 / rpm,
+                    (tokens_needed - tokens_left) * 60 / tpm,
+                )
+                conn.execute('ROLLBACK')
+                return scope, max(1, math.ceil(wait))
+            buckets.append((scope, requests_left - 1, tokens_left - cost))
+
+        conn.executemany(
+            'INSERT OR REPLACE INTO llm_budget (scope, requests, tokens, updated) VALUES (?, ?, ?, ?)',
+            [(scope, requests_left, tokens_left, now) for scope, requests_left, tokens_left in buckets]
+        )
+        conn.execute('COMMIT')
+        return None
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+
+
+def _count(priority, counter):
+    with _lock:
+        counters = _stats.setdefault(priority, {'admitted': 0, 'limited': 0, 'waited': 0})
+        counters[counter] += 1
+
+
+def acquire(tokens, priority='interactive', user_id=None):
+    """Charge an upcoming OpenAI call to the global budget and the user's budget.
+
+    user_id defaults to the logged-in user. In a request, raises BudgetExceeded
+    if either budget can't cover the call; elsewhere waits for budget for up
+    to BACKGROUND_WAIT seconds first.
+    """
+    reserve = PRIORITIES[priority]
+    if user_id is None:
+        user_id = _current_user_id()
+    scopes = ['global'] if user_id is None else ['global', f'user:{user_id}']
+    deadline = None if has_request_context() else time.monotonic() + BACKGROUND_WAIT
+
+    while True:
+        try:
+            limited = _take(_connect(), scopes, tokens, reserve, time.time())
+        except sqlite3.Error as e:
+            # Never take the app down over the limiter's bookkeeping
+            logger.warning(f"LLM budget unavailable, allowing call: {e}")
+            limited = None
+        if limited is None:
+            _count(priority, 'admitted')
+            return
+
+        scope, retry_after = limited
+        if deadline is not None and time.monotonic() + retry_after <= deadline:
+            _count(priority, 'waited')
+            logger.debug(f"Waiting {retry_after}s for {scope} LLM budget ({priority})")
+            time.sleep(retry_after)
+            continue
+
+        _count(priority, 'limited')
+        kind = 'global' if scope == 'global' else 'user'
+        logger.warning(f"LLM {kind} budget exhausted for a {priority} call of ~{tokens} tokens, "
+                       f"retry in {retry_after}s")
+        raise BudgetExceeded(kind, retry_after)
+
+
+def limited_response(error):
+    """Build the 429 response for a BudgetExceeded error."""
+    response = jsonify({
+        'error': 'Too many AI requests right now, please try again shortly.',
+        'scope': error.scope,
+        'retry_after': error.retry_after,
+    })
+    return response, 429, {'Retry-After': str(error.retry_after)}
+
+
+def get_stats():
+    """Report admitted and rejected calls per priority in this worker, with the configured limits."""
+    with _lock:
+        stats = {priority: dict(counters) for priority, counters in _stats.items()}
+    return {
+        'priorities': stats,
+        'limits': {
+            'global_rpm': GLOBAL_RPM,
+            'global_tpm': GLOBAL_TPM,
+            'user_rpm': USER_RPM,
+            'user_tpm': USER_TPM,
+            'reserves': PRIORITIES,
+        },
+    }
@@ -0,0 +1,169 @@
+"""Load test comparing sync gunicorn workers with the ASGI path for LLM routes.
+
+Starts the local OpenAI stand-in answering after a fixed delay, then runs the
+app twice against it: once as `main:app` on sync gunicorn workers and once as
+`asgi:application` on a single uvicorn worker. Each run fires concurrent
+/api/translate requests as a logged-in user and reports throughput and latency.
+
+Run from the repository root with: python -m utils.llm_loadtest [--requests N]
+"""
+import os
+import re
+import sys
+import time
+import socket
+import asyncio
+import argparse
+import tempfile
+import subprocess
+
+import httpx
+
+from utils import openai_standin
+
+_CSRF_RE = re.compile(r'name="csrf_token"[^>]*value="([^"]+)"|name="csrf-token" content="([^"]+)"')
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _wait_for_port(port, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f'server on port {port} did not start')
+
+
+def _csrf_token(html):
+    match = _CSRF_RE.search(html)
+    return match.group(1) or match.group(2)
+
+
+async def _sign_in(client, username):
+    """Register a fresh user (which logs them in) and return a CSRF token for API calls."""
+    page = await client.get('/register')
+    await client.post('/register', data={
+        'csrf_token': _csrf_token(page.text),
+        'username': username,
+        'email': f'{username}@example.com',
+        'password': 'loadtest-password',
+        'confirm_password': 'loadtest-password',
+    })
+    page = await client.get('/')
+    return _csrf_token(page.text)
+
+
+async def _run_load(base_url, total, concurrency, username):
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=600, follow_redirects=True) as client:
+        token = await _sign_in(client, username)
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies = []
+        errors = 0
+
+        async def one(i):
+            nonlocal errors
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    response = await client.post(
+                        '/api/translate',
+                        json={'text': f'Good morning number {i} from {username}', 'target_lang': 'es'},
+                        headers={'X-CSRFToken': token}
+                    )
+                    if response.status_code != 200:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(total)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'elapsed': elapsed,
+        'throughput': total / elapsed,
+        'p50': latencies[len(latencies) // 2],
+        'p95': latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+        'errors': errors,
+    }
+
+
+def _serve(name, command, env, args):
+    port = _free_port()
+    process = subprocess.Popen(
+        command + ['--bind', f'127.0.0.1:{port}'],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+    try:
+        _wait_for_port(port)
+        result = asyncio.run(_run_load(f'http://127.0.0.1:{port}', args.requests, args.concurrency,
+                                       f'loadtest{port}'))
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+    print(f"{name}: {args.requests} requests in {result['elapsed']:.1f}s, "
+          f"{result['throughput']:.1f} req/s, p50 {result['p50']:.2f}s, "
+          f"p95 {result['p95']:.2f}s, {result['errors']} errors")
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=200)
+    parser.add_argument('--delay', type=float, default=2.0, help='Upstream response time in seconds.')
+    parser.add_argument('--sync-workers', type=int, default=4)
+    args = parser.parse_args(argv)
+
+    upstream = openai_standin.start(latency=f'fixed:{args.delay}')
+
+    workdir = tempfile.mkdtemp(prefix='llm-loadtest-')
+    env = dict(
+        os.environ,
+        OPENAI_API_KEY='sk-loadtest',
+        OPENAI_BASE_URL=f'http://127.0.0.1:{upstream.server_port}/v1',
+        DATABASE_URL=f"sqlite:///{os.path.join(workdir, 'loadtest.db')}",
+        SESSION_SECRET='loadtest',
+        # One user sends every request, so lift the per-user LLM budget
+        LLM_BUDGET_PATH=os.path.join(workdir, 'llm_budget.db'),
+        LLM_USER_RPM=str(10 * args.requests),
+        LLM_GLOBAL_RPM=str(10 * args.requests),
+        LLM_USER_TPM=str(1000 * args.requests),
+        LLM_GLOBAL_TPM=str(1000 * args.requests),
+    )
+
+    # Create the schema once so the two servers don't race on it
+    subprocess.run([sys.executable, '-c', 'import app'], env=env, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    print(f"Upstream delay {args.delay:.1f}s, {args.requests} requests, {args.concurrency} concurrent")
+    sync = _serve(
+        f'sync ({args.sync_workers} workers)',
+        ['gunicorn', '--workers', str(args.sync_workers), '--timeout', '600', 'main:app'],
+        env, args
+    )
+    asgi = _serve(
+        'asgi (1 worker)',
+        ['gunicorn', '--workers', '1', '--timeout', '600', '-k', 'uvicorn.workers.UvicornWorker',
+         'asgi:application'],
+        env, args
+    )
+    upstream.shutdown()
+    print(f"ASGI path throughput: {asgi['throughput'] / sync['throughput']:.1f}x the sync workers")
+    return 0 if not asgi['errors'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
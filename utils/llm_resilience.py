@@ -0,0 +1,242 @@
+import os
+import time
+import random
+import asyncio
+import logging
+import threading
+from collections import deque
+
+from openai import APIConnectionError, APIStatusError, OpenAIError
+
+from utils.openai_client import get_client, get_async_client
+
+logger = logging.getLogger(__name__)
+
+# Total time an operation may take across all of its attempts, in seconds
+DEADLINES = {
+    'chat': float(os.environ.get('LLM_CHAT_DEADLINE', 30)),
+    'generation': float(os.environ.get('LLM_GENERATION_DEADLINE', 90)),
+    'transcription': float(os.environ.get('LLM_TRANSCRIPTION_DEADLINE', 60)),
+    'tts': float(os.environ.get('LLM_TTS_DEADLINE', 30)),
+}
+
+# Retries use exponential backoff with full jitter, and only while the
+# deadline leaves room for another attempt
+MAX_ATTEMPTS = int(os.environ.get('LLM_MAX_ATTEMPTS', 3))
+BACKOFF_BASE = float(os.environ.get('LLM_BACKOFF_BASE', 0.5))
+BACKOFF_MAX = float(os.environ.get('LLM_BACKOFF_MAX', 8))
+
+# A breaker opens when at least BREAKER_MIN_CALLS of the calls in the last
+# BREAKER_WINDOW seconds were made and BREAKER_FAILURE_RATE of them failed.
+# While open, calls fail at once; after BREAKER_COOLDOWN one probe call is let
+# through and its outcome closes or reopens the breaker.
+BREAKER_WINDOW = float(os.environ.get('LLM_BREAKER_WINDOW', 60))
+BREAKER_MIN_CALLS = int(os.environ.get('LLM_BREAKER_MIN_CALLS', 5))
+BREAKER_FAILURE_RATE = float(os.environ.get('LLM_BREAKER_FAILURE_RATE', 0.5))
+BREAKER_COOLDOWN = float(os.environ.get('LLM_BREAKER_COOLDOWN', 30))
+
+CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+_RETRYABLE_STATUS = {408, 409, 429}
+
+
+class CircuitOpenError(OpenAIError):
+    """Raised instead of calling upstream while an operation's breaker is open."""
+
+    def __init__(self, operation, retry_after):
+        super().__init__(f'OpenAI {operation} calls are failing, not retrying for {retry_after:.0f}s')
+        self.operation = operation
+        self.retry_after = retry_after
+
+
+def is_retryable(error):
+    """Whether an upstream error is transient (connection, timeout, rate limit, 5xx)."""
+    if isinstance(error, APIConnectionError):
+        return True
+    if isinstance(error, APIStatusError):
+        return error.status_code in _RETRYABLE_STATUS or error.status_code >= 500
+    return False
+
+
+class CircuitBreaker:
+    """Tracks recent outcomes of one operation and stops calls while it is failing."""
+
+    def __init__(self, operation):
+        self.operation = operation
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.transitions = 0
+        self.rejected = 0
+        self._outcomes = deque()  # (time, failed)
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def _transition(self, state, reason):
+        previous, self.state = self.state, state
+        self.transitions += 1
+        failures = sum(1 for _, failed in self._outcomes if failed)
+        # One line per change, in key=value form for log-based metrics
+        logger.warning(f"llm_circuit_breaker operation={self.operation} from={previous} to={state} "
+                       f"reason={reason} failures={failures} calls={len(self._outcomes)}")
+
+    def before_call(self):
+        """Raise CircuitOpenError unless a call may go upstream now.
+
+        Returns True for the half-open probe, which must end in record() or
+        abandon().
+        """
+        with self._lock:
+            if self.state == CLOSED:
+                return False
+            remaining = self.opened_at + BREAKER_COOLDOWN - time.monotonic()
+            if self.state == OPEN and remaining <= 0:
+                self._transition(HALF_OPEN, 'cooldown_elapsed')
+            if self.state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            self.rejected += 1
+        raise CircuitOpenError(self.operation, max(remaining, 1))
+
+    def record(self, failed):
+        now = time.monotonic()
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._probing = False
+                if failed:
+                    self.opened_at = now
+                    self._transition(OPEN, 'probe_failed')
+                else:
+                    self._outcomes.clear()
+                    self._transition(CLOSED, 'probe_succeeded')
+                return
+
+            self._outcomes.append((now, failed))
+            while self._outcomes and self._outcomes[0][0] < now - BREAKER_WINDOW:
+                self._outcomes.popleft()
+            if self.state != CLOSED or not failed or len(self._outcomes) < BREAKER_MIN_CALLS:
+                return
+            failures = sum(1 for _, f in self._outcomes if f)
+            if failures / len(self._outcomes) >= BREAKER_FAILURE_RATE:
+                self.opened_at = now
+                self._transition(OPEN, 'error_rate')
+
+    def abandon(self):
+        """Let another call probe after the probe ended without an outcome, e.g. because it was cancelled."""
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._probing = False
+
+    def stats(self):
+        with self._lock:
+            failures = sum(1 for _, failed in self._outcomes if failed)
+            return {
+                'state': self.state,
+                'recent_calls': len(self._outcomes),
+                'recent_failures': failures,
+                'transitions': self.transitions,
+                'rejected': self.rejected,
+            }
+
+
+_breakers = {operation: CircuitBreaker(operation) for operation in DEADLINES}
+_stats_lock = threading.Lock()
+_stats = {operation: {'calls': 0, 'retries': 0, 'failures': 0} for operation in DEADLINES}
+
+
+def _count(operation, counter):
+    with _stats_lock:
+        _stats[operation][counter] += 1
+
+
+def _backoff(attempt, error):
+    delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+    response = getattr(error, 'response', None)
+    retry_after = response.headers.get('retry-after') if response is not None else None
+    if retry_after:
+        try:
+            delay = max(delay, float(retry_after))
+        except ValueError:
+            pass
+    return delay
+
+
+def _next_delay(operation, attempt, error, deadline):
+    """Seconds to wait before retrying after error, or None to give up."""
+    if not is_retryable(error) or attempt + 1 >= MAX_ATTEMPTS:
+        return None
+    delay = _backoff(attempt, error)
+    if time.monotonic() + delay >= deadline:
+        return None
+    logger.info(f"Retrying OpenAI {operation} call in {delay:.2f}s after: {error}")
+    _count(operation, 'retries')
+    return delay
+
+
+def call(operation, request):
+    """Run request(client) against OpenAI with retries, a deadline and the operation's breaker.
+
+    request gets a client whose timeout is the time left before the deadline.
+    Raises CircuitOpenError while the breaker is open, or the last upstream
+    error once retries are used up.
+    """
+    breaker = _breakers[operation]
+    probe = breaker.before_call()
+    _count(operation, 'calls')
+    deadline = time.monotonic() + DEADLINES[operation]
+    attempt = 0
+    try:
+        while True:
+            client = get_client().with_options(timeout=max(deadline - time.monotonic(), 1), max_retries=0)
+            try:
+                result = request(client)
+            except Exception as e:
+                delay = _next_delay(operation, attempt, e, deadline)
+                if delay is None:
+                    _count(operation, 'failures')
+                    breaker.record(is_retryable(e))
+                    raise
+                time.sleep(delay)
+                attempt += 1
+                continue
+            breaker.record(False)
+            return result
+    finally:
+        if probe:
+            breaker.abandon()
+
+
+async def acall(operation, request):
+    """Async counterpart of call(); request(client) is awaited with the async client."""
+    breaker = _breakers[operation]
+    probe = breaker.before_call()
+    _count(operation, 'calls')
+    deadline = time.monotonic() + DEADLINES[operation]
+    attempt = 0
+    try:
+        while True:
+            client = get_async_client().with_options(timeout=max(deadline - time.monotonic(), 1), max_retries=0)
+            try:
+                result = await request(client)
+            except Exception as e:
+                delay = _next_delay(operation, attempt, e, deadline)
+                if delay is None:
+                    _count(operation, 'failures')
+                    breaker.record(is_retryable(e))
+                    raise
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            breaker.record(False)
+            return result
+    finally:
+        if probe:
+            breaker.abandon()
+
+
+def get_stats():
+    """Report calls, retries and breaker state per operation in this worker."""
+    with _stats_lock:
+        stats = {operation: dict(counters) for operation, counters in _stats.items()}
+    for operation, breaker in _breakers.items():
+        stats[operation].update(breaker.stats(), deadline=DEADLINES[operation])
+    return stats
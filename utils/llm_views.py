@@ -0,0 +1,300 @@
+import io
+import sys
+import time
+import asyncio
+import logging
+import contextvars
+
+from flask import jsonify
+
+from utils import llm_budget
+
+logger = logging.getLogger(__name__)
+
+# Set in the environ of requests that came in through AsyncLLMApp, so views
+# can offer responses that are only cheap on the event loop
+ASGI_ENVIRON_KEY = 'llm_views.asgi'
+
+
+def _default_fail(state, error):
+    logger.error(f"Upstream LLM call failed: {str(error)}")
+    return jsonify({'error': str(error)}), 500
+
+
+class LLMView:
+    """A view whose slow part is a single upstream LLM call.
+
+    The view is split around that call so it can run either as a normal Flask
+    view or on an event loop without holding a worker for the whole call:
+
+    - prepare() runs in the request context. It returns a dict of state for
+      the call, or any other view return value to respond right away.
+    - call(state) makes the upstream request synchronously; acall(state) is
+      the async equivalent.
+    - finish(state, result) runs in the request context again and builds the
+      response. fail(state, error) does so if the call raised.
+
+    estimate(state) returns the call's token cost; the call is then charged to
+    the LLM budget at the given priority and answered with 429 if it is over.
+    """
+
+    def __init__(self, prepare, call, acall, finish, fail=None, priority='interactive', estimate=None):
+        self.prepare = prepare
+        self.call = call
+        self.acall = acall
+        self.finish = finish
+        self.fail = fail or _default_fail
+        self.priority = priority
+        self.estimate = estimate
+
+    def begin(self):
+        """Run prepare() and charge the upstream call it sets up to the LLM budget."""
+        state = self.prepare()
+        if isinstance(state, dict) and self.estimate is not None:
+            try:
+                llm_budget.acquire(self.estimate(state), self.priority)
+            except llm_budget.BudgetExceeded as e:
+                return llm_budget.limited_response(e)
+        return state
+
+    def __call__(self):
+        state = self.begin()
+        if not isinstance(state, dict):
+            return state
+        try:
+            result = self.call(state)
+        except Exception as e:
+            return self.fail(state, e)
+        return self.finish(state, result)
+
+
+def _build_environ(scope, body):
+    """Build a WSGI environ for a buffered ASGI HTTP request."""
+    script_name = scope.get('root_path', '').encode('utf8').decode('latin1')
+    path_info = scope['path'].encode('utf8').decode('latin1')
+    if path_info.startswith(script_name):
+        path_info = path_info[len(script_name):]
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': script_name,
+        'PATH_INFO': path_info,
+        'QUERY_STRING': scope.get('query_string', b'').decode('ascii'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+        ASGI_ENVIRON_KEY: True,
+    }
+    if scope.get('client'):
+        environ['REMOTE_ADDR'] = scope['client'][0]
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin1').upper().replace('-', '_')
+        if name == 'CONTENT_LENGTH':
+            continue
+        if name != 'CONTENT_TYPE':
+            name = f'HTTP_{name}'
+        value = value.decode('latin1')
+        environ[name] = f'{environ[name]},{value}' if name in environ else value
+    return environ
+
+
+class AsyncLLMApp:
+    """ASGI application that serves LLMViews on the event loop.
+
+    Registered routes await their upstream call with the async OpenAI client,
+    so one process can hold hundreds of LLM requests in flight. Their prepare
+    and finish steps still run inside a Flask request context (sessions,
+    Flask-Login, CSRF, SQLAlchemy) on a worker thread. All other requests are
+    handed to the Flask app on a worker thread, as a WSGI server would.
+    """
+
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.routes = {}
+        self.streams = []
+
+    def add(self, path, view, methods=('POST',)):
+        for method in methods:
+            self.routes[(method, path)] = view
+
+    def add_stream(self, pattern, poll, interval=0.5, timeout=120):
+        """Serve Server-Sent Events for GET paths matching the compiled regex pattern.
+
+        poll(seen, **groups) runs in a request context on a worker thread and
+        returns {'frames': [...], 'finished': bool}, or any other view return
+        value to respond with instead. seen is a dict kept for the whole
+        stream. Between polls the stream only waits on the event loop.
+        """
+        self.streams.append((pattern, poll, interval, timeout))
+
+    def _match_stream(self, scope):
+        if scope['method'] != 'GET':
+            return None
+        for pattern, poll, interval, timeout in self.streams:
+            match = pattern.fullmatch(scope['path'])
+            if match:
+                return match.groupdict(), poll, interval, timeout
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            while True:
+                message = await receive()
+                if message['type'] == 'lifespan.startup':
+                    await send({'type': 'lifespan.startup.complete'})
+                elif message['type'] == 'lifespan.shutdown':
+                    await send({'type': 'lifespan.shutdown.complete'})
+                    return
+        if scope['type'] != 'http':
+            return
+
+        body = await self._read_body(receive)
+        if body is None:
+            return
+        view = self.routes.get((scope['method'], scope['path']))
+        stream = self._match_stream(scope)
+        if view is not None:
+            await self._serve(view, scope, body, send)
+        elif stream is not None:
+            await self._serve_stream(stream, scope, body, receive, send)
+        else:
+            await self._serve_wsgi(scope, body, send)
+
+    async def _read_body(self, receive):
+        """Buffer the request body; None if the client went away first."""
+        chunks = []
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return None
+            chunks.append(message.get('body', b''))
+            if not message.get('more_body'):
+                return b''.join(chunks)
+
+    async def _serve_wsgi(self, scope, body, send):
+        """Run any other route through the Flask WSGI app on a worker thread.
+
+        The response is relayed chunk by chunk, so streamed responses (SSE,
+        audio) still stream.
+        """
+        started = {}
+
+        def start_response(status, headers, exc_info=None):
+            started['status'] = int(status.split(' ', 1)[0])
+            started['headers'] = headers
+
+        # Every step runs in the same context, so a request context pushed by
+        # stream_with_context survives from one chunk to the next
+        context = contextvars.copy_context()
+        environ = _build_environ(scope, body)
+        iterable = await asyncio.to_thread(context.run, self.flask_app, environ, start_response)
+        chunks = iter(iterable)
+        try:
+            first = await asyncio.to_thread(context.run, next, chunks, None)
+            await send({
+                'type': 'http.response.start',
+                'status': started['status'],
+                'headers': [
+                    (name.lower().encode('latin1'), value.encode('latin1'))
+                    for name, value in started['headers']
+                ],
+            })
+            chunk = first
+            while chunk is not None:
+                if chunk:
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+                chunk = await asyncio.to_thread(context.run, next, chunks, None)
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            if hasattr(iterable, 'close'):
+                await asyncio.to_thread(context.run, iterable.close)
+
+    def _in_request(self, environ, fn, preprocess):
+        app = self.flask_app
+        with app.request_context(environ):
+            try:
+                rv = app.preprocess_request() if preprocess else None
+                if rv is None:
+                    rv = fn()
+            except Exception as e:
+                try:
+                    rv = app.handle_user_exception(e)
+                except Exception:
+                    rv = app.handle_exception(e)
+            if isinstance(rv, dict):
+                return rv
+            return app.finalize_request(rv)
+
+    async def _serve(self, view, scope, body, send):
+        result = await asyncio.to_thread(self._in_request, _build_environ(scope, body), view.begin, True)
+        if isinstance(result, dict):
+            state = result
+            try:
+                upstream = await view.acall(state)
+                finish = lambda: view.finish(state, upstream)
+            except Exception as e:
+                error = e
+                finish = lambda: view.fail(state, error)
+            result = await asyncio.to_thread(self._in_request, _build_environ(scope, body), finish, False)
+
+        await self._send_response(result, send)
+
+    async def _send_response(self, result, send):
+        await send({
+            'type': 'http.response.start',
+            'status': result.status_code,
+            'headers': [
+                (name.lower().encode('latin1'), value.encode('latin1'))
+                for name, value in result.headers.items()
+            ],
+        })
+        try:
+            await send({'type': 'http.response.body', 'body': result.get_data()})
+        finally:
+            result.close()
+
+    async def _serve_stream(self, stream, scope, body, receive, send):
+        groups, poll, interval, timeout = stream
+        seen = {}
+        call = lambda: poll(seen, **groups)
+        result = await asyncio.to_thread(self._in_request, _build_environ(scope, body), call, True)
+        if not isinstance(result, dict):
+            await self._send_response(result, send)
+            return
+
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', b'text/event-stream; charset=utf-8'),
+                (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no'),
+            ],
+        })
+        disconnected = asyncio.ensure_future(receive())
+        deadline = time.monotonic() + timeout
+        try:
+            while True:
+                frames = ''.join(result['frames'])
+                if frames:
+                    await send({'type': 'http.response.body', 'body': frames.encode('utf-8'), 'more_body': True})
+                if result['finished'] or time.monotonic() >= deadline:
+                    break
+                done, _ = await asyncio.wait({disconnected}, timeout=interval)
+                if done:
+                    return
+                result = await asyncio.to_thread(self._in_request, _build_environ(scope, body), call, False)
+                if not isinstance(result, dict):
+                    break
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            disconnected.cancel()
+
@@ -0,0 +1,170 @@
+import os
+import asyncio
+import logging
+import threading
+import weakref
+import httpx
+from openai import OpenAI, AsyncOpenAI
+
+logger = logging.getLogger(__name__)
+
+# Connection pool sizing for the shared client. Each gunicorn worker process
+# gets its own pool, so the upstream connection count is roughly
+# workers * OPENAI_MAX_CONNECTIONS.
+MAX_CONNECTIONS = int(os.environ.get('OPENAI_MAX_CONNECTIONS', 20))
+MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get('OPENAI_MAX_KEEPALIVE_CONNECTIONS', 10))
+KEEPALIVE_EXPIRY = float(os.environ.get('OPENAI_KEEPALIVE_EXPIRY', 30))
+CONNECT_TIMEOUT = float(os.environ.get('OPENAI_CONNECT_TIMEOUT', 5))
+POOL_TIMEOUT = float(os.environ.get('OPENAI_POOL_TIMEOUT', 10))
+REQUEST_TIMEOUT = float(os.environ.get('OPENAI_TIMEOUT', 60))
+
+# The async client multiplexes many in-flight calls on one event loop, so its
+# pool is sized for the concurrency of a whole ASGI worker
+ASYNC_MAX_CONNECTIONS = int(os.environ.get('OPENAI_ASYNC_MAX_CONNECTIONS', 500))
+ASYNC_MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get('OPENAI_ASYNC_MAX_KEEPALIVE_CONNECTIONS', 100))
+
+_lock = threading.Lock()
+_client = None
+_client_pid = None
+_transport = None
+_stats = {
+    'requests': 0,
+    'in_use': 0,
+    'peak_in_use': 0,
+    'clients_created': 0,
+}
+
+
+def get_openai_api_key():
+    """Read OPENAI_API_KEY, cleaning up line breaks or whitespace."""
+    openai_api_key = os.environ.get("OPENAI_API_KEY")
+    if openai_api_key:
+        openai_api_key = openai_api_key.strip().replace('\n', '')
+    return openai_api_key
+
+
+def _checkout():
+    with _lock:
+        _stats['requests'] += 1
+        _stats['in_use'] += 1
+        _stats['peak_in_use'] = max(_stats['peak_in_use'], _stats['in_use'])
+
+
+def _release():
+    with _lock:
+        _stats['in_use'] -= 1
+
+
+class _ReleasingStream(httpx.SyncByteStream):
+    """Response body wrapper that marks the connection free once the body is closed."""
+
+    def __init__(self, stream):
+        self._stream = stream
+        self._released = False
+
+    def __iter__(self):
+        for chunk in self._stream:
+            yield chunk
+
+    def close(self):
+        try:
+            self._stream.close()
+        finally:
+            if not self._released:
+                self._released = True
+                _release()
+
+
+class _CountingTransport(httpx.HTTPTransport):
+    """HTTP transport that tracks how many pooled connections are checked out."""
+
+    def handle_request(self, request):
+        _checkout()
+        try:
+            response = super().handle_request(request)
+        except Exception:
+            _release()
+            raise
+        response.stream = _ReleasingStream(response.stream)
+        return response
+
+    def idle_connections(self):
+        connections = getattr(self._pool, 'connections', None) or []
+        return sum(1 for connection in connections if connection.is_idle())
+
+
+def _build_client():
+    global _transport
+    transport = _CountingTransport(limits=httpx.Limits(
+        max_connections=MAX_CONNECTIONS,
+        max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=KEEPALIVE_EXPIRY,
+    ))
+    http_client = httpx.Client(
+        transport=transport,
+        timeout=httpx.Timeout(REQUEST_TIMEOUT, connect=CONNECT_TIMEOUT, pool=POOL_TIMEOUT),
+    )
+    _transport = transport
+    return OpenAI(api_key=get_openai_api_key(), http_client=http_client)
+
+
+def get_client():
+    """Return the process-wide OpenAI client, creating it on first use.
+
+    The client is rebuilt after a fork so every gunicorn worker reuses its own
+    keep-alive connection pool instead of sharing sockets with its parent.
+    """
+    global _client, _client_pid
+    pid = os.getpid()
+    if _client is not None and _client_pid == pid:
+        return _client
+    with _lock:
+        if _client is None or _client_pid != pid:
+            if _client_pid is not None and _client_pid != pid:
+                # Inherited from the parent process; its counters don't apply here
+                _stats.update(requests=0, in_use=0, peak_in_use=0, clients_created=0)
+            _client = _build_client()
+            _client_pid = pid
+            _stats['clients_created'] += 1
+            logger.info(f"Created shared OpenAI client for process {pid} "
+                        f"(max_connections={MAX_CONNECTIONS}, keepalive={MAX_KEEPALIVE_CONNECTIONS})")
+    return _client
+
+
+_async_clients = weakref.WeakKeyDictionary()  # event loop -> AsyncOpenAI
+
+
+def get_async_client():
+    """Return the AsyncOpenAI client for the running event loop, creating it on first use."""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=ASYNC_MAX_CONNECTIONS,
+                max_keepalive_connections=ASYNC_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(REQUEST_TIMEOUT, connect=CONNECT_TIMEOUT, pool=POOL_TIMEOUT),
+        )
+        client = AsyncOpenAI(api_key=get_openai_api_key(), http_client=http_client)
+        _async_clients[loop] = client
+        logger.info(f"Created async OpenAI client for process {os.getpid()} "
+                    f"(max_connections={ASYNC_MAX_CONNECTIONS})")
+    return client
+
+
+def get_pool_stats():
+    """Report connection pool usage of this worker's shared client."""
+    with _lock:
+        stats = dict(_stats)
+        transport = _transport if _client_pid == os.getpid() else None
+    stats.update(
+        idle=transport.idle_connections() if transport is not None else 0,
+        pid=os.getpid(),
+        max_connections=MAX_CONNECTIONS,
+        max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=KEEPALIVE_EXPIRY,
+        request_timeout=REQUEST_TIMEOUT,
+    )
+    return stats
@@ -1,20 +1,42 @@
-import os
+import json
 import logging
-from openai import OpenAI, OpenAIError
+import time
+import threading
+from collections import deque
+from openai import OpenAIError
+from utils import llm_resilience, audio_preprocess, segmented_transcription
+from utils.openai_client import get_openai_api_key
 
 logger = logging.getLogger(__name__)
 
-OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
+OPENAI_API_KEY = get_openai_api_key()
 use_mock = False
 
 if not OPENAI_API_KEY:
     logger.warning("OPENAI_API_KEY environment variable is not set. Using mock implementation.")
     use_mock = True
-else:
-    openai = OpenAI(api_key=OPENAI_API_KEY)
 
+TUTOR_SYSTEM_PROMPT = "You are an AI language tutor designed to help learners become more fluent in their target language. Your role is to be patient, warm, and engaging, making conversations feel natural and human-like. You should: Respond in a friendly and encouraging manner. Adapt to the learner's proficiency level and provide helpful corrections when needed. Provide cultural and current news updates when asked, ensuring that the learner stays informed about relevant topics. Keep the conversation engaging by asking follow-up questions and making small talk when appropriate. Avoid robotic or overly formal speech; instead, mimic a casual and natural conversational style. Explain words, phrases, or cultural references in a way that is easy for the learner to understand. Encourage learners to express themselves fully and confidently. Stay supportive and never criticize mistakes harshly. Your goal is to help the learner gain fluency while making the learning experience enjoyable."
 
-def chat_with_ai(message):
+# Recent streamed chat timings, kept to report time-to-first-token
+# separately from total completion time
+_stream_lock = threading.Lock()
+_stream_timings = deque(maxlen=500)  # (ttft seconds, total seconds)
+
+
+def _tutor_messages(message, context=None):
+    return [{"role": "system", "content": TUTOR_SYSTEM_PROMPT}] + list(context or []) + [
+        {"role": "user", "content": message}
+    ]
+
+
+def chat_with_ai(message, context=None):
+    """Ask the tutor for a reply to message.
+
+    context is an optional list of earlier messages (see
+    utils.chat_context.build_context) placed between the system prompt and
+    the new message.
+    """
     if use_mock:
         logger.info(f"Mock response for: {message}")
         return {
@@ -28,17 +50,10 @@ def chat_with_ai(message):
         if not message.strip():
             raise ValueError("Empty message received")
 
-        completion = openai.chat.completions.create(
+        completion = llm_resilience.call('chat', lambda client: client.chat.completions.create(
             model="gpt-3.5-turbo",
-            messages=[{
-                "role":
-                "system",
-                "content":
-                "You are an AI language tutor designed to help learners become more fluent in their target language. Your role is to be patient, warm, and engaging, making conversations feel natural and human-like. You should: Respond in a friendly and encouraging manner. Adapt to the learner's proficiency level and provide helpful corrections when needed. Provide cultural and current news updates when asked, ensuring that the learner stays informed about relevant topics. Keep the conversation engaging by asking follow-up questions and making small talk when appropriate. Avoid robotic or overly formal speech; instead, mimic a casual and natural conversational style. Explain words, phrases, or cultural references in a way that is easy for the learner to understand. Encourage learners to express themselves fully and confidently. Stay supportive and never criticize mistakes harshly. Your goal is to help the learner gain fluency while making the learning experience enjoyable."
-            }, {
-                "role": "user",
-                "content": message
-            }])
+            messages=_tutor_messages(message, context)
+        ))
 
         logger.debug(f"OpenAI response: {completion}")
         response = completion.choices[0].message
@@ -48,65 +63,246 @@ def chat_with_ai(message):
         logger.error(f"OpenAI API error: {e}")
         return {
             "role": "assistant",
-            "content": "I'm sorry, I'm having trouble processing your request right now. Please try again later."
+            "content": "I'm sorry, I'm having trouble processing your request right now. Please try again later.",
+            "error": True
         }
     except Exception as e:
         logger.error(f"Error in chat_with_ai: {e}")
         return {
             "role": "assistant",
-            "content": "An unexpected error occurred. Please try again."
+            "content": "An unexpected error occurred. Please try again.",
+            "error": True
         }
 
 
-def transcribe_audio(audio_file_path):
+async def achat_with_ai(message, context=None):
+    """Async counterpart of chat_with_ai() for the ASGI entry point."""
     if use_mock:
-        logger.info(f"Mock transcription for file: {audio_file_path}")
-        return "This is a mock transcription as no OpenAI API key is set. To use the real API, please set the OPENAI_API_KEY environment variable."
-        
+        return chat_with_ai(message, context)
+
     try:
-        logger.debug(f"Transcribing audio file: {audio_file_path}")
-        
-        # Check if file exists and is not empty
-        if not os.path.exists(audio_file_path):
-            logger.error(f"Audio file does not exist: {audio_file_path}")
-            return "Error: Audio file not found"
-            
-        file_size = os.path.getsize(audio_file_path)
-        if file_size == 0:
-            logger.error(f"Audio file is empty (0 bytes): {audio_file_path}")
-            return "Error: Audio file is empty"
-            
-        logger.debug(f"Audio file size: {file_size} bytes")
-        
-        # Convert webm to mp3 format if needed
-        if audio_file_path.endswith('.webm'):
-            try:
-                # Try using a direct approach first
-                with open(audio_file_path, "rb") as audio_file:
-                    transcript = openai.audio.transcriptions.create(
-                        model="whisper-1", 
-                        file=audio_file
-                    )
-                    
-                logger.debug(f"Direct transcription result: {transcript}")
-                return transcript.text
-            except Exception as e:
-                logger.error(f"Direct transcription failed: {e}. Using fallback transcription.")
-                # Fallback to simpler text for troubleshooting
-                return "This is a fallback transcription. The audio could not be processed."
-        else:
-            # Standard processing for non-webm files
-            with open(audio_file_path, "rb") as audio_file:
-                transcript = openai.audio.transcriptions.create(
-                    model="whisper-1", 
-                    file=audio_file
-                )
-                
-            logger.debug(f"Transcription result: {transcript}")
-            return transcript.text
+        if not message.strip():
+            raise ValueError("Empty message received")
+
+        completion = await llm_resilience.acall('chat', lambda client: client.chat.completions.create(
+            model="gpt-3.5-turbo",
+            messages=_tutor_messages(message, context)
+        ))
+        response = completion.choices[0].message
+
+        return {"role": response.role, "content": response.content}
+    except OpenAIError as e:
+        logger.error(f"OpenAI API error: {e}")
+        return {
+            "role": "assistant",
+            "content": "I'm sorry, I'm having trouble processing your request right now. Please try again later.",
+            "error": True
+        }
+    except Exception as e:
+        logger.error(f"Error in achat_with_ai: {e}")
+        return {
+            "role": "assistant",
+            "content": "An unexpected error occurred. Please try again.",
+            "error": True
+        }
+
+
+def stream_chat_with_ai(message, context=None):
+    """Yield the tutor's reply to message as content deltas while it is generated.
+
+    Mirrors chat_with_ai(): errors are logged and turned into an apology
+    instead of being raised.
+    """
+    if use_mock:
+        logger.info(f"Mock streamed response for: {message}")
+        yield "This is a mock response as no OpenAI API key is set. To use the real API, please set the OPENAI_API_KEY environment variable."
+        return
+
+    try:
+        if not message.strip():
+            raise ValueError("Empty message received")
+
+        stream = llm_resilience.call('chat', lambda client: client.chat.completions.create(
+            model="gpt-3.5-turbo",
+            messages=_tutor_messages(message, context),
+            stream=True
+        ))
+        try:
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            stream.close()
     except OpenAIError as e:
-        logger.error(f"OpenAI API error during transcription: {e}")
-        return f"Error transcribing audio: {str(e)}"
+        logger.error(f"OpenAI API streaming error: {e}")
+        yield "I'm sorry, I'm having trouble processing your request right now. Please try again later."
     except Exception as e:
-        logger.error(f"Error in transcribe_audio: {e}")
-        return f"An unexpected error occurred during transcription: {str(e)}"
\ No newline at end of file
+        logger.error(f"Error in stream_chat_with_ai: {e}")
+        yield "An unexpected error occurred. Please try again."
+
+
+def summarize_conversation(previous_summary, turns, max_tokens):
+    """Merge (message, response) turns into previous_summary and return the new summary.
+
+    Returns None if the summary could not be updated.
+    """
+    if use_mock:
+        return previous_summary
+
+    transcript = "\n".join(f"Learner: {message}\nTutor: {response}" for message, response in turns)
+    try:
+        completion = llm_resilience.call('chat', lambda client: client.chat.completions.create(
+            model="gpt-3.5-turbo",
+            messages=[{
+                "role": "system",
+                "content": "You keep a running summary of a conversation between a language learner and their tutor. "
+                           "Merge the new exchanges into the existing summary. Keep what helps continue the "
+                           "conversation: the learner's name, level, goals, recurring mistakes, and topics covered. "
+                           "Reply with the updated summary only."
+            }, {
+                "role": "user",
+                "content": f"Existing summary:\n{previous_summary or '(none)'}\n\nNew exchanges:\n{transcript}"
+            }],
+            max_tokens=max_tokens
+        ))
+        return completion.choices[0].message.content.strip()
+    except Exception as e:
+        logger.error(f"Error summarizing conversation: {e}")
+        return None
+
+
+def _batch_translation_messages(segments, target_name):
+    numbered = [
+        {"id": i, "language": source_name or "auto-detect", "text": text}
+        for i, (source_name, text) in enumerate(segments)
+    ]
+    return [{
+        "role": "system",
+        "content": f"You translate text segments into {target_name}. Translate each segment on its own, "
+                   f"keeping its meaning and tone. Reply with a JSON object of the form "
+                   f'{{"translations": [{{"id": <segment id>, "translation": "<text>"}}, ...]}} '
+                   f"with exactly one entry per segment and nothing else."
+    }, {
+        "role": "user",
+        "content": json.dumps({"segments": numbered}, ensure_ascii=False)
+    }]
+
+
+def _parse_batch_translation(content, count):
+    items = json.loads(content).get("translations")
+    if not isinstance(items, list):
+        raise ValueError("Batch translation response has no translations list")
+    translations = [None] * count
+    for position, item in enumerate(items):
+        if isinstance(item, dict):
+            index, text = item.get("id", position), item.get("translation")
+        else:
+            index, text = position, item
+        if isinstance(index, int) and 0 <= index < count and isinstance(text, str):
+            translations[index] = text.strip()
+    return translations
+
+
+def translate_batch(segments, target_name):
+    """Translate several segments in one request.
+
+    segments is a list of (source language name or None, text). Returns the
+    translations in the same order, with None for any segment the model left
+    out. Raises on upstream or format errors.
+    """
+    if use_mock:
+        return [text for _, text in segments]
+
+    completion = llm_resilience.call('chat', lambda client: client.chat.completions.create(
+        model="gpt-3.5-turbo",
+        messages=_batch_translation_messages(segments, target_name),
+        response_format={"type": "json_object"}
+    ))
+    return _parse_batch_translation(completion.choices[0].message.content, len(segments))
+
+
+async def atranslate_batch(segments, target_name):
+    """Async counterpart of translate_batch() for the ASGI entry point."""
+    if use_mock:
+        return translate_batch(segments, target_name)
+
+    completion = await llm_resilience.acall('chat', lambda client: client.chat.completions.create(
+        model="gpt-3.5-turbo",
+        messages=_batch_translation_messages(segments, target_name),
+        response_format={"type": "json_object"}
+    ))
+    return _parse_batch_translation(completion.choices[0].message.content, len(segments))
+
+
+def record_stream_timing(ttft, total):
+    """Record the time to first token and total time of a streamed reply, in seconds."""
+    with _stream_lock:
+        _stream_timings.append((ttft, total))
+
+
+def _percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def get_stream_stats():
+    """Summarize recent streamed chat timings in milliseconds."""
+    with _stream_lock:
+        timings = list(_stream_timings)
+    ttfts = [ttft for ttft, _ in timings]
+    totals = [total for _, total in timings]
+    return {
+        'samples': len(timings),
+        'ttft_ms_p50': _percentile(ttfts, 0.5) * 1000,
+        'ttft_ms_p95': _percentile(ttfts, 0.95) * 1000,
+        'total_ms_p50': _percentile(totals, 0.5) * 1000,
+        'total_ms_p95': _percentile(totals, 0.95) * 1000,
+    }
+
+
+MOCK_TRANSCRIPTION = "This is a mock transcription as no OpenAI API key is set. To use the real API, please set the OPENAI_API_KEY environment variable."
+
+def transcribe_audio_data(audio, filename='recording.webm', preprocess=True):
+    """Transcribe a recording held in memory with Whisper.
+
+    audio is bytes or a readable file object, such as a spooled upload, and
+    filename tells Whisper its format. Unless preprocess is False, silence is
+    trimmed and the audio downsampled first (see utils.audio_preprocess), and
+    long recordings are transcribed in parallel segments (see
+    utils.segmented_transcription).
+    Raises OpenAIError if the call fails.
+    """
+    if use_mock:
+        logger.info(f"Mock transcription for upload: {filename}")
+        return MOCK_TRANSCRIPTION
+
+    # Bytes rather than the file object, so a retry sends the whole recording again
+    data = audio if isinstance(audio, bytes) else audio.read()
+    if not data:
+        raise ValueError('Audio is empty')
+    if not preprocess:
+        return _send_transcription(data, filename, False)
+
+    # Long recordings come back split at silence and are transcribed in parallel
+    segments, preprocessed = audio_preprocess.preprocess_segments(
+        data, filename, *segmented_transcription.segment_options()
+    )
+    if len(segments) > 1:
+        return segmented_transcription.transcribe(
+            segments, lambda data, filename: _send_transcription(data, filename, preprocessed)
+        )
+    data, filename = segments[0]
+    return _send_transcription(data, filename, preprocessed)
+
+def _send_transcription(data, filename, preprocessed):
+    logger.debug(f"Transcribing {len(data)} bytes from {filename}")
+    started = time.monotonic()
+    transcript = llm_resilience.call('transcription', lambda client: client.audio.transcriptions.create(
+        model="whisper-1",
+        file=(filename, data)
+    ))
+    audio_preprocess.record_transcription(preprocessed, time.monotonic() - started)
+    logger.debug(f"Transcription result: {transcript}")
+    return transcript.text
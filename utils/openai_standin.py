@@ -0,0 +1,448 @@
+"""Local OpenAI-compatible stand-in for load and latency testing.
+
+Serves the endpoints the app calls (chat completions, including streaming,
+audio transcriptions and audio speech) with configurable latency, error and
+rate-limit behaviour, and deterministic payloads. Replies to the prompts of
+submit_sentence, submit_speaking_practice, vocabulary generation and the
+translation endpoints are valid JSON of the shape the app parses, so the whole
+stack runs end to end without network access.
+
+Run it, then point the app at it:
+
+    python -m utils.openai_standin --port 8900 --latency lognormal:0.8,0.5 --error-rate 0.02
+    OPENAI_BASE_URL=http://127.0.0.1:8900/v1 OPENAI_API_KEY=sk-local python main.py
+
+Latency specs are fixed:S, uniform:LOW,HIGH, normal:MEAN,STDDEV,
+lognormal:MEDIAN,SIGMA or exponential:MEAN, in seconds. GET /stats reports
+request counts per endpoint and status.
+"""
+import re
+import sys
+import json
+import math
+import time
+import random
+import struct
+import hashlib
+import argparse
+import threading
+import http.server
+from collections import deque, Counter
+from email.parser import BytesParser
+
+# Silent MPEG-1 Layer III frame: 128 kbps, 44.1 kHz, mono, 417 bytes, 26 ms
+_MP3_FRAME = b'\xff\xfb\x90\xc4' + b'\x00' * 413
+_MP3_FRAME_SECONDS = 1152 / 44100
+_SPEECH_SECONDS_PER_CHAR = 0.06
+
+_TUTOR_REPLIES = [
+    "¡Muy bien! ¿Qué hiciste hoy?",
+    "Great question. In Spanish we say \"me gusta\" for things you like. What do you like to eat?",
+    "Almost! Remember the verb agrees with the subject: \"nosotros hablamos\". Try another sentence.",
+    "That sounds fun. ¿Con quién fuiste?",
+    "Nice work. Let's practice the past tense: what did you do last weekend?",
+]
+_TRANSCRIPTS = [
+    "Hola, me gustaría reservar una mesa para dos personas.",
+    "Buenos días, ¿dónde está la estación de tren?",
+    "Quisiera un café con leche, por favor.",
+    "Me llamo Ana y estudio español desde hace un año.",
+]
+_VOCABULARY_CATEGORIES = ['Greetings', 'Food', 'Travel', 'Shopping', 'Numbers',
+                          'School', 'Family', 'Colors', 'Animals', 'Time']
+
+
+class Latency:
+    """A latency distribution parsed from a spec such as 'lognormal:0.8,0.5'."""
+
+    def __init__(self, spec):
+        kind, _, params = spec.partition(':')
+        try:
+            values = [float(v) for v in params.split(',')] if params else []
+        except ValueError:
+            raise ValueError(f'bad latency spec {spec!r}')
+        expected = {'fixed': 1, 'uniform': 2, 'normal': 2, 'lognormal': 2, 'exponential': 1}
+        if expected.get(kind) != len(values):
+            raise ValueError(f'bad latency spec {spec!r}')
+        self.spec = spec
+        self.kind = kind
+        self.values = values
+
+    def sample(self, rng):
+        v = self.values
+        if self.kind == 'fixed':
+            value = v[0]
+        elif self.kind == 'uniform':
+            value = rng.uniform(v[0], v[1])
+        elif self.kind == 'normal':
+            value = rng.gauss(v[0], v[1])
+        elif self.kind == 'lognormal':
+            value = rng.lognormvariate(math.log(v[0]), v[1]) if v[0] > 0 else 0.0
+        else:
+            value = rng.expovariate(1 / v[0]) if v[0] > 0 else 0.0
+        return max(0.0, value)
+
+
+def _digest(*parts):
+    return int(hashlib.sha256('\x1f'.join(parts).encode('utf-8')).hexdigest(), 16)
+
+
+def _pick(options, *parts):
+    return options[_digest(*parts) % len(options)]
+
+
+def _estimate_tokens(text):
+    return len(text) // 4 + 1
+
+
+def _message_text(message):
+    content = message.get('content') or ''
+    if isinstance(content, list):
+        content = ' '.join(part.get('text', '') for part in content if isinstance(part, dict))
+    return content
+
+
+def _batch_translation(system, user):
+    target = re.search(r'segments into (.+?)\.', system)
+    target = target.group(1) if target else 'the target language'
+    segments = json.loads(user).get('segments', [])
+    return json.dumps({'translations': [
+        {'id': segment['id'], 'translation': f"[{target}] {segment['text']}"} for segment in segments
+    ]}, ensure_ascii=False)
+
+
+def _sentence_feedback(prompt):
+    sentence = re.search(r'Sentence: (.*)', prompt)
+    sentence = sentence.group(1).strip() if sentence else ''
+    correct = _digest('sentence', sentence) % 3 != 0
+    return json.dumps({
+        'is_correct': correct,
+        'correction': None if correct else sentence.rstrip('.') + '.',
+        'feedback': 'Good use of the word.' if correct else 'Check the verb agreement and punctuation.',
+    }, ensure_ascii=False)
+
+
+def _speaking_feedback(prompt):
+    transcript = re.search(r"transcribed response: (.*)", prompt)
+    transcript = transcript.group(1).strip() if transcript else ''
+    seed = _digest('speaking', transcript)
+    return json.dumps({
+        'pronunciation_score': float(60 + seed % 40),
+        'pronunciation_feedback': 'Clear vowels; soften the "r" between vowels.',
+        'grammar_feedback': 'Verb forms are correct.',
+        'vocabulary_feedback': 'Appropriate words for the scenario.',
+        'fluency_score': float(55 + (seed >> 8) % 45),
+        'improvement_suggestions': ['Slow down slightly', 'Link words within a phrase'],
+        'correct_response_example': _pick(_TRANSCRIPTS, transcript),
+    }, ensure_ascii=False)
+
+
+def _vocabulary(prompt):
+    count = re.search(r'Generate (\d+) vocabulary words', prompt)
+    count = int(count.group(1)) if count else 10
+    language = re.search(r'language code: (\w+)', prompt)
+    language = language.group(1) if language else 'es'
+    return json.dumps({'vocabulary': [
+        {
+            'word': f'{language}-palabra-{i + 1}',
+            'translation': f'word {i + 1}',
+            'example_sentence': f'Esta es la palabra {i + 1}.',
+            'category': _VOCABULARY_CATEGORIES[i % len(_VOCABULARY_CATEGORIES)],
+        }
+        for i in range(count)
+    ]}, ensure_ascii=False)
+
+
+def chat_reply(messages):
+    """Deterministic reply to a chat completion request, matching the app's prompts."""
+    system = ' '.join(_message_text(m) for m in messages if m.get('role') == 'system')
+    user = _message_text(messages[-1]) if messages else ''
+
+    if 'You translate text segments' in system:
+        return _batch_translation(system, user)
+    if 'running summary' in system:
+        return f'The learner has practised {user.count("Learner:")} more exchanges.'
+    if '"is_correct"' in user:
+        return _sentence_feedback(user)
+    if '"pronunciation_score"' in user:
+        return _speaking_feedback(user)
+    if '"vocabulary"' in user and 'vocabulary words' in user:
+        return _vocabulary(user)
+    translation = re.search(r'Translate the following text from .+? to (.+?):\s*(.*?)\s*Only provide', user, re.S)
+    if translation:
+        return f'[{translation.group(1)}] {translation.group(2)}'
+    return _pick(_TUTOR_REPLIES, user)
+
+
+def silent_mp3(text):
+    """Silent MP3 about as long as reading text aloud."""
+    seconds = max(0.5, len(text) * _SPEECH_SECONDS_PER_CHAR)
+    return _MP3_FRAME * math.ceil(seconds / _MP3_FRAME_SECONDS)
+
+
+def silent_wav(text, sample_rate=24000):
+    seconds = max(0.5, len(text) * _SPEECH_SECONDS_PER_CHAR)
+    data = b'\x00\x00' * int(seconds * sample_rate)
+    return b'RIFF' + struct.pack('<I', 36 + len(data)) + b'WAVEfmt ' + struct.pack(
+        '<IHHIIHH', 16, 1, 1, sample_rate, sample_rate * 2, 2, 16
+    ) + b'data' + struct.pack('<I', len(data)) + data
+
+
+class StandinServer(http.server.ThreadingHTTPServer):
+    """HTTP server holding the stand-in's behaviour settings and counters."""
+
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, address, latency='fixed:0.5', transcription_latency=None, speech_latency=None,
+                 token_interval=0.02, error_rate=0.0, rate_limit_rpm=0, seed=None):
+        super().__init__(address, _Handler)
+        self.latency = {
+            'chat': Latency(latency),
+            'transcription': Latency(transcription_latency or latency),
+            'speech': Latency(speech_latency or latency),
+        }
+        self.token_interval = token_interval
+        self.error_rate = error_rate
+        self.rate_limit_rpm = rate_limit_rpm
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.recent = deque()  # monotonic times of admitted requests
+        self.counts = Counter()  # (endpoint, status) -> requests
+
+    def draw(self, fn):
+        with self.lock:
+            return fn(self.rng)
+
+    def admit(self):
+        """Seconds until a request fits under the rate limit, or 0 if it does now."""
+        if not self.rate_limit_rpm:
+            return 0
+        now = time.monotonic()
+        with self.lock:
+            while self.recent and self.recent[0] <= now - 60:
+                self.recent.popleft()
+            if len(self.recent) >= self.rate_limit_rpm:
+                return max(1, math.ceil(self.recent[0] + 60 - now))
+            self.recent.append(now)
+            return 0
+
+    def count(self, endpoint, status):
+        with self.lock:
+            self.counts[(endpoint, status)] += 1
+
+    def stats(self):
+        with self.lock:
+            counts = dict(self.counts)
+        stats = {}
+        for (endpoint, status), count in counts.items():
+            stats.setdefault(endpoint, {})[str(status)] = count
+        return stats
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    _ROUTES = {
+        '/v1/chat/completions': ('chat', '_chat'),
+        '/v1/audio/transcriptions': ('transcription', '_transcription'),
+        '/v1/audio/speech': ('speech', '_speech'),
+    }
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        if self.path == '/stats':
+            self._send_json(200, self.server.stats())
+        else:
+            self._send_error(404, 'not_found', f'Unknown path {self.path}')
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        route = self._ROUTES.get(self.path.split('?', 1)[0])
+        if route is None:
+            self._send_error(404, 'not_found', f'Unknown path {self.path}')
+            return
+        endpoint, method = route
+        server = self.server
+
+        retry_after = server.admit()
+        if retry_after:
+            server.count(endpoint, 429)
+            self._send_error(429, 'rate_limit_exceeded', 'Rate limit reached for requests',
+                             headers={'Retry-After': str(retry_after)})
+            return
+
+        time.sleep(server.draw(server.latency[endpoint].sample))
+        if server.error_rate and server.draw(lambda rng: rng.random()) < server.error_rate:
+            status = server.draw(lambda rng: rng.choice([500, 502, 503]))
+            server.count(endpoint, status)
+            self._send_error(status, 'server_error', 'The server is overloaded or not ready yet.')
+            return
+
+        try:
+            getattr(self, method)(body)
+            server.count(endpoint, 200)
+        except (ValueError, KeyError) as e:
+            server.count(endpoint, 400)
+            self._send_error(400, 'invalid_request_error', str(e))
+
+    def _chat(self, body):
+        request = json.loads(body)
+        messages = request['messages']
+        content = chat_reply(messages)
+        prompt_tokens = sum(_estimate_tokens(_message_text(m)) for m in messages)
+        model = request.get('model', 'gpt-3.5-turbo')
+        if request.get('stream'):
+            self._stream_chat(model, content)
+            return
+        completion_tokens = _estimate_tokens(content)
+        self._send_json(200, {
+            'id': f'chatcmpl-standin-{_digest(content) % 10 ** 12}',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': model,
+            'choices': [{
+                'index': 0,
+                'finish_reason': 'stop',
+                'message': {'role': 'assistant', 'content': content},
+            }],
+            'usage': {
+                'prompt_tokens': prompt_tokens,
+                'completion_tokens': completion_tokens,
+                'total_tokens': prompt_tokens + completion_tokens,
+            },
+        })
+
+    def _stream_chat(self, model, content):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        def event(delta, finish_reason=None):
+            data = json.dumps({
+                'id': 'chatcmpl-standin',
+                'object': 'chat.completion.chunk',
+                'created': int(time.time()),
+                'model': model,
+                'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}],
+            }, ensure_ascii=False)
+            self._write_chunk(f'data: {data}\n\n'.encode('utf-8'))
+
+        event({'role': 'assistant', 'content': ''})
+        for i, token in enumerate(re.findall(r'\S+\s*', content)):
+            if i:
+                time.sleep(self.server.token_interval)
+            event({'content': token})
+        event({}, 'stop')
+        self._write_chunk(b'data: [DONE]\n\n')
+        self._write_chunk(b'')
+
+    def _transcription(self, body):
+        message = BytesParser().parsebytes(
+            f"Content-Type: {self.headers.get('Content-Type', '')}\r\n\r\n".encode('latin1') + body
+        )
+        audio = b''
+        if message.is_multipart():
+            for part in message.get_payload():
+                if part.get_filename() is not None or part.get_param('name', header='content-disposition') == 'file':
+                    audio = part.get_payload(decode=True) or b''
+        if not audio:
+            raise ValueError('No audio file provided')
+        self._send_json(200, {'text': _TRANSCRIPTS[_digest(audio.hex()) % len(_TRANSCRIPTS)]})
+
+    def _speech(self, body):
+        request = json.loads(body)
+        text = request['input']
+        audio_format = request.get('response_format', 'mp3')
+        if audio_format in ('wav', 'pcm'):
+            audio, mimetype = silent_wav(text), 'audio/wav'
+        else:
+            # Other formats get MP3 bytes, which is enough for load tests
+            audio, mimetype = silent_mp3(text), 'audio/mpeg'
+
+        self.send_response(200)
+        self.send_header('Content-Type', mimetype)
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        chunk_size = 8192
+        for start in range(0, len(audio), chunk_size):
+            if start:
+                time.sleep(self.server.token_interval)
+            self._write_chunk(audio[start:start + chunk_size])
+        self._write_chunk(b'')
+
+    def _write_chunk(self, data):
+        self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+        self.wfile.flush()
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error(self, status, code, message, headers=None):
+        self._send_json(status, {'error': {'message': message, 'type': code, 'code': code}}, headers)
+
+
+def start(host='127.0.0.1', port=0, **settings):
+    """Start a stand-in server on a background thread and return it.
+
+    Its base URL for OPENAI_BASE_URL is http://<host>:<server.server_port>/v1.
+    Call server.shutdown() to stop it.
+    """
+    server = StandinServer((host, port), **settings)
+    threading.Thread(target=server.serve_forever, name='openai-standin', daemon=True).start()
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8900)
+    parser.add_argument('--latency', default='fixed:0.5',
+                        help='Time to respond (or to the first token when streaming).')
+    parser.add_argument('--transcription-latency', help='Defaults to --latency.')
+    parser.add_argument('--speech-latency', help='Defaults to --latency.')
+    parser.add_argument('--token-interval', type=float, default=0.02,
+                        help='Seconds between streamed tokens or audio chunks.')
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help='Share of requests answered with a 500, 502 or 503.')
+    parser.add_argument('--rate-limit-rpm', type=int, default=0,
+                        help='Requests per minute before answering 429 (0 for no limit).')
+    parser.add_argument('--seed', type=int, help='Seed for latency and error sampling.')
+    args = parser.parse_args(argv)
+
+    try:
+        server = StandinServer(
+            (args.host, args.port),
+            latency=args.latency,
+            transcription_latency=args.transcription_latency,
+            speech_latency=args.speech_latency,
+            token_interval=args.token_interval,
+            error_rate=args.error_rate,
+            rate_limit_rpm=args.rate_limit_rpm,
+            seed=args.seed,
+        )
+    except ValueError as e:
+        parser.error(str(e))
+    print(f"OpenAI stand-in listening on http://{args.host}:{server.server_port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(json.dumps(server.stats(), indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,136 @@
+import os
+import re
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Long recordings are split at silence into segments of about
+# SEGMENT_SECONDS (see audio_preprocess.split), each overlapping its
+# neighbours by OVERLAP_SECONDS so no word is lost at a cut. The segments are
+# transcribed concurrently and the texts joined, dropping the words the
+# overlaps repeat, so a long answer takes about as long as its longest segment.
+ENABLED = os.environ.get('TRANSCRIBE_SEGMENTED', '1') != '0'
+SEGMENT_SECONDS = float(os.environ.get('TRANSCRIBE_SEGMENT_SECONDS', 30))
+OVERLAP_SECONDS = float(os.environ.get('TRANSCRIBE_OVERLAP_SECONDS', 1.0))
+WORKERS = int(os.environ.get('TRANSCRIBE_SEGMENT_WORKERS', 4))
+
+# How many words at the end of a segment are searched for the repeated
+# overlap, and how many clipped words may come before it in the next one
+OVERLAP_WORDS = 12
+CLIPPED_WORDS = 2
+
+_WORD_RE = re.compile(r"[\w']+")
+
+# Shared by all requests, so one long recording can't open unbounded upstream calls
+_pool = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix='transcribe-segment')
+
+_lock = threading.Lock()
+_stats = {
+    'recordings': 0,
+    'segments': 0,
+    'wall_seconds': 0.0,
+    'segment_seconds': 0.0,
+    'longest_segment_seconds': 0.0,
+    'overlap_words_dropped': 0,
+}
+
+
+def segment_options():
+    """(segment_seconds, overlap_seconds) for audio_preprocess.preprocess_segments, or (None, 0) when off."""
+    return (SEGMENT_SECONDS, OVERLAP_SECONDS) if ENABLED else (None, 0)
+
+
+def _normalize(word):
+    match = _WORD_RE.search(word.lower())
+    return match.group(0) if match else word.lower()
+
+
+def _overlap(previous, following):
+    """Return (keep, skip): words of previous to keep and leading words of following to drop.
+
+    The overlap is the longest run of words that starts within CLIPPED_WORDS
+    of the beginning of following and ends at or one clipped word before the
+    end of previous.
+    """
+    previous_keys = [_normalize(word) for word in previous]
+    following_keys = [_normalize(word) for word in following[:OVERLAP_WORDS]]
+    offset = max(len(previous) - OVERLAP_WORDS, 0)
+    best = (0, len(previous), 0)
+    for i in range(offset, len(previous)):
+        for j in range(min(CLIPPED_WORDS + 1, len(following_keys))):
+            run = 0
+            while (i + run < len(previous) and j + run < len(following_keys)
+                   and previous_keys[i + run] == following_keys[j + run]):
+                run += 1
+            if run > best[0] and i + run >= len(previous) - 1:
+                best = (run, i + run, j + run)
+    run, keep, skip = best
+    # A single repeated short word is as likely to be a coincidence
+    if run >= 2 or (run == 1 and len(previous_keys[keep - 1]) >= 4):
+        return keep, skip
+    return len(previous), 0
+
+
+def stitch(texts):
+    """Join segment transcripts, dropping the words repeated by the overlaps."""
+    words = []
+    for text in texts:
+        following = text.split()
+        if words and following:
+            keep, skip = _overlap(words, following)
+            with _lock:
+                _stats['overlap_words_dropped'] += skip + len(words) - keep
+            words = words[:keep]
+            following = following[skip:]
+        words.extend(following)
+    return ' '.join(words)
+
+
+def _timed(transcribe, segment):
+    started = time.monotonic()
+    text = transcribe(*segment)
+    return text, time.monotonic() - started
+
+
+def transcribe(segments, transcribe_segment):
+    """Transcribe [(data, filename)] segments concurrently and return the stitched text.
+
+    transcribe_segment(data, filename) sends one segment to Whisper. The
+    first segment error is raised once every segment has finished.
+    """
+    started = time.monotonic()
+    futures = [_pool.submit(_timed, transcribe_segment, segment) for segment in segments]
+    results = []
+    error = None
+    for future in futures:
+        try:
+            results.append(future.result())
+        except Exception as e:
+            error = error or e
+    if error is not None:
+        raise error
+
+    elapsed = time.monotonic() - started
+    longest = max(seconds for _, seconds in results)
+    with _lock:
+        _stats['recordings'] += 1
+        _stats['segments'] += len(segments)
+        _stats['wall_seconds'] += elapsed
+        _stats['segment_seconds'] += sum(seconds for _, seconds in results)
+        _stats['longest_segment_seconds'] += longest
+    logger.debug(f"Transcribed {len(segments)} segments in {elapsed:.2f}s, longest {longest:.2f}s")
+    return stitch([text for text, _ in results])
+
+
+def get_stats():
+    """Report segmented transcriptions, with wall time against the summed and longest segment times."""
+    with _lock:
+        stats = dict(_stats)
+    count = stats['recordings']
+    for name in ('wall_seconds', 'segment_seconds', 'longest_segment_seconds'):
+        stats[f'average_{name}'] = stats[name] / count if count else None
+    stats.update(enabled=ENABLED, workers=WORKERS, segment_length=SEGMENT_SECONDS, overlap=OVERLAP_SECONDS)
+    return stats
@@ -0,0 +1,186 @@
+import os
+import time
+import asyncio
+import hashlib
+import logging
+import threading
+from concurrent.futures import Future
+
+try:
+    import fcntl
+except ImportError:  # Windows: calls are only coalesced within a worker
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Identical upstream calls (same canonical request key) made at the same time
+# run once. Within a worker, duplicates wait on the first caller's future.
+# Across workers, the first caller holds a lock file for the key; the others
+# wait for it and then find the result in the shared cache via recheck().
+LOCK_DIR = os.environ.get('SINGLE_FLIGHT_LOCK_DIR', os.path.join('instance', 'locks'))
+LOCK_TIMEOUT = float(os.environ.get('SINGLE_FLIGHT_LOCK_TIMEOUT', 120))
+POLL_INTERVAL = 0.05
+
+_lock = threading.Lock()
+_inflight = {}  # key -> Future shared by callers in this worker
+_async_inflight = {}  # key -> asyncio.Future for the ASGI entry point
+_stats = {}  # key namespace -> counters
+
+
+class FileLock:
+    """Exclusive lock on a key shared by every worker process on this host.
+
+    The holder deletes the lock file before unlocking it, so lock files don't
+    pile up; a waiter that ends up locking a deleted file notices and retries.
+    """
+
+    def __init__(self, key):
+        name = hashlib.sha256(key.encode('utf-8')).hexdigest()[:32]
+        self.path = os.path.join(LOCK_DIR, f'{name}.lock')
+        self.waited = False
+        self._fd = None
+
+    def acquire(self, blocking=True, timeout=LOCK_TIMEOUT):
+        """Take the lock. Returns False if it is held elsewhere and blocking is off or timeout passed."""
+        if fcntl is None:
+            return True
+        os.makedirs(LOCK_DIR, exist_ok=True)
+        deadline = time.monotonic() + timeout
+        while True:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(fd)
+                self.waited = True
+                if not blocking or time.monotonic() >= deadline:
+                    return False
+                time.sleep(POLL_INTERVAL)
+                continue
+            try:
+                held = os.fstat(fd)
+                current = os.stat(self.path)
+                if (held.st_dev, held.st_ino) == (current.st_dev, current.st_ino):
+                    self._fd = fd
+                    return True
+            except FileNotFoundError:
+                pass
+            os.close(fd)
+
+    def release(self):
+        if self._fd is None:
+            return
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+        fcntl.flock(self._fd, fcntl.LOCK_UN)
+        os.close(self._fd)
+        self._fd = None
+
+
+def _count(key, counter):
+    namespace = key.split(':', 1)[0]
+    with _lock:
+        counters = _stats.setdefault(namespace, {
+            'calls': 0,
+            'coalesced_local': 0,
+            'coalesced_remote': 0,
+            'lock_timeouts': 0,
+        })
+        counters[counter] += 1
+
+
+def do(key, fn, recheck=None):
+    """Run fn() once for all concurrent callers with the same key.
+
+    recheck() is called once the cross-worker lock is held and should return
+    the result if another worker already produced it, or None. fn() must store
+    its result where recheck() finds it before returning. Returns (value,
+    shared), where shared means this caller did not run fn() itself.
+    """
+    with _lock:
+        future = _inflight.get(key)
+        leader = future is None
+        if leader:
+            future = Future()
+            _inflight[key] = future
+
+    if not leader:
+        _count(key, 'coalesced_local')
+        return future.result(), True
+
+    lock = FileLock(key)
+    try:
+        if not lock.acquire():
+            _count(key, 'lock_timeouts')
+            logger.warning(f"Timed out waiting for another worker on {key[:40]}, calling upstream anyway")
+        value = recheck() if recheck else None
+        shared = value is not None
+        if shared:
+            _count(key, 'coalesced_remote')
+        else:
+            _count(key, 'calls')
+            value = fn()
+        future.set_result(value)
+        return value, shared
+    except Exception as e:
+        future.set_exception(e)
+        raise
+    finally:
+        lock.release()
+        with _lock:
+            _inflight.pop(key, None)
+
+
+async def ado(key, fn, recheck=None):
+    """Async counterpart of do(). fn is a coroutine function; recheck runs in a thread."""
+    with _lock:
+        future = _async_inflight.get(key)
+        leader = future is None
+        if leader:
+            future = asyncio.get_running_loop().create_future()
+            _async_inflight[key] = future
+
+    if not leader:
+        _count(key, 'coalesced_local')
+        return await asyncio.shield(future), True
+
+    lock = FileLock(key)
+    try:
+        if not await asyncio.to_thread(lock.acquire):
+            _count(key, 'lock_timeouts')
+            logger.warning(f"Timed out waiting for another worker on {key[:40]}, calling upstream anyway")
+        value = await asyncio.to_thread(recheck) if recheck else None
+        shared = value is not None
+        if shared:
+            _count(key, 'coalesced_remote')
+        else:
+            _count(key, 'calls')
+            value = await fn()
+        future.set_result(value)
+        return value, shared
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except Exception as e:
+        future.set_exception(e)
+        # Mark it retrieved so a leader without followers doesn't log a warning
+        future.exception()
+        raise
+    finally:
+        lock.release()
+        with _lock:
+            _async_inflight.pop(key, None)
+
+
+def get_stats():
+    """Return per-namespace counts of upstream calls and of calls collapsed into them."""
+    with _lock:
+        stats = {namespace: dict(counters) for namespace, counters in _stats.items()}
+    for counters in stats.values():
+        collapsed = counters['coalesced_local'] + counters['coalesced_remote']
+        total = counters['calls'] + collapsed
+        counters['collapsed'] = collapsed
+        counters['collapse_rate'] = collapsed / total if total else 0.0
+    return stats
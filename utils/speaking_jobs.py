@@ -0,0 +1,312 @@
+import os
+import json
+import time
+import uuid
+import socket
+import logging
+import threading
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+from utils import structured_output, speaking_recordings
+from utils.llm_resilience import is_retryable
+from utils.openai_helper import transcribe_audio_data
+from utils.structured_output import SpeakingFeedback
+
+logger = logging.getLogger(__name__)
+
+# Speaking submissions are evaluated by a pool of worker threads in each
+# process instead of inside the HTTP request. Jobs live in the SpeakingJob
+# table: a worker claims a job by moving it out of 'queued' in a single
+# UPDATE, so only one process runs it, and a sweeper requeues jobs whose
+# worker stopped making progress (for example because it was restarted).
+# Every later step is conditional on the same claim, so a try the sweeper
+# gave up on can't finish a job a second time.
+WORKERS = int(os.environ.get('SPEAKING_JOB_WORKERS', 4))
+SWEEP_INTERVAL = float(os.environ.get('SPEAKING_JOB_SWEEP_INTERVAL', 5))
+STALE_AFTER = float(os.environ.get('SPEAKING_JOB_STALE_AFTER', 180))
+MAX_TRIES = int(os.environ.get('SPEAKING_JOB_MAX_TRIES', 3))
+
+QUEUED, TRANSCRIBING, EVALUATING, DONE, FAILED = 'queued', 'transcribing', 'evaluating', 'done', 'failed'
+RUNNING = (TRANSCRIBING, EVALUATING)
+FINISHED = (DONE, FAILED)
+
+# A queued job is left to the worker that created it for this long before
+# the sweeper hands it to another one
+_PICKUP_DELAY = 2
+
+_app = None
+_lock = threading.Lock()
+_executor = None
+_executor_pid = None
+_pending = set()  # job ids waiting in this process's pool
+_buffers = {}  # job id -> spooled upload, handed from the request to the worker
+_worker_id = f'{socket.gethostname()}:{os.getpid()}'
+_stats = {
+    'submitted': 0,
+    'completed': 0,
+    'failed': 0,
+    'retried': 0,
+    'requeued_stale': 0,
+    'failed_stale': 0,
+    'claims_lost': 0,
+}
+
+
+def init_app(app):
+    """Run the job pool for app, starting it with the first request of each worker process."""
+    global _app
+    _app = app
+    app.before_request(_ensure_started)
+
+
+def feedback_prompt(target_language, scenario_text, transcription):
+    """Prompt asking for pronunciation feedback on a transcribed speaking attempt."""
+    return f"""
+        As a language tutor for {target_language}, evaluate this spoken response:
+        Scenario: {scenario_text}
+        Student's transcribed response: {transcription}
+
+        Provide detailed feedback in JSON format:
+        {{
+            "pronunciation_score": float (0-100),
+            "pronunciation_feedback": "specific feedback about pronunciation and accent",
+            "grammar_feedback": "feedback about grammar usage",
+            "vocabulary_feedback": "feedback about word choice and vocabulary",
+            "fluency_score": float (0-100),
+            "improvement_suggestions": ["list", "of", "specific", "suggestions"],
+            "correct_response_example": "an example of a good response"
+        }}
+        """
+
+
+def _count(counter):
+    with _lock:
+        _stats[counter] += 1
+
+
+def _ensure_started():
+    global _executor, _executor_pid, _worker_id
+    pid = os.getpid()
+    if _executor is not None and _executor_pid == pid:
+        return
+    with _lock:
+        if _executor is None or _executor_pid != pid:
+            _executor = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix='speaking-job')
+            _executor_pid = pid
+            _worker_id = f'{socket.gethostname()}:{pid}'
+            _pending.clear()
+            threading.Thread(target=_sweep_forever, name='speaking-job-sweeper', daemon=True).start()
+
+
+def create(user_id, exercise_id, recording, extension='webm'):
+    """Keep a spooled recording, queue a SpeakingJob for it and return the job.
+
+    The job takes ownership of recording and transcribes it from memory; the
+    kept copy is only read again if another worker has to pick the job up.
+    Must be called inside an app context.
+    """
+    from app import db
+    from models import SpeakingJob
+
+    job_id = uuid.uuid4().hex
+    name = f'{job_id}.{extension}'
+    try:
+        speaking_recordings.save(name, recording)
+        job = SpeakingJob(id=job_id, user_id=user_id, exercise_id=exercise_id, status=QUEUED, audio_path=name)
+        db.session.add(job)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        recording.close()
+        speaking_recordings.delete(name)
+        raise
+    _count('submitted')
+    enqueue(job_id, recording)
+    return job
+
+
+def enqueue(job_id, recording=None):
+    """Hand a queued job, and its recording if still in memory, to this process's worker pool."""
+    _ensure_started()
+    with _lock:
+        if job_id in _pending:
+            if recording is not None:
+                recording.close()
+            return
+        _pending.add(job_id)
+        if recording is not None:
+            _buffers[job_id] = recording
+    _executor.submit(_run, job_id)
+
+
+def _transcribe(job, recording):
+    if recording is None:
+        recording = speaking_recordings.load(job.audio_path)
+    return transcribe_audio_data(recording, job.audio_path)
+
+
+def _claim(db, SpeakingJob, job_id):
+    claimed = SpeakingJob.query.filter_by(id=job_id, status=QUEUED).update({
+        'status': TRANSCRIBING,
+        'tries': SpeakingJob.tries + 1,
+        'claimed_by': _worker_id,
+        'updated_at': datetime.utcnow(),
+    }, synchronize_session=False)
+    db.session.commit()
+    return claimed == 1
+
+
+class _ClaimLost(Exception):
+    """Raised when a job was handed to a newer try while this one ran."""
+
+
+def _advance(db, SpeakingJob, claim, status, **values):
+    """Move a running job to status, only while claim (id, claimed_by, tries) still holds it.
+
+    Anything added to the session commits with the move, or is rolled back
+    with it if the sweeper requeued the job in the meantime.
+    """
+    job_id, claimed_by, tries = claim
+    advanced = SpeakingJob.query.filter(
+        SpeakingJob.id == job_id,
+        SpeakingJob.status.in_(RUNNING),
+        SpeakingJob.claimed_by == claimed_by,
+        SpeakingJob.tries == tries
+    ).update({**values, 'status': status, 'updated_at': datetime.utcnow()}, synchronize_session=False)
+    if advanced != 1:
+        db.session.rollback()
+        raise _ClaimLost(job_id)
+    db.session.commit()
+
+
+def _run(job_id):
+    from app import db
+    from models import SpeakingJob, UserSpeakingAttempt
+
+    with _lock:
+        _pending.discard(job_id)
+        recording = _buffers.pop(job_id, None)
+    try:
+        with _app.app_context():
+            _process(db, SpeakingJob, UserSpeakingAttempt, job_id, recording)
+    finally:
+        if recording is not None:
+            recording.close()
+
+
+def _evaluate(db, SpeakingJob, UserSpeakingAttempt, job, claim, recording):
+    # A retried job keeps the transcript of its earlier try
+    transcript = job.transcript
+    if transcript is None:
+        started = time.monotonic()
+        transcript = _transcribe(job, recording)
+        logger.debug(f"Speaking job {job.id} transcribed in {time.monotonic() - started:.1f}s")
+        _advance(db, SpeakingJob, claim, EVALUATING, transcript=transcript)
+    else:
+        _advance(db, SpeakingJob, claim, EVALUATING)
+
+    exercise = job.exercise
+    feedback = structured_output.request(
+        SpeakingFeedback, feedback_prompt(exercise.target_language, exercise.scenario, transcript)
+    )
+    feedback_data = feedback.model_dump()
+    attempt = UserSpeakingAttempt(
+        user_id=job.user_id,
+        exercise_id=job.exercise_id,
+        audio_recording_url=speaking_recordings.url_for(job.audio_path),
+        pronunciation_score=feedback.pronunciation_score,
+        feedback=json.dumps(feedback_data)
+    )
+    db.session.add(attempt)
+    db.session.flush()
+    _advance(db, SpeakingJob, claim, DONE, feedback=json.dumps(feedback_data), attempt_id=attempt.id)
+
+
+def _process(db, SpeakingJob, UserSpeakingAttempt, job_id, recording):
+    if not _claim(db, SpeakingJob, job_id):
+        return
+    job = db.session.get(SpeakingJob, job_id)
+    claim = (job_id, job.claimed_by, job.tries)
+    audio_path = job.audio_path
+    try:
+        try:
+            _evaluate(db, SpeakingJob, UserSpeakingAttempt, job, claim, recording)
+            _count('completed')
+        except _ClaimLost:
+            raise
+        except Exception as e:
+            db.session.rollback()
+            if is_retryable(e) and claim[2] < MAX_TRIES:
+                logger.warning(f"Speaking job {job_id} failed on try {claim[2]}, queueing it again: {e}")
+                _advance(db, SpeakingJob, claim, QUEUED)
+                _count('retried')
+                return
+            logger.error(f"Speaking job {job_id} failed: {e}")
+            _advance(db, SpeakingJob, claim, FAILED, error='Failed to evaluate the recording')
+            _count('failed')
+            # Only recordings with an attempt are worth keeping
+            speaking_recordings.delete(audio_path)
+    except _ClaimLost:
+        logger.warning(f"Speaking job {job_id} was requeued while try {claim[2]} ran, leaving it to the newer try")
+        _count('claims_lost')
+
+
+def sweep():
+    """Requeue or fail stalled jobs and pick up queued jobs no worker has taken. Returns the number picked up."""
+    from app import db
+    from models import SpeakingJob
+
+    now = datetime.utcnow()
+    with _app.app_context():
+        stale = SpeakingJob.query.filter(
+            SpeakingJob.status.in_(RUNNING),
+            SpeakingJob.updated_at < now - timedelta(seconds=STALE_AFTER)
+        )
+        # Every claim counts a try, so a job that stalled on its last one is failed
+        abandoned = stale.filter(SpeakingJob.tries >= MAX_TRIES).with_entities(
+            SpeakingJob.id, SpeakingJob.audio_path
+        ).all()
+        for job_id, audio_path in abandoned:
+            if stale.filter(SpeakingJob.id == job_id).update(
+                {'status': FAILED, 'error': 'Failed to evaluate the recording', 'updated_at': now},
+                synchronize_session=False
+            ):
+                db.session.commit()
+                speaking_recordings.delete(audio_path)
+                logger.error(f"Speaking job {job_id} stalled on its last try and was failed")
+                _count('failed_stale')
+        requeued = stale.filter(SpeakingJob.tries < MAX_TRIES).update(
+            {'status': QUEUED, 'updated_at': now}, synchronize_session=False
+        )
+        db.session.commit()
+        if requeued:
+            logger.warning(f"Requeued {requeued} stalled speaking jobs")
+            with _lock:
+                _stats['requeued_stale'] += requeued
+
+        waiting = [job_id for job_id, in db.session.query(SpeakingJob.id).filter(
+            SpeakingJob.status == QUEUED,
+            SpeakingJob.updated_at < now - timedelta(seconds=_PICKUP_DELAY)
+        ).order_by(SpeakingJob.updated_at).limit(WORKERS * 4)]
+    for job_id in waiting:
+        enqueue(job_id)
+    return len(waiting)
+
+
+def _sweep_forever():
+    while True:
+        try:
+            sweep()
+        except Exception as e:
+            logger.error(f"Speaking job sweep failed: {e}")
+        time.sleep(SWEEP_INTERVAL)
+
+
+def get_stats():
+    """Report this worker's job counters and the pool size."""
+    with _lock:
+        stats = dict(_stats)
+        stats['pending'] = len(_pending)
+    stats.update(workers=WORKERS, worker_id=_worker_id)
+    return stats
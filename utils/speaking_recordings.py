@@ -0,0 +1,98 @@
+import os
+import shutil
+import logging
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+# Speaking uploads are copied into a spooled buffer: recordings up to
+# SPOOL_MAX_BYTES stay in memory and larger ones roll over to an anonymous
+# temporary file that is gone as soon as the buffer is closed, so nothing
+# is left behind on the ephemeral disk. The buffer goes straight to
+# transcription; the only file written is the kept copy under RECORDINGS_DIR.
+SPOOL_MAX_BYTES = int(os.environ.get('SPEAKING_SPOOL_MAX_BYTES', 2 * 1024 * 1024))
+
+# Whisper rejects uploads over 25 MB
+MAX_BYTES = int(os.environ.get('SPEAKING_RECORDING_MAX_BYTES', 25 * 1024 * 1024))
+
+RECORDINGS_DIR = os.environ.get('SPEAKING_RECORDINGS_DIR', os.path.join('instance', 'speaking_recordings'))
+
+# URL prefix of the route that serves kept recordings to their owner
+RECORDING_URL_PATH = '/api/speaking/recordings'
+
+EXTENSIONS = ('webm', 'ogg', 'wav', 'mp3', 'm4a', 'mp4')
+
+_COPY_CHUNK = 64 * 1024
+
+
+class RecordingTooLarge(ValueError):
+    """Raised for uploads over MAX_BYTES."""
+
+
+def extension_for(filename, mimetype=None):
+    """Pick the stored file extension of an upload, defaulting to webm.
+
+    The content type wins over the file name, which browsers don't derive
+    from the recorded format.
+    """
+    extension = (mimetype or '').split('/')[-1].split(';')[0].lower()
+    if extension not in EXTENSIONS:
+        extension = os.path.splitext(filename or '')[1].lstrip('.').lower()
+    return extension if extension in EXTENSIONS else 'webm'
+
+
+def spool(upload):
+    """Copy an uploaded FileStorage into a spooled buffer, rewound to the start.
+
+    The caller owns the buffer and must close it. Raises RecordingTooLarge
+    for recordings over MAX_BYTES and ValueError for empty ones.
+    """
+    buffer = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+    size = 0
+    try:
+        while True:
+            chunk = upload.stream.read(_COPY_CHUNK)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > MAX_BYTES:
+                raise RecordingTooLarge(f'Recording is larger than {MAX_BYTES} bytes')
+            buffer.write(chunk)
+        if not size:
+            raise ValueError('Recording is empty')
+    except Exception:
+        buffer.close()
+        raise
+    buffer.seek(0)
+    return buffer
+
+
+def path_for(name):
+    return os.path.join(RECORDINGS_DIR, name)
+
+
+def save(name, buffer):
+    """Keep the contents of buffer as recording name and rewind it."""
+    os.makedirs(RECORDINGS_DIR, exist_ok=True)
+    buffer.seek(0)
+    with open(path_for(name), 'wb') as file:
+        shutil.copyfileobj(buffer, file, _COPY_CHUNK)
+    buffer.seek(0)
+
+
+def load(name):
+    """Return the bytes of a kept recording."""
+    with open(path_for(name), 'rb') as file:
+        return file.read()
+
+
+def delete(name):
+    try:
+        os.remove(path_for(name))
+    except OSError:
+        pass
+
+
+def url_for(name):
+    """Stable URL of a kept recording, for UserSpeakingAttempt.audio_recording_url."""
+    return f'{RECORDING_URL_PATH}/{name}'
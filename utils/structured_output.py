@@ -0,0 +1,260 @@
+import os
+import re
+import json
+import logging
+import threading
+from typing import List, Optional
+
+from pydantic import BaseModel, ConfigDict, ValidationError, field_validator
+
+from utils import llm_resilience
+
+logger = logging.getLogger(__name__)
+
+# Prompts that must come back as JSON are sent with a strict JSON schema
+# response format, so the model can only produce a matching object. Replies
+# are still repaired locally (code fences, trailing commas, wrapped lists,
+# out-of-range scores) before validation, because a second round trip to fix
+# them would cost as much as the original call.
+STRUCTURED_MODEL = os.environ.get('OPENAI_STRUCTURED_MODEL', 'gpt-4o-mini')
+
+_FENCE_RE = re.compile(r'^\s*```(?:json)?\s*(.*?)\s*```\s*$', re.S)
+_TRAILING_COMMA_RE = re.compile(r',\s*([}\]])')
+_PYTHON_LITERALS = {'True': 'true', 'False': 'false', 'None': 'null'}
+_PYTHON_LITERAL_RE = re.compile(r'\b(True|False|None)\b(?=(?:[^"]*"[^"]*")*[^"]*$)')
+_SMART_QUOTES = str.maketrans({'“': '"', '”': '"'})
+
+_lock = threading.Lock()
+_stats = {
+    'valid': 0,
+    'repaired': 0,
+    'failed': 0,
+    'refused': 0,
+}
+
+
+class StructuredOutputError(Exception):
+    """Raised when a reply can't be turned into the requested schema."""
+
+
+class _Schema(BaseModel):
+    # additionalProperties: false, which strict mode requires
+    model_config = ConfigDict(extra='forbid')
+
+
+def _clamp_score(value):
+    if isinstance(value, str):
+        value = value.strip().rstrip('%')
+    return min(100.0, max(0.0, float(value)))
+
+
+class SentenceFeedback(_Schema):
+    """Evaluation of a practice sentence (submit_sentence)."""
+    is_correct: bool
+    correction: Optional[str]
+    feedback: str
+
+    @field_validator('correction', mode='before')
+    @classmethod
+    def _empty_correction(cls, value):
+        if isinstance(value, str) and value.strip().lower() in ('', 'null', 'none', 'n/a'):
+            return None
+        return value
+
+
+class SpeakingFeedback(_Schema):
+    """Feedback on a transcribed speaking attempt (submit_speaking_practice)."""
+    pronunciation_score: float
+    pronunciation_feedback: str
+    grammar_feedback: str
+    vocabulary_feedback: str
+    fluency_score: float
+    improvement_suggestions: List[str]
+    correct_response_example: str
+
+    @field_validator('pronunciation_score', 'fluency_score', mode='before')
+    @classmethod
+    def _score_range(cls, value):
+        return _clamp_score(value)
+
+    @field_validator('improvement_suggestions', mode='before')
+    @classmethod
+    def _suggestion_list(cls, value):
+        if isinstance(value, str):
+            return [line.strip(' -*•') for line in value.splitlines() if line.strip(' -*•')]
+        return value
+
+
+class VocabularyWord(_Schema):
+    word: str
+    translation: str
+    example_sentence: str
+    category: str
+
+    # Trimmed to the VocabularyItem column sizes
+    @field_validator('word', 'translation')
+    @classmethod
+    def _fits_word_column(cls, value):
+        return value.strip()[:100]
+
+    @field_validator('category')
+    @classmethod
+    def _fits_category_column(cls, value):
+        return value.strip()[:50]
+
+
+class VocabularyList(_Schema):
+    """Generated vocabulary words (generate_vocabulary)."""
+    vocabulary: List[VocabularyWord]
+
+    @field_validator('vocabulary', mode='before')
+    @classmethod
+    def _complete_words(cls, value):
+        # Fill in the optional parts of a word and drop only words without a
+        # word or translation, instead of failing the whole list
+        if not isinstance(value, list):
+            return value
+        words = []
+        for item in value:
+            if not isinstance(item, dict) or not item.get('word') or not item.get('translation'):
+                continue
+            item = dict(item)
+            if not item.get('example_sentence'):
+                item['example_sentence'] = ''
+            if not isinstance(item.get('category'), str) or not item['category'].strip():
+                item['category'] = 'general'
+            words.append(item)
+        return words
+
+
+def _response_format(schema):
+    return {
+        'type': 'json_schema',
+        'json_schema': {
+            'name': schema.__name__,
+            'schema': schema.model_json_schema(),
+            'strict': True,
+        },
+    }
+
+
+def _loads_repaired(content):
+    """Parse JSON that may be fenced, wrapped in prose or slightly malformed."""
+    text = content.strip()
+    fenced = _FENCE_RE.match(text)
+    if fenced:
+        text = fenced.group(1)
+    start, end = text.find('{'), text.rfind('}')
+    if text[:1] != '[' and start != -1 and end > start:
+        text = text[start:end + 1]
+    text = text.translate(_SMART_QUOTES)
+    text = _TRAILING_COMMA_RE.sub(r'\1', text)
+    text = _PYTHON_LITERAL_RE.sub(lambda m: _PYTHON_LITERALS[m.group(1)], text)
+    return json.loads(text)
+
+
+def _unwrap(schema, data):
+    """Fit a bare list, or a list under another key, to a schema with one list field."""
+    fields = schema.model_fields
+    if len(fields) != 1:
+        return data
+    name = next(iter(fields))
+    if isinstance(data, list):
+        return {name: data}
+    if isinstance(data, dict) and name not in data:
+        lists = [value for value in data.values() if isinstance(value, list)]
+        if len(lists) == 1:
+            return {name: lists[0]}
+    return data
+
+
+def _count(counter):
+    with _lock:
+        _stats[counter] += 1
+
+
+def parse(schema, content):
+    """Validate a model reply against schema, repairing minor defects locally.
+
+    Returns a schema instance. Raises StructuredOutputError if the reply
+    can't be repaired.
+    """
+    if not content:
+        _count('failed')
+        raise StructuredOutputError('Empty reply')
+    try:
+        instance = schema.model_validate_json(content)
+        _count('valid')
+        return instance
+    except ValidationError:
+        pass
+
+    try:
+        instance = schema.model_validate(_unwrap(schema, _loads_repaired(content)))
+    except (ValueError, ValidationError) as e:
+        _count('failed')
+        logger.error(f"Reply does not match {schema.__name__}: {e}; reply: {content[:200]}")
+        raise StructuredOutputError(f'Reply does not match {schema.__name__}')
+    _count('repaired')
+    logger.info(f"Repaired a {schema.__name__} reply locally")
+    return instance
+
+
+def _messages(prompt, system):
+    messages = [{'role': 'system', 'content': system}] if system else []
+    return messages + [{'role': 'user', 'content': prompt}]
+
+
+def _parse_completion(schema, completion):
+    message = completion.choices[0].message
+    if getattr(message, 'refusal', None):
+        _count('refused')
+        raise StructuredOutputError(f'Model refused: {message.refusal}')
+    return parse(schema, message.content)
+
+
+def _request_options(schema, prompt, system, model, temperature):
+    options = {
+        'model': model,
+        'messages': _messages(prompt, system),
+        'response_format': _response_format(schema),
+    }
+    if temperature is not None:
+        options['temperature'] = temperature
+    return options
+
+
+def request(schema, prompt, system=None, model=STRUCTURED_MODEL, temperature=None, operation='chat'):
+    """Send prompt with schema as the response format and return a validated schema instance.
+
+    Raises StructuredOutputError for unusable replies and OpenAIError for
+    upstream failures.
+    """
+    from utils.openai_helper import use_mock
+
+    if use_mock:
+        raise StructuredOutputError('OpenAI API key not configured')
+    options = _request_options(schema, prompt, system, model, temperature)
+    completion = llm_resilience.call(operation, lambda client: client.chat.completions.create(**options))
+    return _parse_completion(schema, completion)
+
+
+async def arequest(schema, prompt, system=None, model=STRUCTURED_MODEL, temperature=None, operation='chat'):
+    """Async counterpart of request() for the ASGI entry point."""
+    from utils.openai_helper import use_mock
+
+    if use_mock:
+        raise StructuredOutputError('OpenAI API key not configured')
+    options = _request_options(schema, prompt, system, model, temperature)
+    completion = await llm_resilience.acall(operation, lambda client: client.chat.completions.create(**options))
+    return _parse_completion(schema, completion)
+
+
+def get_stats():
+    """Report how many replies validated as-is, needed a local repair, or were unusable."""
+    with _lock:
+        stats = dict(_stats)
+    total = stats['valid'] + stats['repaired'] + stats['failed'] + stats['refused']
+    stats['total'] = total
+    stats['failure_rate'] = (stats['failed'] + stats['refused']) / total if total else 0.0
+    return stats
@@ -0,0 +1,208 @@
+import os
+import re
+import hashlib
+import logging
+import threading
+from datetime import datetime
+from collections import OrderedDict
+
+from sqlalchemy import func
+
+from utils.tts_cache import normalize_text
+
+logger = logging.getLogger(__name__)
+
+# Translations are answered from the cheapest tier that has them:
+#   vocabulary - the word (or its translation) is a VocabularyItem
+#   memory     - this worker translated the same text recently
+#   database   - any worker translated the same text before
+#   llm        - a chat completion, whose result then fills both caches
+MEMORY_CACHE_SIZE = int(os.environ.get('TRANSLATION_CACHE_SIZE', 4096))
+
+# Only short phrases are looked up as vocabulary
+MAX_VOCABULARY_WORDS = 3
+
+# Leading articles stripped for the lemma lookup ("los gatos" -> "gato")
+_ARTICLES = {
+    'en': ('the ', 'a ', 'an ', 'to '),
+    'es': ('el ', 'la ', 'los ', 'las ', 'un ', 'una ', 'unos ', 'unas '),
+    'it': ('il ', 'lo ', 'la ', 'i ', 'gli ', 'le ', "l'", 'un ', 'una ', 'uno ', "un'"),
+    'fr': ('le ', 'la ', 'les ', "l'", 'un ', 'une ', 'des ', 'du '),
+    'de': ('der ', 'die ', 'das ', 'den ', 'dem ', 'des ', 'ein ', 'eine ', 'einen '),
+    'pt': ('o ', 'a ', 'os ', 'as ', 'um ', 'uma '),
+    'nl': ('de ', 'het ', 'een '),
+}
+_ALL_ARTICLES = tuple(sorted({a for articles in _ARTICLES.values() for a in articles}, key=len, reverse=True))
+_PUNCTUATION_RE = re.compile(r"^[\s¿¡\"'.,!?;:()]+|[\s\"'.,!?;:()]+$")
+
+_lock = threading.Lock()
+_memory = OrderedDict()  # cache key -> translation
+_stats = {
+    'vocabulary': 0,
+    'memory': 0,
+    'database': 0,
+    'llm': 0,
+}
+
+
+def make_key(text, source_lang, target_lang):
+    """Return the cache key for translating text between two languages."""
+    raw = '\x1f'.join([source_lang or '', target_lang or '', normalize_text(text)])
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def echoes_source(text, translation):
+    """True if translation is just text again, as when the model or a mock leaves it untranslated."""
+    return normalize_text(text).lower() == normalize_text(translation).lower()
+
+
+def _lemma_candidates(text, lang):
+    """Forms of a short phrase to try against the vocabulary table, most exact first."""
+    word = _PUNCTUATION_RE.sub('', normalize_text(text)).lower()
+    candidates = [word]
+    for article in _ARTICLES.get(lang, _ALL_ARTICLES):
+        if word.startswith(article) and len(word) > len(article):
+            word = word[len(article):]
+            candidates.append(word)
+            break
+    # Regular plurals in the Romance languages and English
+    if word.endswith('es') and len(word) > 4:
+        candidates.append(word[:-2])
+    if word.endswith('s') and len(word) > 3:
+        candidates.append(word[:-1])
+    return list(dict.fromkeys(candidates))
+
+
+def lookup_vocabulary(text, source_lang, target_lang, preferred_lang=None):
+    """Translate a word or short phrase from the vocabulary table.
+
+    VocabularyItem stores a word in its language with an English translation,
+    so this answers language -> English and English -> language. source_lang
+    is None when the caller asked for auto-detection, since detection is
+    unreliable for single words; matches in preferred_lang then win. Returns
+    (translation, source_lang) or None.
+    """
+    from models import VocabularyItem
+
+    if len(text.split()) > MAX_VOCABULARY_WORDS:
+        return None
+
+    direction = source_lang or preferred_lang
+    if target_lang == 'en' and direction != 'en':
+        match_column, result_column = VocabularyItem.word, 'translation'
+        language, match_lang = source_lang, direction
+    elif direction == 'en' and target_lang != 'en':
+        match_column, result_column = VocabularyItem.translation, 'word'
+        language, match_lang = target_lang, 'en'
+    else:
+        return None
+
+    candidates = _lemma_candidates(text, match_lang)
+    query = VocabularyItem.query.filter(func.lower(match_column).in_(candidates))
+    if language:
+        query = query.filter(VocabularyItem.language == language)
+    matches = query.all()
+    if not matches:
+        return None
+
+    # Prefer the most exact form, then the preferred language, then the oldest item
+    matches.sort(key=lambda item: (
+        candidates.index(getattr(item, match_column.key).lower()),
+        item.language != preferred_lang,
+        item.id
+    ))
+    item = matches[0]
+    return getattr(item, result_column), 'en' if match_lang == 'en' else item.language
+
+
+def _remember(key, translation):
+    with _lock:
+        _memory[key] = translation
+        _memory.move_to_end(key)
+        while len(_memory) > MEMORY_CACHE_SIZE:
+            _memory.popitem(last=False)
+
+
+def lookup_cached(text, source_lang, target_lang):
+    """Return (translation, tier) from the memory or database cache, or None.
+
+    Must be called inside an app context.
+    """
+    from app import db
+    from models import TranslationCache
+
+    key = make_key(text, source_lang, target_lang)
+    with _lock:
+        translation = _memory.get(key)
+        if translation is not None:
+            _memory.move_to_end(key)
+    if translation is not None:
+        return translation, 'memory'
+
+    entry = db.session.get(TranslationCache, key)
+    if entry is None:
+        return None
+    entry.hits += 1
+    entry.last_used = datetime.utcnow()
+    try:
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.warning(f"Failed to update translation cache entry: {e}")
+    _remember(key, entry.translation)
+    return entry.translation, 'database'
+
+
+def lookup(text, source_lang, target_lang, preferred_lang=None):
+    """Return (translation, tier, source_lang) from the cheapest tier that has it, or None.
+
+    Must be called inside an app context.
+    """
+    vocabulary = lookup_vocabulary(text, source_lang, target_lang, preferred_lang)
+    if vocabulary:
+        _record_tier('vocabulary')
+        return vocabulary[0], 'vocabulary', vocabulary[1]
+
+    cached = lookup_cached(text, source_lang, target_lang)
+    if cached:
+        _record_tier(cached[1])
+        return cached[0], cached[1], source_lang
+    return None
+
+
+def store(text, source_lang, target_lang, translation):
+    """Save an LLM translation in both caches. Must be called inside an app context."""
+    from app import db
+    from models import TranslationCache
+
+    key = make_key(text, source_lang, target_lang)
+    _remember(key, translation)
+    _record_tier('llm')
+    try:
+        db.session.merge(TranslationCache(
+            key=key,
+            source_lang=source_lang or '',
+            target_lang=target_lang or '',
+            text=normalize_text(text),
+            translation=translation
+        ))
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.warning(f"Failed to save translation to cache: {e}")
+
+
+def _record_tier(tier):
+    with _lock:
+        _stats[tier] += 1
+
+
+def get_stats():
+    """Return how many translations each tier answered, with the share that skipped the LLM."""
+    with _lock:
+        stats = dict(_stats)
+        stats['memory_entries'] = len(_memory)
+    total = sum(stats[tier] for tier in ('vocabulary', 'memory', 'database', 'llm'))
+    stats['total'] = total
+    stats['hit_rate'] = (total - stats['llm']) / total if total else 0.0
+    return stats
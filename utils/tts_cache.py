@@ -0,0 +1,279 @@
+import os
+import time
+import hashlib
+import logging
+import threading
+import unicodedata
+from concurrent.futures import Future
+
+from utils import audio_storage, single_flight
+
+logger = logging.getLogger(__name__)
+
+# Audio files are named after the hash of everything that affects the
+# synthesized output, so a file on disk is a cache entry for that request.
+_lock = threading.Lock()
+_inflight = {}  # cache key -> Future shared by concurrent streaming misses
+_stats = {
+    'hits': 0,
+    'misses': 0,
+    'coalesced': 0,
+    'errors': 0,
+    'synthesis_seconds': 0.0,
+    'saved_characters': 0,
+}
+
+
+def normalize_text(text):
+    """Normalize text so trivially different requests share a cache entry."""
+    text = unicodedata.normalize('NFC', text or '')
+    return ' '.join(text.split())
+
+
+def make_key(text, lang, voice, model, speed, audio_format='mp3'):
+    """Return the content-addressed cache key for a TTS request."""
+    try:
+        speed = f'{float(speed):.2f}'
+    except (TypeError, ValueError):
+        speed = str(speed)
+    parts = [normalize_text(text), lang or '', voice or '', model or '', speed]
+    if audio_format != 'mp3':
+        # MP3 keys predate output formats and stay unchanged
+        parts.append(audio_format)
+    raw = '\x1f'.join(parts)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def _is_cached(audio_path):
+    try:
+        return os.path.getsize(audio_path) > 0
+    except OSError:
+        return False
+
+
+def _record_hit(audio_path, text_length):
+    audio_storage.touch(audio_path)
+    with _lock:
+        _stats['hits'] += 1
+        _stats['saved_characters'] += text_length
+
+
+def get_or_create(key, audio_path, synthesize, text_length=0):
+    """Make sure audio_path exists, synthesizing it at most once per key.
+
+    synthesize(path) must write the audio to the given path. Concurrent misses
+    for the same key, in this worker or another, wait for the first caller
+    instead of synthesizing again. Returns True if the audio was already
+    cached, False if it was generated.
+    """
+    if _is_cached(audio_path):
+        _record_hit(audio_path, text_length)
+        return True
+
+    def create():
+        # Write to a temporary path and rename so readers never see partial files
+        temp_path = f'{audio_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        started = time.monotonic()
+        with _lock:
+            _stats['misses'] += 1
+        try:
+            synthesize(temp_path)
+            os.replace(temp_path, audio_path)
+        except Exception:
+            with _lock:
+                _stats['errors'] += 1
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            raise
+        audio_storage.record(audio_path)
+        with _lock:
+            _stats['synthesis_seconds'] += time.monotonic() - started
+        return False
+
+    cached, shared = single_flight.do(
+        f'tts:{key}',
+        create,
+        recheck=lambda: True if _is_cached(audio_path) else None
+    )
+    if shared:
+        logger.debug(f"Shared in-flight synthesis of {key[:12]}")
+        with _lock:
+            _stats['coalesced'] += 1
+        _record_hit(audio_path, text_length)
+        return True
+    return cached
+
+
+def read_chunks(audio_path, chunk_size=16384):
+    """Yield the bytes of a stored audio file."""
+    with open(audio_path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+
+class _StreamRelay:
+    """Iterable that relays upstream audio chunks while writing them to the cache.
+
+    If the client disconnects early, close() drains the rest of the upstream
+    response into the file so the cache entry is still completed.
+    """
+
+    def __init__(self, key, future, lock, audio_path, temp_path, started, first, upstream):
+        self._key = key
+        self._lock = lock
+        self._future = future
+        self._audio_path = audio_path
+        self._temp_path = temp_path
+        self._started = started
+        self._first = first
+        self._upstream = upstream
+        self._file = open(temp_path, 'wb')
+        self._done = False
+
+    def __iter__(self):
+        try:
+            if self._first:
+                self._file.write(self._first)
+                yield self._first
+            for chunk in self._upstream:
+                self._file.write(chunk)
+                yield chunk
+        except GeneratorExit:
+            raise
+        except Exception as e:
+            self._fail(e)
+            raise
+        self._finish()
+
+    def close(self):
+        if self._done:
+            return
+        try:
+            for chunk in self._upstream:
+                self._file.write(chunk)
+        except Exception as e:
+            self._fail(e)
+            return
+        self._finish()
+
+    def _finish(self):
+        self._done = True
+        try:
+            self._file.close()
+            os.replace(self._temp_path, self._audio_path)
+        except OSError as e:
+            self._fail(e)
+            return
+        audio_storage.record(self._audio_path)
+        self._lock.release()
+        with _lock:
+            _stats['synthesis_seconds'] += time.monotonic() - self._started
+            _inflight.pop(self._key, None)
+        self._future.set_result(self._audio_path)
+
+    def _fail(self, error):
+        self._done = True
+        logger.error(f"Streaming synthesis failed for {self._key[:12]}: {error}")
+        self._file.close()
+        try:
+            os.remove(self._temp_path)
+        except OSError:
+            pass
+        self._lock.release()
+        with _lock:
+            _stats['errors'] += 1
+            _inflight.pop(self._key, None)
+        self._future.set_exception(error)
+
+
+def stream_through(key, audio_path, open_stream, synthesize, text_length=0):
+    """Return an iterable of audio bytes for key, caching them as they stream.
+
+    open_stream() must return an iterator of upstream audio chunks. Cached or
+    in-flight entries are served from disk instead. If upstream fails before
+    the first chunk, synthesize(path) produces the file the non-streaming way.
+    """
+    if _is_cached(audio_path):
+        _record_hit(audio_path, text_length)
+        return read_chunks(audio_path)
+
+    with _lock:
+        future = _inflight.get(key)
+        leader = future is None
+        if leader:
+            future = Future()
+            _inflight[key] = future
+        else:
+            _stats['coalesced'] += 1
+
+    if not leader:
+        future.result()
+        _record_hit(audio_path, text_length)
+        return read_chunks(audio_path)
+
+    # Another worker streaming the same audio holds the key's lock; wait for
+    # its file instead of opening a second upstream stream
+    lock = single_flight.FileLock(f'tts:{key}')
+    if not lock.acquire(blocking=False) or _is_cached(audio_path):
+        lock.release()
+        try:
+            get_or_create(key, audio_path, synthesize, text_length)
+        except Exception as e:
+            with _lock:
+                _inflight.pop(key, None)
+            future.set_exception(e)
+            raise
+        with _lock:
+            _inflight.pop(key, None)
+        future.set_result(audio_path)
+        return read_chunks(audio_path)
+
+    with _lock:
+        _stats['misses'] += 1
+    temp_path = f'{audio_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    started = time.monotonic()
+    try:
+        upstream = iter(open_stream())
+        first = next(upstream, b'')
+    except Exception as stream_error:
+        logger.warning(f"Streaming synthesis unavailable, generating file instead: {stream_error}")
+        try:
+            synthesize(temp_path)
+            os.replace(temp_path, audio_path)
+        except Exception as e:
+            lock.release()
+            with _lock:
+                _stats['errors'] += 1
+                _inflight.pop(key, None)
+            future.set_exception(e)
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            raise
+        audio_storage.record(audio_path)
+        lock.release()
+        with _lock:
+            _stats['synthesis_seconds'] += time.monotonic() - started
+            _inflight.pop(key, None)
+        future.set_result(audio_path)
+        return read_chunks(audio_path)
+
+    return _StreamRelay(key, future, lock, audio_path, temp_path, started, first, upstream)
+
+
+def get_stats():
+    """Return cache counters along with the estimated latency saved by hits."""
+    with _lock:
+        stats = dict(_stats)
+    avg_synthesis = stats['synthesis_seconds'] / stats['misses'] if stats['misses'] else 0.0
+    lookups = stats['hits'] + stats['misses']
+    stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+    stats['avg_synthesis_seconds'] = avg_synthesis
+    stats['saved_seconds'] = avg_synthesis * stats['hits']
+    return stats
@@ -0,0 +1,255 @@
+import os
+import logging
+from contextlib import ExitStack
+from gtts import gTTS
+from utils import tts_cache, audio_storage, llm_budget, llm_resilience
+from utils.openai_client import get_openai_api_key
+from utils.audio_format import FORMATS, transcode
+
+logger = logging.getLogger(__name__)
+
+# Map languages to appropriate OpenAI voices based on quality testing
+LANGUAGE_VOICE_MAP = {
+    'es': 'nova',      # Spanish - nova has excellent Spanish pronunciation
+    'it': 'alloy',     # Italian - alloy has better Italian articulation
+    'fr': 'echo',      # French - echo handles French sounds well
+    'de': 'fable',     # German - fable works for German
+    'en': 'onyx',      # English - onyx is a warm English voice
+    'pt': 'nova',      # Portuguese - similar enough to Spanish
+    'ru': 'shimmer',   # Russian
+    'zh': 'nova',      # Mandarin Chinese - nova has decent pronunciation
+    'ja': 'shimmer',   # Japanese
+    'ko': 'shimmer',   # Korean
+    'ar': 'nova',      # Arabic
+    'nl': 'fable',     # Dutch
+    'pl': 'fable',     # Polish
+    'tr': 'alloy',     # Turkish
+    'hi': 'nova',      # Hindi
+    'vi': 'shimmer'    # Vietnamese
+}
+
+# Generated audio lives under static/ so it can be served by URL
+AUDIO_ROOT = os.path.join('static', 'audio')
+
+# URL prefix of the cache-friendly route that serves files under AUDIO_ROOT
+AUDIO_URL_PATH = '/audio'
+
+# gTTS audio is cached under this model name rather than the OpenAI request's,
+# so a fallback never stands in for the OpenAI entry once the API works again
+GTTS_MODEL = 'gtts'
+
+
+class OpenAISpeechError(RuntimeError):
+    """Raised when OpenAI TTS is unavailable and the caller asked for no gTTS fallback."""
+
+
+def voice_for_language(lang):
+    """Return the OpenAI voice for a language code, defaulting to alloy."""
+    return LANGUAGE_VOICE_MAP.get(lang, 'alloy')
+
+
+def prepare_tts_text(text):
+    """Strip text and make sure it ends with punctuation for better TTS quality."""
+    text = text.strip()
+    if text and not text[-1] in '.!?':
+        text = text + '.'
+    return text
+
+
+def charge_speech(text, priority='interactive'):
+    """Charge an OpenAI TTS call for text to the LLM budget; gTTS is free."""
+    if get_openai_api_key():
+        llm_budget.acquire(llm_budget.estimate_tokens(text, completion=0), priority)
+
+
+def _save_gtts(text, lang, audio_path, fallback_lang=None):
+    try:
+        # Disable strict language check
+        tts = gTTS(text=text, lang=lang, lang_check=False)
+        tts.save(audio_path)
+    except Exception as gtts_error:
+        if not fallback_lang or fallback_lang == lang:
+            raise
+        logger.error(f"gTTS error: {str(gtts_error)}")
+        logger.info(f"Trying fallback language {fallback_lang}")
+        tts = gTTS(text=text, lang=fallback_lang, lang_check=False)
+        tts.save(audio_path)
+
+
+def _save_openai(text, voice, model, speed, audio_path, response_format='mp3'):
+    speech_file_response = llm_resilience.call('tts', lambda client: client.audio.speech.create(
+        model=model,
+        voice=voice,
+        input=text,
+        speed=speed,
+        response_format=response_format
+    ))
+    with open(audio_path, "wb") as file:
+        for chunk in speech_file_response.iter_bytes(chunk_size=1024):
+            file.write(chunk)
+
+
+def _verify_audio_file(audio_path):
+    if not os.path.exists(audio_path) or os.path.getsize(audio_path) == 0:
+        logger.error(f"Audio file not created or empty: {audio_path}")
+        raise RuntimeError('Failed to create audio file')
+
+
+def _synthesize_gtts(text, lang, audio_path, fallback_lang=None, audio_format='mp3'):
+    if audio_format == 'mp3':
+        _save_gtts(text, lang, audio_path, fallback_lang)
+    else:
+        source_path = f'{audio_path}.src.mp3'
+        try:
+            _save_gtts(text, lang, source_path, fallback_lang)
+            transcode(source_path, audio_path, audio_format)
+        finally:
+            try:
+                os.remove(source_path)
+            except OSError:
+                pass
+    _verify_audio_file(audio_path)
+
+
+def synthesize_speech(text, lang, voice, model, speed, audio_path, fallback_lang=None, audio_format='mp3',
+                      gtts_fallback=True):
+    """Write speech for text to audio_path in the given output format.
+
+    Uses OpenAI TTS when an API key is configured and falls back to gTTS
+    otherwise or when the OpenAI call fails. With gtts_fallback=False it
+    raises OpenAISpeechError instead, for callers that cache the audio under
+    the OpenAI request. Formats OpenAI can't produce directly, and gTTS
+    output, are transcoded from MP3. Raises RuntimeError if no audio could
+    be produced.
+    """
+    if audio_format != 'mp3':
+        response_format = FORMATS[audio_format]['openai']
+        if response_format and get_openai_api_key():
+            try:
+                _save_openai(text, voice, model, speed, audio_path, response_format)
+                _verify_audio_file(audio_path)
+                return
+            except Exception as openai_error:
+                logger.error(f"OpenAI TTS error for {audio_format}: {str(openai_error)}")
+                if not gtts_fallback:
+                    raise OpenAISpeechError(str(openai_error)) from openai_error
+
+        source_path = f'{audio_path}.src.mp3'
+        try:
+            synthesize_speech(text, lang, voice, model, speed, source_path, fallback_lang,
+                              gtts_fallback=gtts_fallback)
+            transcode(source_path, audio_path, audio_format)
+        finally:
+            try:
+                os.remove(source_path)
+            except OSError:
+                pass
+        _verify_audio_file(audio_path)
+        return
+
+    if not get_openai_api_key():
+        if not gtts_fallback:
+            raise OpenAISpeechError('No OpenAI API key is configured')
+        # Fall back to gTTS if no OpenAI API key is available
+        logger.warning("No OpenAI API key available, falling back to gTTS")
+        try:
+            _save_gtts(text, lang, audio_path, fallback_lang)
+        except Exception as gtts_error:
+            logger.error(f"gTTS error: {str(gtts_error)}")
+            raise RuntimeError(f'Failed to generate audio: {str(gtts_error)}')
+    else:
+        # Use OpenAI's TTS
+        try:
+            _save_openai(text, voice, model, speed, audio_path)
+            logger.debug(f"OpenAI TTS audio saved to: {audio_path}")
+        except Exception as openai_error:
+            logger.error(f"OpenAI TTS error: {str(openai_error)}")
+            if not gtts_fallback:
+                raise OpenAISpeechError(str(openai_error)) from openai_error
+
+            # Fallback to gTTS if OpenAI fails
+            logger.info("Falling back to gTTS after OpenAI error")
+            try:
+                _save_gtts(text, lang, audio_path)
+                logger.debug(f"Fallback gTTS audio saved to: {audio_path}")
+            except Exception as gtts_error:
+                logger.error(f"gTTS fallback error: {str(gtts_error)}")
+                raise RuntimeError(f'Both TTS methods failed: {str(openai_error)}, then {str(gtts_error)}')
+
+    # Verify file was created and has content
+    _verify_audio_file(audio_path)
+
+
+def stream_speech(text, voice, model, speed, chunk_size=4096, response_format='mp3'):
+    """Yield audio bytes from OpenAI TTS as they arrive from the API."""
+    def open_response(client):
+        # Entering the streaming response sends the request, so retries cover it
+        stack = ExitStack()
+        response = stack.enter_context(client.audio.speech.with_streaming_response.create(
+            model=model,
+            voice=voice,
+            input=text,
+            speed=speed,
+            response_format=response_format
+        ))
+        return stack, response
+
+    stack, response = llm_resilience.call('tts', open_response)
+    with stack:
+        for chunk in response.iter_bytes(chunk_size=chunk_size):
+            yield chunk
+
+
+def audio_file_path(text, lang, voice, model, speed, subdir='tts', prefix='tts', audio_format='mp3'):
+    """Return (cache key, filename, path) of the stored audio for a TTS request."""
+    cache_key = tts_cache.make_key(text, lang, voice, model, speed, audio_format)
+    audio_filename = f"{prefix}_{cache_key}.{FORMATS[audio_format]['extension']}"
+    audio_dir = os.path.join(AUDIO_ROOT, subdir)
+    os.makedirs(audio_dir, exist_ok=True)
+    return cache_key, audio_filename, os.path.join(audio_dir, audio_filename)
+
+
+def ensure_audio_file(text, lang, voice, model, speed, subdir='tts', prefix='tts', fallback_lang=None,
+                      pin=False, audio_format='mp3', priority='interactive'):
+    """Return (filename, cached) for the audio of text, synthesizing it on a cache miss.
+
+    The file is stored as static/audio/<subdir>/<prefix>_<cache key>.<ext>.
+    Pinned files are never evicted by audio_storage; use this for audio whose
+    URL is saved in the database. A miss is charged to the LLM budget at
+    priority; raises llm_budget.BudgetExceeded if that would go over it.
+    Without OpenAI TTS the gTTS audio from ensure_gtts_file() is returned.
+    """
+    if get_openai_api_key():
+        cache_key, audio_filename, audio_path = audio_file_path(
+            text, lang, voice, model, speed, subdir, prefix, audio_format
+        )
+
+        def synthesize(path):
+            charge_speech(text, priority)
+            synthesize_speech(text, lang, voice, model, speed, path,
+                              fallback_lang=fallback_lang, audio_format=audio_format, gtts_fallback=False)
+
+        try:
+            cached = tts_cache.get_or_create(cache_key, audio_path, synthesize, text_length=len(text))
+        except OpenAISpeechError as e:
+            logger.warning(f"OpenAI TTS failed, using gTTS audio instead: {e}")
+        else:
+            if pin:
+                audio_storage.pin(audio_path)
+            return audio_filename, cached
+    return ensure_gtts_file(text, lang, subdir, prefix, fallback_lang, pin, audio_format)
+
+
+def ensure_gtts_file(text, lang, subdir='tts', prefix='tts', fallback_lang=None, pin=False, audio_format='mp3'):
+    """Like ensure_audio_file(), for gTTS audio cached under GTTS_MODEL."""
+    cache_key, audio_filename, audio_path = audio_file_path(
+        text, lang, None, GTTS_MODEL, 1.0, subdir, prefix, audio_format
+    )
+    cached = tts_cache.get_or_create(
+        cache_key, audio_path,
+        lambda path: _synthesize_gtts(text, lang, path, fallback_lang, audio_format),
+        text_length=len(text)
+    )
+    if pin:
+        audio_storage.pin(audio_path)
+    return audio_filename, cached
@@ -0,0 +1,194 @@
+import os
+import queue
+import atexit
+import logging
+import threading
+from datetime import datetime
+
+from sqlalchemy import insert
+
+logger = logging.getLogger(__name__)
+
+# Write-behind mode for append-only rows (chat turns, progress, sentence
+# practice). Rows are queued in memory and inserted in batches by a
+# background thread instead of one commit per request. Rows still queued
+# when a worker is killed outright are lost, so this is opt-in.
+ENABLED = os.environ.get('WRITE_BEHIND', '').lower() in ('1', 'true', 'yes')
+QUEUE_SIZE = int(os.environ.get('WRITE_BEHIND_QUEUE_SIZE', 10000))
+BATCH_SIZE = int(os.environ.get('WRITE_BEHIND_BATCH_SIZE', 500))
+FLUSH_INTERVAL = float(os.environ.get('WRITE_BEHIND_FLUSH_INTERVAL', 0.5))
+
+# Filled in when a row is queued, so it records when it happened rather
+# than when it was flushed
+_TIMESTAMP_COLUMNS = ('timestamp', 'created_at')
+
+_app = None
+_queue = queue.Queue(maxsize=QUEUE_SIZE)
+_wake = threading.Event()
+_lock = threading.Lock()
+_flush_lock = threading.Lock()
+_thread = None
+_thread_pid = None
+_stats = {
+    'queued': 0,
+    'written': 0,
+    'batches': 0,
+    'inline': 0,
+    'queue_full': 0,
+    'dropped': 0,
+}
+
+
+def init_app(app):
+    """Remember the Flask app whose database the queued rows are written to."""
+    global _app
+    _app = app
+
+
+def add(model, on_written=None, **values):
+    """Insert an append-only row, in write-behind mode if it is enabled.
+
+    Falls back to an inline commit in the caller's session when write-behind
+    is off or the queue is full. on_written() is called once the row is
+    committed, for work that has to see it. Must be called inside an app
+    context.
+    """
+    for column in _TIMESTAMP_COLUMNS:
+        if column in model.__table__.columns and values.get(column) is None:
+            values[column] = datetime.utcnow()
+
+    if ENABLED and _app is not None:
+        _ensure_started()
+        try:
+            _queue.put_nowait((model, values, on_written))
+        except queue.Full:
+            with _lock:
+                _stats['queue_full'] += 1
+            logger.warning(f"Write-behind queue is full, writing {model.__name__} inline")
+        else:
+            with _lock:
+                _stats['queued'] += 1
+            if _queue.qsize() >= BATCH_SIZE:
+                _wake.set()
+            return
+
+    _insert_inline(model, values)
+    _notify([on_written])
+
+
+def _insert_inline(model, values):
+    from app import db
+
+    db.session.add(model(**values))
+    db.session.commit()
+    with _lock:
+        _stats['inline'] += 1
+
+
+def _notify(callbacks):
+    for callback in callbacks:
+        if callback is None:
+            continue
+        try:
+            callback()
+        except Exception as e:
+            logger.error(f"Write-behind callback failed: {e}")
+
+
+def _drain(limit):
+    rows = []
+    while len(rows) < limit:
+        try:
+            rows.append(_queue.get_nowait())
+        except queue.Empty:
+            break
+    return rows
+
+
+def _write_batch(db, rows):
+    # Rows of the same model with the same columns become one multi-row insert
+    groups = {}
+    for model, values, _ in rows:
+        groups.setdefault((model, tuple(sorted(values))), []).append(values)
+    for (model, _), group in groups.items():
+        db.session.execute(insert(model.__table__), group)
+    db.session.commit()
+    return [on_written for _, _, on_written in rows]
+
+
+def _write_one_by_one(db, rows):
+    written = []
+    for model, values, on_written in rows:
+        try:
+            db.session.execute(insert(model.__table__), [values])
+            db.session.commit()
+            written.append(on_written)
+        except Exception as e:
+            db.session.rollback()
+            with _lock:
+                _stats['dropped'] += 1
+            logger.error(f"Dropping queued {model.__name__} row that could not be written: {e}")
+    return written
+
+
+def flush():
+    """Write every queued row. Returns the number of rows written."""
+    if _app is None:
+        return 0
+    from app import db
+
+    written = 0
+    with _flush_lock, _app.app_context():
+        while True:
+            rows = _drain(BATCH_SIZE)
+            if not rows:
+                break
+            try:
+                callbacks = _write_batch(db, rows)
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Batched write of {len(rows)} rows failed, retrying one by one: {e}")
+                callbacks = _write_one_by_one(db, rows)
+            _notify(callbacks)
+            count = len(callbacks)
+            written += count
+            with _lock:
+                _stats['written'] += count
+                _stats['batches'] += 1
+    if written:
+        logger.debug(f"Write-behind flushed {written} rows")
+    return written
+
+
+def _run():
+    while True:
+        _wake.wait(FLUSH_INTERVAL)
+        _wake.clear()
+        try:
+            flush()
+        except Exception as e:
+            logger.error(f"Write-behind flush failed: {e}")
+
+
+def _ensure_started():
+    global _thread, _thread_pid
+    pid = os.getpid()
+    if _thread is not None and _thread_pid == pid:
+        return
+    with _lock:
+        if _thread is None or _thread_pid != pid:
+            _thread = threading.Thread(target=_run, name='write-behind', daemon=True)
+            _thread_pid = pid
+            _thread.start()
+
+
+def get_stats():
+    """Report queue depth and how rows were written."""
+    with _lock:
+        stats = dict(_stats)
+    stats.update(enabled=ENABLED, pending=_queue.qsize(), queue_size=QUEUE_SIZE,
+                 batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL)
+    return stats
+
+
+atexit.register(flush)